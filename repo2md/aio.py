@@ -0,0 +1,402 @@
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import shutil
+import ssl
+import tempfile
+import weakref
+from collections.abc import AsyncGenerator
+from typing import IO, Any, Dict, Tuple
+
+try:
+    import httpx
+except ImportError as error:
+    raise ImportError(
+        "repo2md.aio requires httpx, install it with: pip install 'repo2md[aio]'"
+    ) from error
+
+from repo2md import config, github, languages, main
+from repo2md import metrics as _metrics
+from repo2md import utils
+
+LOGGER = logging.getLogger("repo2md")
+
+
+def get_verify() -> ssl.SSLContext | bool:
+    """Gets the certificates to verify the connections with, honouring the CA bundle variables of requests and curl.
+
+    Returns:
+        ssl.SSLContext | bool:
+        A context with the CA bundle from the environment, or True to use the default certificates.
+    """
+    if cafile := os.getenv("REQUESTS_CA_BUNDLE") or os.getenv("CURL_CA_BUNDLE"):
+        return ssl.create_default_context(cafile=cafile)
+    return True
+
+
+class AsyncClient(github.RetryPolicy):
+    """A class to make requests to the GitHub API on an event loop, with the retry policy of the synchronous client.
+
+    >>> AsyncClient
+
+    """
+
+    def __init__(
+        self,
+        timeout: float = 60.0,
+        retries: int = 5,
+        backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        max_rate_limit_wait: float = 300.0,
+        concurrency: int = 10,
+    ):
+        """Initialize the client.
+
+        Args:
+            timeout: Timeout in seconds to connect, and for each read.
+            retries: Maximum number of attempts for each request.
+            backoff: Base delay in seconds for the exponential backoff between attempts.
+            max_backoff: Maximum delay in seconds between attempts.
+            max_rate_limit_wait: Maximum time in seconds to wait for a rate limit to reset before giving up.
+            concurrency: Maximum number of requests in flight on an event loop, including the streamed downloads.
+        """
+        super().__init__(
+            retries=retries,
+            backoff=backoff,
+            max_backoff=max_backoff,
+            max_rate_limit_wait=max_rate_limit_wait,
+        )
+        self.timeout = timeout
+        self.concurrency = concurrency
+        # Connection pools and semaphores are bound to an event loop, so each loop gets its own
+        self.sessions: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    @property
+    def session(self) -> Tuple[httpx.AsyncClient, asyncio.Semaphore]:
+        """Gets the pooled session and the semaphore to limit the concurrent requests on the running event loop."""
+        loop = asyncio.get_running_loop()
+        if (session := self.sessions.get(loop)) is None:
+            # Proxies and ``SSL_CERT_FILE`` are read from the environment, the same as requests does
+            client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.concurrency,
+                    max_keepalive_connections=self.concurrency,
+                ),
+                follow_redirects=True,
+                verify=get_verify(),
+                headers={"User-Agent": "repo2md"},
+            )
+            session = self.sessions[loop] = (
+                client,
+                asyncio.Semaphore(self.concurrency),
+            )
+        return session
+
+    async def aclose(self) -> None:
+        """Closes the pooled connections of the running event loop."""
+        if session := self.sessions.pop(asyncio.get_running_loop(), None):
+            await session[0].aclose()
+
+    @contextlib.asynccontextmanager
+    async def stream(
+        self,
+        url: str,
+        env: config.EnvConfig = None,
+        params: Dict[str, Any] = None,
+        headers: Dict[str, str] = None,
+        metrics: _metrics.Metrics = None,
+    ) -> AsyncGenerator[httpx.Response]:
+        """Makes a GET request within the concurrency limit, retrying on transient failures.
+
+        Args:
+            url: The URL to make the request to.
+            env: Configuration to authenticate the request with, defaults to ``config.env``.
+            params: Query parameters for the request.
+            headers: Additional headers for the request, overriding the default ones.
+            metrics: Metrics to count the requests and retries in.
+
+        Yields:
+            httpx.Response:
+            The response, with its body left to be streamed. The limit is held until it is closed.
+
+        See Also:
+            Failures are retried and raised the same way as ``github.Client.get``.
+        """
+        client, semaphore = self.session
+        headers = {
+            "Accept": "application/vnd.github+json",
+            "Authorization": f"Bearer {(env or config.env).git_token}",
+            **(headers or {}),
+        }
+        if metrics:
+            metrics.count("requests")
+        async with semaphore:
+            for attempt in range(self.retries):
+                LOGGER.debug("Attempt %d to fetch %s", attempt + 1, url)
+                request = client.build_request(
+                    "GET", url, params=params, headers=headers
+                )
+                try:
+                    response = await client.send(request, stream=True)
+                except httpx.TransportError as error:
+                    LOGGER.error(error)
+                    delay = self.get_delay(attempt)
+                else:
+                    if response.status_code < 400:
+                        try:
+                            yield response
+                        finally:
+                            await response.aclose()
+                        return
+                    if not self.is_retryable(response):
+                        text = (await response.aread()).decode(errors="replace")
+                        await response.aclose()
+                        raise RuntimeError(
+                            f"Request failed on {url} with status {response.status_code}: {text}"
+                        )
+                    delay = self.get_delay(attempt, response)
+                    await response.aclose()
+                    if delay > self.max_rate_limit_wait:
+                        raise RuntimeError(
+                            f"Rate limit on {url} resets in {delay:.0f}s, exceeds wait limit of "
+                            f"{self.max_rate_limit_wait:.0f}s"
+                        )
+                if attempt + 1 < self.retries:
+                    if metrics:
+                        metrics.count("retries")
+                    LOGGER.warning(
+                        "Request failed on attempt %d, retrying in %.2fs...",
+                        attempt + 1,
+                        delay,
+                    )
+                    await asyncio.sleep(delay)
+        raise RuntimeError(f"Request failed on {url}")
+
+
+client = AsyncClient()
+
+
+async def get_repo_info(
+    repo: str,
+    env: config.EnvConfig = None,
+    metrics: _metrics.Metrics = None,
+) -> Dict[str, str]:
+    """Fetches the default branch and language of a GitHub repository.
+
+    Args:
+        repo: The name of the repository.
+        env: Configuration for the repository's owner and authentication, defaults to ``config.env``.
+        metrics: Metrics to record the time spent on the API metadata in.
+
+    Returns:
+        Dict[str, str]:
+        A dictionary containing the default branch and language of the repository.
+    """
+    env = env or config.env
+    metrics = metrics or _metrics.Metrics()
+    LOGGER.info("Fetching default branch for %s/%s...", env.git_owner, repo)
+    url = utils.urljoin(env.repos_url, env.git_owner, repo)
+    with metrics.stage("metadata"):
+        async with client.stream(url, env=env, metrics=metrics) as response:
+            data = json.loads(await response.aread())
+    return {"branch": data.get("default_branch"), "language": data.get("language")}
+
+
+async def download_archive(
+    repo: str,
+    branch: str = None,
+    env: config.EnvConfig = None,
+    archive: IO[bytes] = None,
+    metrics: _metrics.Metrics = None,
+) -> Dict[str, Any]:
+    """Streams a GitHub repository's zipball into a spooled temporary file, as the bytes arrive on the event loop.
+
+    Args:
+        repo: Repository name.
+        branch: Branch name to download. If not specified, the default branch will be used.
+        env: Configuration for the repository's owner and authentication, defaults to ``config.env``.
+        archive: Binary file object to stream the zipball into, instead of a spooled temporary file.
+        metrics: Metrics to record the time spent and the bytes downloaded in.
+
+    Returns:
+        Dict[str, Any]:
+        A dictionary containing the archive as a binary file object (rewound to the start) and the repo's language.
+    """
+    env = env or config.env
+    metrics = metrics or _metrics.Metrics()
+    repo_info = await get_repo_info(repo=repo, env=env, metrics=metrics)
+    url = utils.urljoin(
+        env.repos_url,
+        env.git_owner,
+        repo,
+        "zipball",
+        branch or repo_info["branch"],
+    )
+    LOGGER.info("Downloading '%s/%s'", env.git_owner, repo)
+    if archive is None:
+        archive = tempfile.SpooledTemporaryFile(max_size=github.SPOOL_SIZE)
+    with metrics.stage("download"):
+        async with client.stream(url, env=env, metrics=metrics) as response:
+            async for chunk in response.aiter_bytes(chunk_size=github.CHUNK_SIZE):
+                archive.write(chunk)
+                metrics.count("bytes_downloaded", len(chunk))
+    archive.seek(0)
+    LOGGER.debug("Download successful")
+    return {"archive": archive, "language": repo_info["language"]}
+
+
+async def download_and_extract(
+    repo: str,
+    dest_dir: str,
+    branch: str = None,
+    env: config.EnvConfig = None,
+    metrics: _metrics.Metrics = None,
+) -> Dict[str, str]:
+    """Downloads a GitHub repository as a zip file and extracts it to the specified directory.
+
+    Args:
+        repo: Repository name.
+        dest_dir: Destination directory where the repository will be extracted.
+        branch: Branch name to download. If not specified, the default branch will be used.
+        env: Configuration for the repository's owner and authentication, defaults to ``config.env``.
+        metrics: Metrics to record the time spent on the download and the extraction in.
+
+    Returns:
+        Dict[str, str]:
+        A dictionary containing the path to the extracted repository and its language.
+
+    Notes:
+        The extraction runs in a thread, so the event loop keeps serving other downloads meanwhile.
+    """
+    metrics = metrics or _metrics.Metrics()
+    downloaded = await download_archive(
+        repo=repo, branch=branch, env=env, metrics=metrics
+    )
+    with downloaded["archive"] as archive, metrics.stage("extract"):
+        true_path = await asyncio.to_thread(
+            github.extract_archive, archive=archive, repo=repo, dest_dir=dest_dir
+        )
+    return {"path": true_path, "language": downloaded["language"]}
+
+
+async def convert_repo_to_md(
+    repo_name: str,
+    branch: str = None,
+    delete: bool = True,
+    destination: str = "tmp",
+    language_filter: bool | str = False,
+    in_archive: bool = False,
+    workers: int = None,
+    max_file_size: int = None,
+    max_total_size: int = None,
+    gitignore: bool = False,
+    max_tokens: int = None,
+    policy: str = None,
+    summary: bool = False,
+    tree_depth: int = None,
+    tree_entries: int = None,
+    dedup: str = None,
+    metrics: _metrics.Metrics = None,
+    metrics_file: str = None,
+    **kwargs,
+) -> _metrics.Metrics:
+    """Converts a GitHub repository to a Markdown file, downloading it on the running event loop.
+
+    Args:
+        repo_name: Name of the GitHub repository to convert.
+        branch: Branch of the repository to use (default is None, which uses the default branch).
+        delete: Boolean flag to delete the repository after conversion (default is True).
+        destination: Destination directory to store the Markdown file (default is "tmp").
+        language_filter: Boolean flag to filter files by the repository's language, or comma-separated languages.
+        in_archive: Boolean flag to render straight from the downloaded zipball without extracting it.
+        workers: Number of threads to read files with, files are read sequentially when unset.
+        max_file_size: Maximum size of a file in bytes, larger files are truncated.
+        max_total_size: Maximum total size of the files in bytes, files beyond it are left out of the contents.
+        gitignore: Boolean flag to also ignore the patterns in the repository's ``.gitignore`` and ``.repo2mdignore``.
+        max_tokens: Maximum number of tokens in the code contents, estimated from the file sizes before reading.
+        policy: Order to fill the token budget in, one of ``smallest``, ``extension`` or ``depth``.
+        summary: Boolean flag to write a table of the selected files by extension, after the directory tree.
+        tree_depth: Maximum depth of the directories to expand in the tree, deeper contents are summarized in one line.
+        tree_entries: Maximum number of entries to list per directory in the tree, the rest are summarized in one line.
+        dedup: Mode to replace the contents written before with references, ``exact`` for whole files only, or
+            ``near`` to also replace the repeated chunks of lines within similar files.
+        metrics: Metrics to record the time spent on each stage, and the counts of files, bytes and retries in.
+        metrics_file: File to export the metrics to, in the Prometheus text format for ``.prom`` files and as JSON
+            lines otherwise.
+
+    Keyword Args:
+        git_token: Git token to authenticate with GitHub.
+        git_owner: Owner of the repository. Defaults to the environment variable GIT_OWNER.
+        git_api_url: GitHub API URL. Defaults to the environment variable GIT_API_URL.
+
+    Returns:
+        Metrics:
+        Seconds spent on each stage of the conversion, and the counts of files, bytes and retries.
+
+    Notes:
+        Many conversions can be awaited together on one event loop, the requests they make in flight are limited by
+        the concurrency of the shared ``client``. Extraction and rendering are CPU bound and run in a thread.
+    """
+    env = config.EnvConfig(**kwargs)
+    assert (
+        env.git_owner
+    ), f"'git_owner' is required to fetch the repository: {repo_name!r}"
+    options = dict(
+        workers=workers,
+        max_file_size=max_file_size,
+        max_total_size=max_total_size,
+        gitignore=gitignore,
+        max_tokens=max_tokens,
+        policy=policy,
+        summary=summary,
+        tree_depth=tree_depth,
+        tree_entries=tree_entries,
+        dedup=dedup,
+    )
+    os.makedirs(destination, exist_ok=True)
+    metrics = metrics or _metrics.Metrics()
+    metrics.labels.setdefault("repo", repo_name)
+    output = os.path.join(destination, f"{repo_name}.md")
+    with metrics.stage("total"):
+        downloaded = await download_archive(
+            repo=repo_name, branch=branch, env=env, metrics=metrics
+        )
+        language = languages.get_language(language_filter, downloaded["language"])
+        with downloaded["archive"] as archive:
+            if in_archive:
+                await asyncio.to_thread(
+                    main.generate_archive_markdown,
+                    archive,
+                    repo_name,
+                    filename=output,
+                    language=language,
+                    metrics=metrics,
+                    **options,
+                )
+            else:
+                with metrics.stage("extract"):
+                    path = await asyncio.to_thread(
+                        github.extract_archive,
+                        archive=archive,
+                        repo=repo_name,
+                        dest_dir=destination,
+                    )
+        if not in_archive:
+            await asyncio.to_thread(
+                main.generate_markdown,
+                path,
+                filename=output,
+                language=language,
+                metrics=metrics,
+                **options,
+            )
+            if delete:
+                LOGGER.info("Deleting repository after conversion")
+                await asyncio.to_thread(shutil.rmtree, path, ignore_errors=True)
+    LOGGER.info("Converted %s: %s", repo_name, metrics.summary())
+    if metrics_file:
+        await asyncio.to_thread(metrics.export, metrics_file)
+    return metrics
@@ -0,0 +1,285 @@
+import logging
+import os
+import shutil
+from concurrent.futures import (
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+)
+from typing import Any, Dict, List, Tuple
+
+from repo2md import cache as _cache
+from repo2md import config, github, languages, main
+
+LOGGER = logging.getLogger("repo2md")
+
+# Options of a single conversion that batch conversions don't support
+UNSUPPORTED_OPTIONS = (
+    "source",
+    "sparse",
+    "incremental",
+    "ref",
+    "since",
+    "shard_size",
+    "shard_tokens",
+    "shard_directories",
+    "metrics_file",
+)
+
+
+def get_jobs(repos: List[str] | str, **kwargs) -> List[Tuple[str, config.EnvConfig]]:
+    """Resolves the repositories to convert into jobs, each with its own configuration.
+
+    Args:
+        repos: Names of the repositories, either as a list or a comma-separated string.
+            Names can be prefixed with the owner as ``owner/repo``, to convert repos across owners.
+            When empty, all the repositories of the configured owner are converted.
+
+    Keyword Args:
+        git_token: Git token to authenticate with GitHub.
+        git_owner: Default owner of the repositories. Defaults to the environment variable GIT_OWNER.
+        git_api_url: GitHub API URL. Defaults to the environment variable GIT_API_URL.
+
+    Returns:
+        List[Tuple[str, config.EnvConfig]]:
+        A list of tuples with the repository name and the configuration to fetch it with.
+    """
+    if isinstance(repos, str):
+        repos = [repo.strip() for repo in repos.split(",") if repo.strip()]
+    env = config.EnvConfig(**kwargs)
+    if not repos:
+        return [(repo, env) for repo in github.list_repos(env=env)]
+    owners = {env.git_owner: env}
+    jobs = []
+    for repo in repos:
+        owner, _, name = repo.rpartition("/")
+        owner = owner or env.git_owner
+        assert owner, f"'git_owner' is required to fetch the repository: {repo!r}"
+        if owner not in owners:
+            owners[owner] = config.EnvConfig(**{**kwargs, "git_owner": owner})
+        jobs.append((name, owners[owner]))
+    return jobs
+
+
+def download(
+    repo: str,
+    env: config.EnvConfig,
+    destination: str,
+    branch: str = None,
+    in_archive: bool = False,
+    cache: _cache.Cache = None,
+    language_filter: bool | str = False,
+    options: Dict[str, Any] = None,
+) -> Dict[str, Any]:
+    """Downloads a repository for conversion, either extracted or as a zip archive on disk.
+
+    Args:
+        repo: Name of the repository.
+        env: Configuration for the repository's owner and authentication.
+        destination: Directory to download the repository into.
+        branch: Branch of the repository to use (default is None, which uses the default branch).
+        in_archive: Boolean flag to store the zipball as is, instead of extracting it.
+        cache: Cache to look up the Markdown file or the archive in, before downloading.
+        language_filter: Boolean flag to filter files by the repository's language, or comma-separated languages.
+        options: Options the Markdown file is rendered with, to look up the cached output.
+
+    Returns:
+        Dict[str, Any]:
+        A dictionary containing the path to the download and the language of the repository.
+        With a cache, the archive is downloaded into the cache, or skipped entirely if the Markdown file is cached.
+    """
+    if cache:
+        return cache.fetch(
+            repo=repo,
+            branch=branch,
+            language_filter=language_filter,
+            env=env,
+            options=options,
+        )
+    if not in_archive:
+        return github.download_and_extract(
+            repo=repo, dest_dir=destination, branch=branch, env=env
+        )
+    path = os.path.join(destination, f"{repo}.zip")
+    with open(path, "wb") as archive:
+        downloaded = github.download_archive(
+            repo=repo, branch=branch, env=env, archive=archive
+        )
+    return {"path": path, "language": downloaded["language"]}
+
+
+def render(
+    repo: str,
+    downloaded: Dict[str, str],
+    filename: str,
+    language: str = None,
+    in_archive: bool = False,
+    options: Dict[str, Any] = None,
+) -> str:
+    """Renders a downloaded repository into a Markdown file, this runs in a worker process.
+
+    Args:
+        repo: Name of the repository.
+        downloaded: Path to the download and the language of the repository.
+        filename: Filename for the output Markdown file.
+        language: Programming language of the code files.
+        in_archive: Boolean flag to indicate that the download is a zip archive.
+        options: Options to render the Markdown file with.
+
+    Returns:
+        str:
+        Filename of the Markdown file.
+    """
+    if in_archive:
+        main.generate_archive_markdown(
+            downloaded["path"], repo, filename=filename, language=language, **options
+        )
+    else:
+        main.generate_markdown(
+            downloaded["path"], filename=filename, language=language, **options
+        )
+    return filename
+
+
+def convert_repos(
+    repos: List[str] | str = None,
+    branch: str = None,
+    delete: bool = True,
+    destination: str = "tmp",
+    language_filter: bool | str = False,
+    in_archive: bool = False,
+    workers: int = 4,
+    processes: int = None,
+    cache: _cache.Cache | str = None,
+    max_file_size: int = None,
+    max_total_size: int = None,
+    gitignore: bool = False,
+    max_tokens: int = None,
+    policy: str = None,
+    summary: bool = False,
+    tree_depth: int = None,
+    tree_entries: int = None,
+    dedup: str = None,
+    **kwargs,
+) -> Dict[str, str | Exception]:
+    """Converts many GitHub repositories to Markdown files, downloading concurrently and rendering in parallel.
+
+    Args:
+        repos: Names of the repositories, either as a list or a comma-separated string.
+            Names can be prefixed with the owner as ``owner/repo``, to convert repos across owners.
+            When empty, all the repositories of the configured owner are converted.
+        branch: Branch of the repositories to use (default is None, which uses the default branch).
+        delete: Boolean flag to delete the downloads after conversion (default is True).
+        destination: Destination directory to store the Markdown files (default is "tmp").
+        language_filter: Boolean flag to filter files by each repository's language, or the languages to filter by as
+            comma-separated names, eg: ``python,go``.
+        in_archive: Boolean flag to render straight from the zipballs without extracting them.
+        workers: Number of threads to download the repositories with (default is 4).
+        processes: Number of processes to render the Markdown files with (default is the number of CPUs).
+        cache: Cache, or the directory for one, to skip the download and conversion of unchanged repositories.
+        max_file_size: Maximum size of a file in bytes, larger files are truncated.
+        max_total_size: Maximum total size of the files in each repository, files beyond it are left out.
+        gitignore: Boolean flag to also ignore the patterns in each repository's ``.gitignore`` and ``.repo2mdignore``.
+        max_tokens: Maximum number of tokens in the code contents of each repository.
+        policy: Order to fill the token budget in, one of ``smallest``, ``extension`` or ``depth``.
+        summary: Boolean flag to write a table of the selected files by extension, after the directory tree.
+        tree_depth: Maximum depth of the directories to expand in the tree, deeper contents are summarized in one line.
+        tree_entries: Maximum number of entries to list per directory in the tree, the rest are summarized in one line.
+        dedup: Mode to replace the contents written before with references, ``exact`` for whole files only, or
+            ``near`` to also replace the repeated chunks of lines within similar files.
+
+    Keyword Args:
+        git_token: Git token to authenticate with GitHub.
+        git_owner: Default owner of the repositories. Defaults to the environment variable GIT_OWNER.
+        git_api_url: GitHub API URL. Defaults to the environment variable GIT_API_URL.
+
+    Returns:
+        Dict[str, str | Exception]:
+        A dictionary with ``owner/repo`` as the key and the Markdown filename, or the error it failed with, as value.
+
+    Notes:
+        Markdown files are stored as ``{destination}/{owner}/{repo}.md``, so repos from different owners don't clash.
+        Options of a single conversion listed in ``UNSUPPORTED_OPTIONS``, such as sparse fetches and sharded
+        output, are rejected rather than ignored.
+    """
+    unsupported = [key for key in UNSUPPORTED_OPTIONS if kwargs.get(key)]
+    assert (
+        not unsupported
+    ), f"Options not supported in batch conversions: {', '.join(unsupported)}"
+    results: Dict[str, Any] = {}
+    options = dict(
+        max_file_size=max_file_size,
+        max_total_size=max_total_size,
+        gitignore=gitignore,
+        max_tokens=max_tokens,
+        policy=policy,
+        summary=summary,
+        tree_depth=tree_depth,
+        tree_entries=tree_entries,
+        dedup=dedup,
+    )
+    if cache and not isinstance(cache, _cache.Cache):
+        cache = _cache.Cache(directory=cache)
+    if cache:
+        # Cached archives are rendered as is, and kept for the next run
+        in_archive, delete = True, False
+    jobs = get_jobs(repos, **kwargs)
+    LOGGER.info("Converting %d repositories", len(jobs))
+    downloader = ThreadPoolExecutor(max_workers=workers)
+    renderer = ProcessPoolExecutor(max_workers=processes)
+    with downloader, renderer:
+        downloads: Dict[Future, Tuple[str, config.EnvConfig]] = {}
+        for repo, env in jobs:
+            directory = os.path.join(destination, env.git_owner)
+            os.makedirs(directory, exist_ok=True)
+            future = downloader.submit(
+                download,
+                repo,
+                env,
+                directory,
+                branch,
+                in_archive,
+                cache,
+                language_filter,
+                options,
+            )
+            downloads[future] = (repo, env)
+        renders: Dict[Future, Tuple[str, Dict[str, str]]] = {}
+        # Downloads are handed off to the process pool in the order they finish
+        for future in as_completed(downloads):
+            repo, env = downloads[future]
+            key = f"{env.git_owner}/{repo}"
+            try:
+                downloaded = future.result()
+            except Exception as error:
+                LOGGER.error("Failed to download %s: %s", key, error)
+                results[key] = error
+                continue
+            filename = os.path.join(destination, env.git_owner, f"{repo}.md")
+            if downloaded.get("hit"):
+                shutil.copyfile(downloaded["output"], filename)
+                results[key] = filename
+                continue
+            language = languages.get_language(language_filter, downloaded["language"])
+            future = renderer.submit(
+                render, repo, downloaded, filename, language, in_archive, options
+            )
+            renders[future] = (key, downloaded)
+        for future, (key, downloaded) in renders.items():
+            try:
+                results[key] = future.result()
+            except Exception as error:
+                LOGGER.error("Failed to render %s: %s", key, error)
+                results[key] = error
+            else:
+                if cache:
+                    cache.store(results[key], downloaded["output"])
+            if delete:
+                if in_archive:
+                    os.remove(downloaded["path"])
+                else:
+                    shutil.rmtree(path=downloaded["path"], ignore_errors=True)
+    if cache:
+        cache.evict()
+    return results
@@ -0,0 +1,359 @@
+import contextlib
+import http.server
+import io
+import json
+import logging
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from collections.abc import Generator
+from typing import Any, Callable, Dict
+
+import repo2md
+from repo2md import config, github, index, main, tree
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+LOGGER = logging.getLogger("repo2md")
+
+# Extensions of the synthetic text files
+EXTENSIONS = (".py", ".js", ".ts", ".go", ".java", ".rs", ".c", ".h", ".json", ".txt")
+# Lines the synthetic text files are made of
+LINES = (
+    "def handler(event, context):\n",
+    "    return {'statusCode': 200, 'body': json.dumps(event)}\n",
+    "const value = items.map((item) => item.id).filter(Boolean);\n",
+    "for (int i = 0; i < count; i++) { total += values[i]; }\n",
+    "# TODO: replace this with a proper implementation\n",
+    "\n",
+)
+# Modules the package should only import once a command needs them
+HEAVY_MODULES = ("click", "requests", "dotenv", "concurrent.futures.process")
+# Script to time an import in a fresh interpreter, and list the heavy modules it pulled in
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def get_peak_rss() -> int | None:
+    """Gets the peak resident set size of the current process.
+
+    Returns:
+        int | None:
+        Peak RSS in bytes, or None if it is not available on the platform.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports the peak RSS in kilobytes, macOS in bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def generate_tree(
+    path: str,
+    files: int = 1000,
+    depth: int = 4,
+    file_size: int = 4096,
+    binary_fraction: float = 0.05,
+    ignored_fraction: float = 0.1,
+    seed: int = 0,
+) -> Dict[str, int]:
+    """Generates a synthetic repository with text and binary files in nested directories.
+
+    Args:
+        path: Directory to generate the repository in.
+        files: Number of files to generate.
+        depth: Maximum depth of the directories.
+        file_size: Average size of a file in bytes, sizes are exponentially distributed around it.
+        binary_fraction: Fraction of the files that are binary.
+        ignored_fraction: Fraction of the files that are generated within ignored directories.
+        seed: Seed for the random generator, so the same repository is generated for the same arguments.
+
+    Returns:
+        Dict[str, int]:
+        A dictionary with the number of files and bytes generated, and the number of binary and ignored files.
+    """
+    rng = random.Random(seed)
+    text = "".join(rng.choice(LINES) for _ in range(2048)).encode()
+    directories = [("", 0)]
+    for number in range(max(1, int(files**0.5))):
+        if not (parents := [item for item in directories if item[1] < depth]):
+            break
+        parent, level = rng.choice(parents)
+        directories.append((os.path.join(parent, f"dir{number}"), level + 1))
+    ignored = [os.path.join("node_modules", f"package{n}") for n in range(4)]
+    summary = {"files": files, "bytes": 0, "binary": 0, "ignored": 0}
+    for number in range(files):
+        size = int(rng.expovariate(1 / file_size)) + 1 if file_size else 0
+        if rng.random() < ignored_fraction:
+            directory = rng.choice(ignored)
+            summary["ignored"] += 1
+        else:
+            directory = rng.choice(directories)[0]
+        if rng.random() < binary_fraction:
+            name = f"file{number}.bin"
+            content = b"\x00" + rng.randbytes(max(size - 1, 0))
+            summary["binary"] += 1
+        else:
+            name = f"file{number}{rng.choice(EXTENSIONS)}"
+            content = (text * (size // len(text) + 1))[:size]
+        os.makedirs(os.path.join(path, directory), exist_ok=True)
+        with open(os.path.join(path, directory, name), "wb") as file:
+            file.write(content)
+        summary["bytes"] += len(content)
+    return summary
+
+
+def make_archive(path: str, name: str) -> bytes:
+    """Packs a directory into a zipball, with the same layout as the ones served by GitHub.
+
+    Args:
+        path: Directory to pack.
+        name: Name of the top-level directory in the archive.
+
+    Returns:
+        bytes:
+        Content of the zip archive.
+    """
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for root, _, filenames in os.walk(path):
+            for filename in filenames:
+                filepath = os.path.join(root, filename)
+                relative = os.path.relpath(filepath, path).replace(os.path.sep, "/")
+                archive.write(filepath, f"{name}/{relative}")
+    return buffer.getvalue()
+
+
+@contextlib.contextmanager
+def serve_archive(archive: bytes, language: str = None) -> Generator[str]:
+    """Serves a zipball locally, imitating the GitHub endpoints used to download a repository.
+
+    Args:
+        archive: Content of the zip archive, served for every repository.
+        language: Language reported for every repository.
+
+    Yields:
+        str:
+        Base URL of the server, to be used as the GitHub API URL.
+    """
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        """Request handler for the repository info and zipball endpoints."""
+
+        def do_GET(self) -> None:
+            """Responds with the zipball or the repository info, based on the path."""
+            if "/zipball/" in self.path:
+                body, content_type = archive, "application/zip"
+            else:
+                info = {"default_branch": "main", "language": language}
+                body, content_type = json.dumps(info).encode(), "application/json"
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args) -> None:
+            """Keeps the requests out of the benchmark output."""
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def measure(func: Callable[[], Any], files: int, size: int) -> Dict[str, Any]:
+    """Times a stage of the conversion.
+
+    Args:
+        func: Stage to run.
+        files: Number of files processed by the stage.
+        size: Number of bytes processed by the stage.
+
+    Returns:
+        Dict[str, Any]:
+        A dictionary with the duration and throughput of the stage.
+    """
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+    return {
+        "seconds": round(seconds, 6),
+        "files_per_second": round(files / seconds, 2) if seconds else None,
+        "mb_per_second": round(size / 1024**2 / seconds, 2) if seconds else None,
+    }
+
+
+def measure_import(module: str = "repo2md", runs: int = 5) -> Dict[str, Any]:
+    """Times the import of a module in fresh interpreters, as paid by every invocation of the CLI.
+
+    Args:
+        module: Name of the module to import.
+        runs: Number of interpreters to start, the fastest one is reported to leave out the noise.
+
+    Returns:
+        Dict[str, Any]:
+        A dictionary with the seconds spent on the import, the seconds spent on the whole process including the
+        interpreter's startup, and the heavy modules that were imported along.
+    """
+    env = dict(os.environ)
+    # Imports the package from the same location as this process, even from a source checkout
+    root = os.path.dirname(os.path.dirname(os.path.abspath(repo2md.__file__)))
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, (root, env.get("PYTHONPATH"))))
+    script = IMPORT_SCRIPT.format(module=module, heavy=HEAVY_MODULES)
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-c", script],
+            capture_output=True,
+            text=True,
+            env=env,
+            check=True,
+        )
+        sample = json.loads(result.stdout)
+        sample["process_seconds"] = time.perf_counter() - start
+        samples.append(sample)
+    return {
+        "seconds": round(min(sample["seconds"] for sample in samples), 6),
+        "process_seconds": round(
+            min(sample["process_seconds"] for sample in samples), 6
+        ),
+        "heavy_modules": samples[0]["loaded"],
+    }
+
+
+def run(
+    files: int = 1000,
+    depth: int = 4,
+    file_size: int = 4096,
+    binary_fraction: float = 0.05,
+    ignored_fraction: float = 0.1,
+    seed: int = 0,
+    workers: int = None,
+    network: bool = False,
+    source: str = None,
+) -> Dict[str, Any]:
+    """Benchmarks the stages of the conversion on a synthetic repository.
+
+    Args:
+        files: Number of files to generate.
+        depth: Maximum depth of the directories.
+        file_size: Average size of a file in bytes.
+        binary_fraction: Fraction of the files that are binary.
+        ignored_fraction: Fraction of the files that are generated within ignored directories.
+        seed: Seed for the random generator.
+        workers: Number of threads to read files with, files are read sequentially when unset.
+        network: Boolean flag to also benchmark the download and extraction, from a local fake GitHub server.
+        source: Path to an existing repository to benchmark, instead of generating one.
+
+    Returns:
+        Dict[str, Any]:
+        A dictionary with the parameters, the repository that was benchmarked and the results of each stage,
+        along with the time to import the package and its CLI, and the peak RSS of the process across the run.
+    """
+    workdir = tempfile.mkdtemp(prefix="repo2md-bench-")
+    level = LOGGER.level
+    # Per-file logs would dominate the timings
+    LOGGER.setLevel(logging.WARNING)
+    try:
+        if source:
+            path = source
+            generated = None
+        else:
+            path = os.path.join(workdir, "bench")
+            generated = generate_tree(
+                path,
+                files=files,
+                depth=depth,
+                file_size=file_size,
+                binary_fraction=binary_fraction,
+                ignored_fraction=ignored_fraction,
+                seed=seed,
+            )
+        source_index = index.Index(path)
+        selected = [node.path for node in source_index.files()]
+        size = sum(source_index.size(filepath) for filepath in selected)
+        count = len(selected)
+        base_path = os.path.dirname(os.path.normpath(path))
+        results = {
+            "scan": measure(lambda: index.Index(path), count, size),
+            "tree": measure(lambda: tree.Tree(path).get(), count, size),
+            "get_files": measure(
+                lambda: [
+                    list(contents)
+                    for _, contents in main.get_files(path, workers=workers)
+                ],
+                count,
+                size,
+            ),
+            "get_code": measure(
+                lambda: main.get_code(base_path, main.get_files(path, workers=workers)),
+                count,
+                size,
+            ),
+            "generate_markdown": measure(
+                lambda: main.generate_markdown(
+                    path,
+                    filename=os.path.join(workdir, "bench.md"),
+                    workers=workers,
+                ),
+                count,
+                size,
+            ),
+        }
+        if network:
+            archive = make_archive(path, "bench-bench-0000000")
+            with serve_archive(archive) as url:
+                env = config.EnvConfig(git_api_url=url, git_owner="bench")
+                destination = os.path.join(workdir, "download")
+                os.makedirs(destination)
+                results["download_and_extract"] = measure(
+                    lambda: github.download_and_extract(
+                        "bench", dest_dir=destination, env=env
+                    ),
+                    count,
+                    len(archive),
+                )
+        results["import"] = {
+            module: measure_import(module) for module in ("repo2md", "repo2md.cli")
+        }
+    finally:
+        LOGGER.setLevel(level)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "version": repo2md.version,
+        "python": sys.version.split()[0],
+        "parameters": dict(
+            files=files,
+            depth=depth,
+            file_size=file_size,
+            binary_fraction=binary_fraction,
+            ignored_fraction=ignored_fraction,
+            seed=seed,
+            workers=workers,
+            source=source,
+        ),
+        "repository": {"generated": generated, "files": count, "bytes": size},
+        "results": results,
+        # The peak is the high-water mark of the whole process, so it is reported once for all the stages
+        "peak_rss": get_peak_rss(),
+    }
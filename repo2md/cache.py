@@ -0,0 +1,255 @@
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections.abc import Generator
+from typing import IO, Any, Dict
+
+from repo2md import config, github, languages
+from repo2md import metrics as _metrics
+
+LOGGER = logging.getLogger("repo2md")
+
+
+def get_variant(
+    language_filter: bool | str = False, options: Dict[str, Any] = None
+) -> str:
+    """Gets an identifier for the options a Markdown file is rendered with.
+
+    Args:
+        language_filter: Boolean flag to indicate that the files are filtered by the repository's language, or the
+            languages they are filtered by.
+        options: Options the Markdown file is rendered with, options that are unset or don't change the output are
+            ignored.
+
+    Returns:
+        str:
+        Identifier for the combination of options.
+    """
+    variant = "language" if language_filter else "all"
+    if isinstance(language_filter, str):
+        options = {
+            **(options or {}),
+            "languages": languages.get_languages(language_filter),
+        }
+    options = {
+        key: value
+        for key, value in (options or {}).items()
+        if value not in (None, False) and key not in ("workers",)
+    }
+    if options:
+        digest = hashlib.sha1(json.dumps(options, sort_keys=True).encode())
+        variant += f"-{digest.hexdigest()[:8]}"
+    return variant
+
+
+class Cache:
+    """A class to cache downloaded archives and generated Markdown files on disk, keyed by commit SHA.
+
+    >>> Cache
+
+    """
+
+    def __init__(self, directory: str = None, max_size: int = 1024**3):
+        """Initialize the cache directory and load the stored ETags.
+
+        Args:
+            directory: Directory to store the cache in.
+                Defaults to the environment variable REPO2MD_CACHE_DIR, or ``~/.cache/repo2md``.
+            max_size: Maximum size of the cache in bytes, least recently used entries are evicted beyond this.
+        """
+        self.directory = directory or config.get_env(
+            ["REPO2MD_CACHE_DIR"],
+            os.path.join(os.path.expanduser("~"), ".cache", "repo2md"),
+        )
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        os.makedirs(os.path.join(self.directory, "archives"), exist_ok=True)
+        os.makedirs(os.path.join(self.directory, "outputs"), exist_ok=True)
+        self.etags_file = os.path.join(self.directory, "etags.json")
+        try:
+            with open(self.etags_file) as file:
+                self.etags: Dict[str, Dict[str, str]] = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.etags = {}
+
+    def resolve(
+        self, repo: str, branch: str = None, env: config.EnvConfig = None
+    ) -> str:
+        """Resolves a branch to its head commit SHA, with a conditional request when the branch was resolved before.
+
+        Args:
+            repo: The name of the repository.
+            branch: Branch name to resolve. If not specified, the default branch will be used.
+            env: Configuration for the repository's owner and authentication, defaults to ``config.env``.
+
+        Returns:
+            str:
+            The commit SHA of the branch head.
+        """
+        env = env or config.env
+        key = f"{env.git_api_url}/{env.git_owner}/{repo}@{branch or 'HEAD'}"
+        cached = self.etags.get(key, {})
+        resolved = github.get_commit_sha(
+            repo=repo, branch=branch, env=env, etag=cached.get("etag")
+        )
+        if resolved["sha"] is None:
+            LOGGER.info("%s/%s is unchanged at %s", env.git_owner, repo, cached["sha"])
+            return cached["sha"]
+        with self.lock:
+            self.etags[key] = resolved
+            with self.put(self.etags_file, mode="w") as file:
+                json.dump(self.etags, file, indent=2)
+        return resolved["sha"]
+
+    def fetch(
+        self,
+        repo: str,
+        branch: str = None,
+        language_filter: bool | str = False,
+        env: config.EnvConfig = None,
+        options: Dict[str, Any] = None,
+        metrics: _metrics.Metrics = None,
+    ) -> Dict[str, str]:
+        """Looks up the Markdown file for the head commit of a branch, downloading its archive on a cache miss.
+
+        Args:
+            repo: The name of the repository.
+            branch: Branch of the repository to use (default is None, which uses the default branch).
+            language_filter: Boolean flag to filter files by the repository's language, or comma-separated languages.
+            env: Configuration for the repository's owner and authentication, defaults to ``config.env``.
+            options: Options the Markdown file is rendered with, outputs are cached separately for each combination.
+            metrics: Metrics to record the time spent on the API metadata and the download in.
+
+        Returns:
+            Dict[str, str]:
+            A dictionary containing the path of the Markdown file in the cache, and whether it already exists.
+            On a cache miss, it also contains the path of the cached archive and the languages to filter files by.
+        """
+        env = env or config.env
+        metrics = metrics or _metrics.Metrics()
+        with metrics.stage("metadata"):
+            sha = self.resolve(repo=repo, branch=branch, env=env)
+        output = self.output_path(sha, repo, get_variant(language_filter, options))
+        if self.get(output):
+            LOGGER.info("Using cached output for %s/%s@%s", env.git_owner, repo, sha)
+            return {"output": output, "hit": True}
+        archive = self.archive_path(sha)
+        language = None
+        if self.get(archive):
+            LOGGER.info("Using cached archive for %s/%s@%s", env.git_owner, repo, sha)
+            # The repository's language is only looked up when the files are filtered by it
+            if language_filter is True:
+                language = github.get_repo_info(repo=repo, env=env, metrics=metrics)[
+                    "language"
+                ]
+        else:
+            with self.put(archive) as file:
+                downloaded = github.download_archive(
+                    repo=repo, branch=sha, env=env, archive=file, metrics=metrics
+                )
+            language = downloaded["language"]
+        language = languages.get_language(language_filter, language)
+        return {"output": output, "hit": False, "path": archive, "language": language}
+
+    def archive_path(self, sha: str) -> str:
+        """Gets the path of the cached archive for a commit.
+
+        Args:
+            sha: Commit SHA.
+
+        Returns:
+            str:
+            Path to the archive in the cache.
+        """
+        return os.path.join(self.directory, "archives", f"{sha}.zip")
+
+    def output_path(self, sha: str, name: str, variant: str = "all") -> str:
+        """Gets the path of the cached Markdown file for a commit.
+
+        Args:
+            sha: Commit SHA.
+            name: Name of the repository, used as the root of the paths in the Markdown file.
+            variant: Identifier for the options the Markdown file was rendered with.
+
+        Returns:
+            str:
+            Path to the Markdown file in the cache.
+        """
+        return os.path.join(self.directory, "outputs", f"{sha}-{name}-{variant}.md")
+
+    @staticmethod
+    def get(path: str) -> str | None:
+        """Gets an entry from the cache, marking it as recently used.
+
+        Args:
+            path: Path of the entry in the cache.
+
+        Returns:
+            str | None:
+            The path if the entry exists in the cache, otherwise None.
+        """
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    @contextlib.contextmanager
+    def put(self, path: str, mode: str = "wb") -> Generator[IO]:
+        """Opens a temporary file to write a cache entry into, which is moved into place only if writing succeeds.
+
+        Args:
+            path: Path of the entry in the cache.
+            mode: Mode to open the temporary file with.
+
+        Yields:
+            IO:
+            File object to write the entry into.
+        """
+        fd, temp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, mode) as file:
+                yield file
+            os.replace(temp, path)
+        except BaseException:
+            os.remove(temp)
+            raise
+
+    def store(self, source: str, path: str) -> str:
+        """Copies a file into the cache.
+
+        Args:
+            source: Path of the file to copy.
+            path: Path of the entry in the cache.
+
+        Returns:
+            str:
+            Path of the entry in the cache.
+        """
+        with open(source, "rb") as src, self.put(path) as dst:
+            shutil.copyfileobj(src, dst)
+        return path
+
+    def evict(self) -> None:
+        """Removes the least recently used entries until the cache fits within its maximum size."""
+        entries = []
+        for folder in ("archives", "outputs"):
+            with os.scandir(os.path.join(self.directory, folder)) as scanner:
+                entries.extend(
+                    (entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                    for entry in scanner
+                    if entry.is_file() and not entry.name.endswith(".tmp")
+                )
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            LOGGER.debug("Evicting %s from cache", path)
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+            total -= size
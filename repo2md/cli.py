@@ -0,0 +1,475 @@
+import enum
+import json
+import sys
+
+import click
+
+import repo2md
+from repo2md import main
+
+
+class Command(enum.Enum):
+    """Enum to represent the available commands for the commandline interface."""
+
+    GITHUB = "github"
+    LOCAL = "local"
+    BATCH = "batch"
+    BENCH = "bench"
+    SERVE = "serve"
+
+
+def print_help(command: Command = None, bold: bool = False) -> None:
+    """Prints the help section for the commandline interface."""
+    options = {
+        "--version | -V": "Prints the version.",
+        "--help | -H": "Prints the help section.",
+    }
+    arbitrary = f"\nCommand: {command.value}" if command else ""
+    if command == Command.GITHUB:
+        options = {
+            "--repo | -R": "Name of the GitHub repository to convert.",
+            "--owner | -O": "Name of the GitHub repository's owner/organization.",
+            "--branch | -B": "Branch of the repository to use (default is None, which uses the default branch).",
+            "--clean | -C": "Boolean flag to delete the repository after conversion (default is 'True').",
+            "--language | -L": "Boolean flag to filter files by language (default is False).",
+            "--languages": "Comma-separated languages to filter files by, eg: python,go (default is None).",
+            "--destination | -D": "Destination directory to store the Markdown file (default is 'tmp').",
+            "--workers | -W": "Number of threads to read files with (default is None, which reads sequentially).",
+            "--in-archive | -A": "Boolean flag to render from the zipball without extracting it (default is False).",
+            "--sparse": "Boolean flag to fetch only the files that pass the filters, not the zipball (default False).",
+            "--max-file-size": "Maximum size of a file in bytes, larger files are truncated (default is None).",
+            "--max-total-size": "Maximum total size of the files in bytes, the rest are skipped (default is None).",
+            "--gitignore | -G": "Boolean flag to also skip the patterns in .gitignore/.repo2mdignore (default False).",
+            "--max-tokens": "Maximum number of tokens in the code contents, the rest are skipped (default is None).",
+            "--policy": "Order to fill the token budget in: smallest, extension or depth (default is walk order).",
+            "--summary": "Boolean flag to add a table of the selected files after the tree (default is False).",
+            "--tree-depth": "Maximum depth of the directories to expand in the tree (default is None, no limit).",
+            "--tree-entries": "Maximum number of entries to list in each directory of the tree (default is None).",
+            "--dedup": "Replace repeated contents with references: exact files, or near for similar files too.",
+            "--shard-size": "Size in bytes to split the output into numbered parts at (default is None).",
+            "--shard-tokens": "Approximate tokens to split the output into numbered parts at (default is None).",
+            "--shard-directories": "Boolean flag to write each top-level directory into its own part (default False).",
+            "--metrics-file": "File to export stage timings and counts to, as Prometheus text for .prom or JSON lines.",
+            "--cache-dir": "Directory to cache archives and outputs by commit SHA (default is None, no caching).",
+        }
+    elif command == Command.LOCAL:
+        options = {
+            "--source | -S": "Source path to the local repo.",
+            "--destination | -D": "Destination directory to store the Markdown file (default is 'tmp').",
+            "--language | -L": "Programming language of the code files in source path (default is None).",
+            "--languages": "Comma-separated languages to filter files by, eg: python,go (default is None).",
+            "--workers | -W": "Number of threads to read files with (default is None, which reads sequentially).",
+            "--incremental | -I": "Boolean flag to only re-read files changed since the last run (default is False).",
+            "--ref": "Branch, tag or commit of a git repository to render without a checkout (default is None).",
+            "--since": "Branch, tag or commit of a git repository, only files changed since are rendered.",
+            "--max-file-size": "Maximum size of a file in bytes, larger files are truncated (default is None).",
+            "--max-total-size": "Maximum total size of the files in bytes, the rest are skipped (default is None).",
+            "--gitignore | -G": "Boolean flag to also skip the patterns in .gitignore/.repo2mdignore (default False).",
+            "--max-tokens": "Maximum number of tokens in the code contents, the rest are skipped (default is None).",
+            "--policy": "Order to fill the token budget in: smallest, extension or depth (default is walk order).",
+            "--summary": "Boolean flag to add a table of the selected files after the tree (default is False).",
+            "--tree-depth": "Maximum depth of the directories to expand in the tree (default is None, no limit).",
+            "--tree-entries": "Maximum number of entries to list in each directory of the tree (default is None).",
+            "--dedup": "Replace repeated contents with references: exact files, or near for similar files too.",
+            "--shard-size": "Size in bytes to split the output into numbered parts at (default is None).",
+            "--shard-tokens": "Approximate tokens to split the output into numbered parts at (default is None).",
+            "--shard-directories": "Boolean flag to write each top-level directory into its own part (default False).",
+            "--metrics-file": "File to export stage timings and counts to, as Prometheus text for .prom or JSON lines.",
+        }
+    elif command == Command.BATCH:
+        options = {
+            "--repo | -R": "Comma-separated names of the repositories, as 'repo' or 'owner/repo' (default is all).",
+            "--owner | -O": "Name of the owner/organization, all its repositories are converted when --repo is unset.",
+            "--branch | -B": "Branch of the repositories to use (default is None, which uses the default branch).",
+            "--clean | -C": "Boolean flag to delete the repositories after conversion (default is 'True').",
+            "--language | -L": "Boolean flag to filter files by each repository's language (default is False).",
+            "--languages": "Comma-separated languages to filter files by, eg: python,go (default is None).",
+            "--destination | -D": "Destination directory to store the Markdown files (default is 'tmp').",
+            "--workers | -W": "Number of threads to download the repositories with (default is 4).",
+            "--processes | -P": "Number of processes to render the Markdown files with (default is the CPU count).",
+            "--in-archive | -A": "Boolean flag to render from the zipballs without extracting them (default is False).",
+            "--max-file-size": "Maximum size of a file in bytes, larger files are truncated (default is None).",
+            "--max-total-size": "Maximum total size of the files in bytes, the rest are skipped (default is None).",
+            "--gitignore | -G": "Boolean flag to also skip the patterns in .gitignore/.repo2mdignore (default False).",
+            "--max-tokens": "Maximum number of tokens in the code contents, the rest are skipped (default is None).",
+            "--policy": "Order to fill the token budget in: smallest, extension or depth (default is walk order).",
+            "--summary": "Boolean flag to add a table of the selected files after the tree (default is False).",
+            "--tree-depth": "Maximum depth of the directories to expand in the tree (default is None, no limit).",
+            "--tree-entries": "Maximum number of entries to list in each directory of the tree (default is None).",
+            "--dedup": "Replace repeated contents with references: exact files, or near for similar files too.",
+            "--cache-dir": "Directory to cache archives and outputs by commit SHA (default is None, no caching).",
+        }
+    elif command == Command.BENCH:
+        options = {
+            "--files": "Number of files in the synthetic repository (default is 1000).",
+            "--depth": "Maximum depth of the directories in the synthetic repository (default is 4).",
+            "--file-size": "Average size of a file in bytes (default is 4096).",
+            "--binary-fraction": "Fraction of the files that are binary (default is 0.05).",
+            "--ignored-fraction": "Fraction of the files within ignored directories (default is 0.1).",
+            "--seed": "Seed for the random generator (default is 0).",
+            "--workers | -W": "Number of threads to read files with (default is None, which reads sequentially).",
+            "--network": "Boolean flag to also benchmark downloads from a local fake GitHub server (default is False).",
+            "--source | -S": "Path to an existing repository to benchmark instead of a synthetic one.",
+            "--import-target": "Maximum seconds to import the CLI, the benchmark fails when exceeded (default None).",
+        }
+    elif command == Command.SERVE:
+        options = {
+            "--host": "Host to listen on (default is '127.0.0.1').",
+            "--port": "Port to listen on (default is 8000).",
+            "--socket": "Path of a Unix socket to listen on, instead of the host and port.",
+            "--owner | -O": "Default owner/organization of the repositories in the jobs.",
+            "--destination | -D": "Destination directory to store the jobs' Markdown files (default is 'tmp').",
+            "--workers | -W": "Number of jobs to run at the same time (default is 4).",
+            "--max-queue": "Maximum number of jobs waiting to run, the rest are rejected (default is 100).",
+            "--cache-dir": "Directory to cache archives and outputs by commit SHA, shared by all the jobs.",
+        }
+    else:
+        arbitrary = (
+            "\nUsage: repo2md [arbitrary-command]"
+            "\n\nCommands:"
+            "\n\t* github: Initiates the conversion process."
+            "\n\t* local: Uses a local directory as the source for conversion."
+            "\n\t* batch: Converts many repositories, or all the repositories of an owner."
+            "\n\t* bench: Benchmarks the conversion on a synthetic repository and prints the results as JSON."
+            "\n\t* serve: Runs a server that converts repositories from a queue of jobs submitted over HTTP."
+        )
+    # unique way to increase spacing to keep all values monotonic
+    _longest_key = len(max(options.keys()))
+    _pretext = "\n\t* "
+    choices = _pretext + _pretext.join(
+        f"{k} {'·' * (_longest_key - len(k) + 8)}→ {v}".expandtabs()
+        for k, v in options.items()
+    )
+    click.secho(f"{arbitrary}" f"\n\nOptions:{choices}\n", bold=bold, err=True)
+
+
+def rename_io_map(command: Command, **kwargs) -> dict:
+    """Renames the keyword arguments to match the expected parameters for the conversion functions.
+
+    Args:
+        command: The command being executed (GITHUB, LOCAL or BATCH).
+        **kwargs: Keyword arguments to be renamed.
+
+    Returns:
+        dict:
+        A dictionary with the renamed keyword arguments.
+    """
+    if command == Command.GITHUB:
+        kwargs_map = {
+            "repo": "repo_name",
+            "owner": "git_owner",
+            "language": "language_filter",
+            "clean": "delete",
+            "cache_dir": "cache",
+        }
+    elif command == Command.LOCAL:
+        kwargs_map = {
+            "source": "source_repo_path",
+            "language": "source_repo_language",
+        }
+    elif command == Command.BATCH:
+        kwargs_map = {
+            "repo": "repos",
+            "owner": "git_owner",
+            "language": "language_filter",
+            "clean": "delete",
+            "cache_dir": "cache",
+        }
+    else:
+        # This should never happen, but just in case
+        raise RuntimeError(f"Unknown command: {command}")
+    final_kwargs = {}
+    for key, value in kwargs.items():
+        if kwargs_map.get(key):
+            final_kwargs[kwargs_map[key]] = value
+        else:
+            final_kwargs[key] = value
+    # Languages to filter by take the place of the flag to filter by the repository's language
+    if languages := final_kwargs.pop("languages", None):
+        final_kwargs["language_filter"] = languages
+    return final_kwargs
+
+
+@click.command()
+@click.argument("github", required=False)
+@click.argument("local", required=False)
+@click.option("--version", "-V", is_flag=True, help="Prints the version.")
+@click.option("--help", "-H", is_flag=True, help="Prints the help section.")
+@click.option("--repo", "-R", help="Name of the GitHub repository to convert.")
+@click.option("--owner", "-O", help="Name of the GitHub repository to convert.")
+@click.option(
+    "--branch",
+    "-B",
+    help="Branch of the repository to use (default is None, which uses the default branch).",
+)
+@click.option(
+    "--destination",
+    "-D",
+    help="Output directory to store the Markdown file (default is 'tmp').",
+    default="tmp",
+)
+@click.option(
+    "--clean",
+    "-C",
+    help="Boolean flag to delete the repository after conversion (default is True).",
+    is_flag=False,
+    default=True,
+)
+@click.option(
+    "--language",
+    "-L",
+    help="Boolean flag to filter files by language (default is False).",
+    is_flag=True,
+    default=False,
+)
+@click.option(
+    "--languages",
+    help="Comma-separated languages to filter files by, eg: python,go (default is None).",
+)
+@click.option(
+    "--source",
+    "-S",
+    help="Source path to a repo if a directory has been downloaded already.",
+)
+@click.option(
+    "--workers",
+    "-W",
+    help="Number of threads to read files with (default is None, which reads sequentially).",
+    type=int,
+)
+@click.option(
+    "--processes",
+    "-P",
+    help="Number of processes to render the Markdown files with in batch mode (default is the CPU count).",
+    type=int,
+)
+@click.option(
+    "--in-archive",
+    "-A",
+    help="Boolean flag to render from the zipball without extracting it (default is False).",
+    is_flag=True,
+    default=False,
+)
+@click.option(
+    "--sparse",
+    help="Boolean flag to fetch only the files that pass the filters, not the zipball (default False).",
+    is_flag=True,
+    default=False,
+)
+@click.option(
+    "--incremental",
+    "-I",
+    help="Boolean flag to only re-read files changed since the last run of a local source (default is False).",
+    is_flag=True,
+    default=False,
+)
+@click.option(
+    "--ref",
+    help="Branch, tag or commit of a local git repository to render without a checkout (default is None).",
+)
+@click.option(
+    "--since",
+    help="Branch, tag or commit of a local git repository, only files changed since are rendered.",
+)
+@click.option(
+    "--cache-dir",
+    help="Directory to cache archives and outputs by commit SHA (default is None, no caching).",
+)
+@click.option(
+    "--max-file-size",
+    help="Maximum size of a file in bytes, larger files are truncated (default is None).",
+    type=int,
+)
+@click.option(
+    "--max-total-size",
+    help="Maximum total size of the files in bytes, the rest are skipped (default is None).",
+    type=int,
+)
+@click.option(
+    "--max-tokens",
+    help="Maximum number of tokens in the code contents, the rest are skipped (default is None).",
+    type=int,
+)
+@click.option(
+    "--policy",
+    help="Order to fill the token budget in: smallest, extension or depth (default is walk order).",
+    type=click.Choice(["smallest", "extension", "depth"]),
+)
+@click.option(
+    "--summary",
+    help="Boolean flag to add a table of the selected files after the tree (default is False).",
+    is_flag=True,
+    default=False,
+)
+@click.option(
+    "--tree-depth",
+    help="Maximum depth of the directories to expand in the tree (default is None, no limit).",
+    type=int,
+)
+@click.option(
+    "--tree-entries",
+    help="Maximum number of entries to list in each directory of the tree (default is None).",
+    type=int,
+)
+@click.option(
+    "--dedup",
+    help="Replace repeated contents with references: exact files, or near for similar files too.",
+    type=click.Choice(["exact", "near"]),
+)
+@click.option(
+    "--shard-size",
+    help="Size in bytes to split the output into numbered parts at (default is None).",
+    type=int,
+)
+@click.option(
+    "--shard-tokens",
+    help="Approximate tokens to split the output into numbered parts at (default is None).",
+    type=int,
+)
+@click.option(
+    "--shard-directories",
+    help="Boolean flag to write each top-level directory into its own part (default False).",
+    is_flag=True,
+    default=False,
+)
+@click.option(
+    "--files",
+    help="Number of files in the synthetic repository to benchmark.",
+    type=int,
+)
+@click.option(
+    "--depth", help="Maximum depth of the synthetic repository to benchmark.", type=int
+)
+@click.option("--file-size", help="Average size of a file in bytes.", type=int)
+@click.option(
+    "--binary-fraction", help="Fraction of the files that are binary.", type=float
+)
+@click.option(
+    "--ignored-fraction",
+    help="Fraction of the files within ignored directories.",
+    type=float,
+)
+@click.option("--seed", help="Seed for the random generator.", type=int)
+@click.option(
+    "--network",
+    help="Boolean flag to also benchmark downloads from a local fake GitHub server.",
+    is_flag=True,
+    default=False,
+)
+@click.option(
+    "--import-target",
+    help="Maximum seconds to import the CLI, the benchmark fails when exceeded (default None).",
+    type=float,
+)
+@click.option("--host", help="Host to listen on in serve mode.", default="127.0.0.1")
+@click.option("--port", help="Port to listen on in serve mode.", type=int, default=8000)
+@click.option("--socket", help="Path of a Unix socket to listen on in serve mode.")
+@click.option(
+    "--max-queue",
+    help="Maximum number of jobs waiting to run in serve mode (default is 100).",
+    type=int,
+    default=100,
+)
+@click.option(
+    "--metrics-file",
+    help="File to export stage timings and counts to, as Prometheus text for .prom or JSON lines.",
+)
+@click.option(
+    "--gitignore",
+    "-G",
+    help="Boolean flag to also skip the patterns in .gitignore/.repo2mdignore (default False).",
+    is_flag=True,
+    default=False,
+)
+def commandline(*_, **kwargs) -> None:
+    # noinspection GrazieInspection
+    """Starter function to construct a markdown file from a GitHub repository.
+
+    Notes:
+        Flags can have different meanings based on the command used.
+    """
+    assert sys.argv[0].lower().endswith("repo2md"), "Invalid commandline trigger!!"
+
+    if kwargs.get("version"):
+        click.secho(f"repo2md {repo2md.version}", bold=True)
+        sys.exit(0)
+    try:
+        command = Command[kwargs.get(Command.GITHUB.value, Command.LOCAL.value).upper()]
+    except AttributeError:
+        print_help(bold=True)
+        sys.exit(1)
+
+    if kwargs.get("help"):
+        print_help(command, bold=True)
+        sys.exit(0)
+
+    if command == Command.GITHUB:
+        assert kwargs.get("repo"), "\n\t--repo flag is mandatory for GitHub repository!"
+        main.convert_repo_to_md(**rename_io_map(command, **kwargs))
+    elif command == Command.LOCAL:
+        assert kwargs.get(
+            "source"
+        ), "\n\t--source flag is mandatory for local repository!"
+        main.convert_repo_to_md(**rename_io_map(command, **kwargs))
+    elif command == Command.BATCH:
+        from repo2md import batch
+
+        if unsupported := [
+            f"--{key.replace('_', '-')}"
+            for key in batch.UNSUPPORTED_OPTIONS
+            if kwargs.get(key)
+        ]:
+            click.secho(
+                f"{', '.join(unsupported)} not supported in batch mode",
+                fg="red",
+                err=True,
+            )
+            sys.exit(1)
+        kwargs = rename_io_map(command, **kwargs)
+        if kwargs.get("workers") is None:
+            kwargs.pop("workers")
+        results = batch.convert_repos(**kwargs)
+        for repo, result in results.items():
+            if isinstance(result, Exception):
+                click.secho(f"{repo}: {result}", fg="red", err=True)
+            else:
+                click.secho(f"{repo}: {result}")
+        if any(isinstance(result, Exception) for result in results.values()):
+            sys.exit(1)
+    elif command == Command.BENCH:
+        from repo2md import bench
+
+        keys = ("files", "depth", "file_size", "binary_fraction", "ignored_fraction")
+        keys += ("seed", "workers", "network", "source")
+        report = bench.run(
+            **{key: kwargs[key] for key in keys if kwargs.get(key) is not None}
+        )
+        click.echo(json.dumps(report, indent=2))
+        target = kwargs.get("import_target")
+        if (
+            target
+            and (seconds := report["results"]["import"]["repo2md.cli"]["seconds"])
+            > target
+        ):
+            click.secho(
+                f"Import took {seconds:.3f}s, exceeds the target of {target:.3f}s",
+                fg="red",
+                err=True,
+            )
+            sys.exit(1)
+    elif command == Command.SERVE:
+        from repo2md import server
+
+        server.serve(
+            host=kwargs["host"],
+            port=kwargs["port"],
+            socket=kwargs.get("socket"),
+            destination=kwargs["destination"],
+            workers=kwargs.get("workers") or 4,
+            max_queue=kwargs["max_queue"],
+            cache=kwargs.get("cache_dir"),
+            git_owner=kwargs.get("owner"),
+        )
+    else:
+        print_help()
+        sys.exit(1)
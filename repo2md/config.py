@@ -1,11 +1,16 @@
+import functools
 import os
 from typing import Any, Dict, List
 
-import dotenv
-
 from repo2md import utils
 
-dotenv.load_dotenv(dotenv_path=dotenv.find_dotenv(), override=True)
+
+@functools.cache
+def load_dotenv() -> None:
+    """Loads the nearest ``.env`` file into the environment, once per process, when the configuration is first read."""
+    import dotenv
+
+    dotenv.load_dotenv(dotenv_path=dotenv.find_dotenv(), override=True)
 
 
 def get_env(
@@ -22,6 +27,7 @@ def get_env(
         str:
         The value of the first matching environment variable, or the default value if none match.
     """
+    load_dotenv()
     for key in keys:
         if value := os.environ.get(key.lower()):
             return value
@@ -61,4 +67,18 @@ class EnvConfig:
         self.repos_url = utils.urljoin(self.git_api_url, "repos")
 
 
-env = EnvConfig()
+def __getattr__(name: str) -> Any:
+    """Builds the default configuration on first access, so importing the module reads no environment or files.
+
+    Args:
+        name: Name of the module attribute.
+
+    Returns:
+        Any:
+        The default configuration for ``env``.
+    """
+    global env
+    if name == "env":
+        env = EnvConfig()
+        return env
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
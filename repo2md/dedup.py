@@ -0,0 +1,152 @@
+import hashlib
+import zlib
+from collections.abc import Generator
+from typing import Dict, List, Tuple
+
+# Modes to deduplicate the contents in, whole files only or also the repeated chunks within similar files
+MODES = ("exact", "near")
+# Chunks end after a line whose checksum is a multiple of this, so an edit shifts only the chunks around it
+CHUNK_MODULUS = 8
+# Maximum number of lines in a chunk, and the minimum number of characters in a run of chunks to be replaced
+CHUNK_LINES = 32
+CHUNK_SIZE = 256
+
+
+class Dedup:
+    """A class to find contents that were already written to the output, by hashing them as they are written.
+
+    >>> Dedup
+
+    """
+
+    def __init__(self, near: bool = False):
+        """Initialize the hashes of the contents written so far.
+
+        Args:
+            near: Boolean flag to also replace the chunks of lines that were written before as part of another file.
+        """
+        self.near = near
+        self.files: Dict[bytes, str] = {}
+        # Digest of each chunk, mapped to the file and the line number it was first written at
+        self.chunks: Dict[bytes, Tuple[str, int]] = {}
+        # Digest of the chunk at each file and line number, to extend a run of repeated chunks with the next one
+        self.locations: Dict[Tuple[str, int], bytes] = {}
+        self.duplicates = 0
+
+    @staticmethod
+    def digest(content: str) -> bytes:
+        """Hashes a content.
+
+        Args:
+            content: Text to hash.
+
+        Returns:
+            bytes:
+            Digest of the content.
+        """
+        return hashlib.blake2b(content.encode("utf-8"), digest_size=16).digest()
+
+    @staticmethod
+    def split(content: str) -> Generator[Tuple[int, List[str]]]:
+        """Splits a content into chunks of lines, with boundaries defined by the lines themselves.
+
+        Args:
+            content: Text to split.
+
+        Yields:
+            Tuple[int, List[str]]:
+            Zero-based line number each chunk starts at, and the lines in the chunk with their line breaks.
+
+        Notes:
+            A chunk ends after a line whose checksum is a multiple of ``CHUNK_MODULUS``, or after ``CHUNK_LINES``.
+            Lines inserted into a copy of a file only change the chunks they are inserted in, the rest still match.
+        """
+        chunk, start = [], 0
+        for number, line in enumerate(content.splitlines(keepends=True)):
+            chunk.append(line)
+            boundary = zlib.crc32(line.encode("utf-8")) % CHUNK_MODULUS == 0
+            if boundary or len(chunk) >= CHUNK_LINES:
+                yield start, chunk
+                chunk, start = [], number + 1
+        if chunk:
+            yield start, chunk
+
+    def find(self, relative: str, content: str) -> str | None:
+        """Finds a file written before with the same content, and records the content for the files that follow.
+
+        Args:
+            relative: Path of the file in the output.
+            content: Content of the file, as it would be written to the output.
+
+        Returns:
+            str | None:
+            Path of the file with the identical content, or None if the content is new or empty.
+        """
+        if not content:
+            return None
+        digest = self.digest(content)
+        if original := self.files.get(digest):
+            self.duplicates += 1
+            return original
+        self.files[digest] = relative
+        return None
+
+    def replace(self, relative: str, content: str) -> str:
+        """Replaces the chunks of lines that were written before with references to where they were first written.
+
+        Args:
+            relative: Path of the file in the output.
+            content: Content of the file, as it would be written to the output.
+
+        Returns:
+            str:
+            Content with runs of repeated chunks replaced by a line each, or the content as is in the exact mode.
+        """
+        if not self.near:
+            return content
+        lines, replaced = [], False
+        # The file and line number of the run of repeated chunks being merged, with the text of the chunks
+        run = None
+        for start, chunk in self.split(content):
+            text = "".join(chunk)
+            digest = self.digest(text)
+            if (found := self.chunks.get(digest)) is None:
+                self.chunks[digest] = (relative, start)
+            self.locations[(relative, start)] = digest
+            if run and self.locations.get((run[0], run[1] + run[2])) == digest:
+                run[3].append(text)
+                run = (run[0], run[1], run[2] + len(chunk), run[3])
+                continue
+            if run:
+                replaced |= self.flush(run, lines)
+            run = (found[0], found[1], len(chunk), [text]) if found else None
+            if not found:
+                lines.append(text)
+        if run:
+            replaced |= self.flush(run, lines)
+        if not replaced:
+            return content
+        self.duplicates += 1
+        return "".join(lines).rstrip("\n")
+
+    @staticmethod
+    def flush(run: Tuple[str, int, int, List[str]], lines: List[str]) -> bool:
+        """Adds a run of repeated chunks to the lines, as a reference if it is long enough to be worth replacing.
+
+        Args:
+            run: File and zero-based line number the run was first written at, its number of lines and its chunks.
+            lines: Lines of the content being deduplicated.
+
+        Returns:
+            bool:
+            Returns a boolean flag to indicate if the run was replaced with a reference.
+        """
+        original, start, count, texts = run
+        if sum(len(text.strip()) for text in texts) < CHUNK_SIZE:
+            # Short runs, eg: blank lines or closing brackets, cost more as a reference than as they are
+            lines.extend(texts)
+            return False
+        lines.append(
+            f"… {count} lines identical to `{original}` from line {start + 1}\n"
+        )
+        return True
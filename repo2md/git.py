@@ -0,0 +1,154 @@
+import logging
+import os
+import subprocess
+import threading
+from typing import IO, List, Set, Tuple
+
+LOGGER = logging.getLogger("repo2md")
+
+# Modes of the regular and executable files in a tree, symlinks and submodules are left out
+FILE_MODES = ("100644", "100755")
+
+
+class Repository:
+    """A class to read the files of a commit straight from the object database of a local git repository.
+
+    >>> Repository
+
+    """
+
+    def __init__(self, path: str | os.PathLike, ref: str = None):
+        """Initialize the repository and resolve the reference to a commit.
+
+        Args:
+            path: Path to the repository, either a working tree or a bare repository such as a mirror clone.
+            ref: Branch, tag or commit to read the files of, defaults to ``HEAD``.
+        """
+        self.path = os.fspath(path)
+        self.ref = ref or "HEAD"
+        self.commit = self.resolve(self.ref)
+        self.lock = threading.Lock()
+        self.process: subprocess.Popen | None = None
+
+    def run(self, *args: str) -> bytes:
+        """Runs a git command in the repository.
+
+        Args:
+            *args: Arguments to the git command.
+
+        Returns:
+            bytes:
+            Output of the command.
+
+        Raises:
+            ValueError:
+            If the command fails, with the error from git.
+        """
+        result = subprocess.run(
+            ["git", "-C", self.path, *args], capture_output=True, check=False
+        )
+        if result.returncode:
+            raise ValueError(result.stderr.decode(errors="replace").strip())
+        return result.stdout
+
+    def resolve(self, ref: str) -> str:
+        """Resolves a reference to the SHA of its commit.
+
+        Args:
+            ref: Branch, tag or commit.
+
+        Returns:
+            str:
+            The commit SHA.
+        """
+        return (
+            self.run("rev-parse", "--verify", "--end-of-options", f"{ref}^{{commit}}")
+            .decode()
+            .strip()
+        )
+
+    def ls_tree(self) -> List[Tuple[str, str, int]]:
+        """Lists the files in the tree of the commit, with their sizes, in a single ``git ls-tree`` call.
+
+        Returns:
+            List[Tuple[str, str, int]]:
+            A list of tuples with the path, blob SHA and size of each file.
+        """
+        entries = []
+        for line in self.run(
+            "ls-tree", "-r", "-l", "-z", "--full-tree", self.commit
+        ).split(b"\0"):
+            if not line:
+                continue
+            info, _, path = line.partition(b"\t")
+            mode, _, sha, size = info.decode().split()
+            if mode in FILE_MODES:
+                entries.append((path.decode("utf-8", "replace"), sha, int(size)))
+        return entries
+
+    def changed(self, since: str) -> Set[str]:
+        """Lists the files that were added or modified between a reference and the commit.
+
+        Args:
+            since: Branch, tag or commit to compare the commit with.
+
+        Returns:
+            Set[str]:
+            Paths of the changed files, deleted files are left out since they are not in the commit.
+        """
+        output = self.run(
+            "diff",
+            "--name-only",
+            "-z",
+            "--no-renames",
+            "--diff-filter=d",
+            self.resolve(since),
+            self.commit,
+        )
+        return {path.decode("utf-8", "replace") for path in output.split(b"\0") if path}
+
+    def read(self, sha: str) -> bytes:
+        """Reads a blob through a ``git cat-file --batch`` process, which is kept open for the next reads.
+
+        Args:
+            sha: SHA of the blob.
+
+        Returns:
+            bytes:
+            Content of the blob.
+        """
+        with self.lock:
+            if self.process is None:
+                self.process = subprocess.Popen(
+                    ["git", "-C", self.path, "cat-file", "--batch"],
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                )
+            stdin: IO[bytes] = self.process.stdin
+            stdout: IO[bytes] = self.process.stdout
+            stdin.write(f"{sha}\n".encode())
+            stdin.flush()
+            header = stdout.readline().split()
+            if len(header) != 3:
+                raise ValueError(f"Object {sha} is missing from {self.path}")
+            content = stdout.read(int(header[2]))
+            # Each object is followed by a newline
+            stdout.read(1)
+        return content
+
+    def close(self) -> None:
+        """Stops the ``git cat-file`` process, if it was started."""
+        with self.lock:
+            if self.process is not None:
+                self.process.stdin.close()
+                self.process.wait()
+                self.process.stdout.close()
+                self.process = None
+
+    def __enter__(self) -> "Repository":
+        """Returns the repository, to stop the ``git cat-file`` process on exit."""
+        return self
+
+    def __exit__(self, *args) -> None:
+        """Stops the ``git cat-file`` process."""
+        self.close()
@@ -1,75 +1,384 @@
-import io
+import email.utils
 import logging
 import os
+import random
 import shutil
+import tempfile
+import time
 import zipfile
-from typing import Dict
+from typing import IO, Any, Dict, List, Tuple
 
 import requests
+import requests.adapters
 
-from repo2md import config, utils
+from repo2md import config, ignore, languages
+from repo2md import metrics as _metrics
+from repo2md import utils
 
 LOGGER = logging.getLogger("repo2md")
 
+# Archives smaller than this are kept in memory, larger ones are rolled over to a temporary file on disk
+SPOOL_SIZE = 64 * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+# Fraction of the repository's bytes matching the filters, above which a sparse fetch downloads the zipball instead
+SPARSE_RATIO = 0.5
+# Maximum number of files to fetch one by one in a sparse fetch, each of them counts against the API rate limit
+SPARSE_FILES = 500
+
+
+class RetryPolicy:
+    """A class to decide when and how long to wait before retrying a request, shared by the sync and async clients.
+
+    >>> RetryPolicy
+
+    """
+
+    def __init__(
+        self,
+        retries: int = 5,
+        backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        max_rate_limit_wait: float = 300.0,
+    ):
+        """Initialize the retry policy.
+
+        Args:
+            retries: Maximum number of attempts for each request.
+            backoff: Base delay in seconds for the exponential backoff between attempts.
+            max_backoff: Maximum delay in seconds between attempts.
+            max_rate_limit_wait: Maximum time in seconds to wait for a rate limit to reset before giving up.
+        """
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_rate_limit_wait = max_rate_limit_wait
+
+    def get_delay(self, attempt: int, response: Any = None) -> float:
+        """Gets the time to wait before the next attempt, based on the rate-limit headers or exponential backoff.
+
+        Args:
+            attempt: Zero-based number of the attempt that failed.
+            response: Response of the failed attempt, if any.
+
+        Returns:
+            float:
+            Time to wait in seconds.
+        """
+        if response is not None:
+            if retry_after := response.headers.get("Retry-After"):
+                try:
+                    return float(retry_after)
+                except ValueError:
+                    retry_at = email.utils.parsedate_to_datetime(retry_after)
+                    return max(retry_at.timestamp() - time.time(), 0)
+            if response.headers.get("X-RateLimit-Remaining") == "0":
+                reset = float(response.headers.get("X-RateLimit-Reset", time.time()))
+                return max(reset - time.time(), 0) + 1
+        # Full jitter, to avoid batch conversions retrying in lockstep
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+
+    @staticmethod
+    def is_retryable(response: Any) -> bool:
+        """Checks if a failed response is worth retrying.
+
+        Args:
+            response: Response with a status code of 400 or above.
+
+        Returns:
+            bool:
+            Returns a boolean flag to indicate if the response is a server error or a rate limit.
+        """
+        if response.status_code >= 500 or response.status_code == 429:
+            return True
+        return response.status_code == 403 and (
+            response.headers.get("X-RateLimit-Remaining") == "0"
+            or "Retry-After" in response.headers
+        )
+
+
+class Client(RetryPolicy):
+    """A class to make requests to the GitHub API over a pooled session, with retries and rate-limit handling.
+
+    >>> Client
+
+    """
+
+    def __init__(
+        self,
+        timeout: float | Tuple[float, float] = (10, 60),
+        retries: int = 5,
+        backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        max_rate_limit_wait: float = 300.0,
+        pool_size: int = 10,
+    ):
+        """Initialize the client with a pooled session.
+
+        Args:
+            timeout: Timeout in seconds for each request, either a single value or a (connect, read) tuple.
+            retries: Maximum number of attempts for each request.
+            backoff: Base delay in seconds for the exponential backoff between attempts.
+            max_backoff: Maximum delay in seconds between attempts.
+            max_rate_limit_wait: Maximum time in seconds to wait for a rate limit to reset before giving up.
+            pool_size: Maximum number of connections to keep alive in the session's pool.
+        """
+        super().__init__(
+            retries=retries,
+            backoff=backoff,
+            max_backoff=max_backoff,
+            max_rate_limit_wait=max_rate_limit_wait,
+        )
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(
+        self,
+        url: str,
+        stream: bool = False,
+        env: config.EnvConfig = None,
+        params: Dict[str, Any] = None,
+        headers: Dict[str, str] = None,
+        metrics: _metrics.Metrics = None,
+    ) -> requests.Response:
+        """Makes a GET request to the specified URL with the configured headers, retrying on transient failures.
+
+        Args:
+            url: The URL to make the request to.
+            stream: Boolean flag to defer downloading the response body until it is iterated.
+            env: Configuration to authenticate the request with, defaults to ``config.env``.
+            params: Query parameters for the request.
+            headers: Additional headers for the request, overriding the default ones.
+            metrics: Metrics to count the requests and retries in.
+
+        Returns:
+            requests.Response: The response object from the GET request.
+
+        Notes:
+            - Connection errors, timeouts, 5xx and 429 responses are retried with exponential backoff and jitter.
+            - Rate-limited responses wait for ``Retry-After`` or ``X-RateLimit-Reset`` before retrying.
+            - Any other 4xx response is raised immediately.
+        """
+        headers = {
+            "Accept": "application/vnd.github+json",
+            "Authorization": f"Bearer {(env or config.env).git_token}",
+            **(headers or {}),
+        }
+        if metrics:
+            metrics.count("requests")
+        for attempt in range(self.retries):
+            LOGGER.debug("Attempt %d to fetch %s", attempt + 1, url)
+            try:
+                response = self.session.get(
+                    url,
+                    headers=headers,
+                    params=params,
+                    stream=stream,
+                    timeout=self.timeout,
+                )
+            except requests.exceptions.RequestException as error:
+                LOGGER.error(error)
+                delay = self.get_delay(attempt)
+            else:
+                if response.ok:
+                    return response
+                if not self.is_retryable(response):
+                    raise RuntimeError(
+                        f"Request failed on {url} with status {response.status_code}: {response.text}"
+                    )
+                delay = self.get_delay(attempt, response)
+                response.close()
+                if delay > self.max_rate_limit_wait:
+                    raise RuntimeError(
+                        f"Rate limit on {url} resets in {delay:.0f}s, exceeds wait limit of "
+                        f"{self.max_rate_limit_wait:.0f}s"
+                    )
+            if attempt + 1 < self.retries:
+                if metrics:
+                    metrics.count("retries")
+                LOGGER.warning(
+                    "Request failed on attempt %d, retrying in %.2fs...",
+                    attempt + 1,
+                    delay,
+                )
+                time.sleep(delay)
+        raise RuntimeError(f"Request failed on {url}")
+
+
+client = Client()
+
 
 def get_repo_info(
     repo: str,
+    env: config.EnvConfig = None,
+    metrics: _metrics.Metrics = None,
 ) -> Dict[str, str]:
     """Fetches the default branch and language of a GitHub repository.
 
     Args:
         repo: The name of the repository.
+        env: Configuration for the repository's owner and authentication, defaults to ``config.env``.
+        metrics: Metrics to record the time spent on the API metadata in.
 
     Returns:
         Dict[str, str]:
         A dictionary containing the default branch and language of the repository.
     """
-    LOGGER.info("Fetching default branch for %s/%s...", config.env.git_owner, repo)
-    url = utils.urljoin(config.env.repos_url, config.env.git_owner, repo)
-    response = requests.get(
-        url,
-        headers={
-            "Accept": "application/vnd.github+json",
-            "Authorization": f"Bearer {config.env.git_token}",
-        },
-    )
-    assert response.ok, response.text
-    data = response.json()
+    env = env or config.env
+    LOGGER.info("Fetching default branch for %s/%s...", env.git_owner, repo)
+    url = utils.urljoin(env.repos_url, env.git_owner, repo)
+    metrics = metrics or _metrics.Metrics()
+    with metrics.stage("metadata"):
+        data = make_request(url, env=env, metrics=metrics).json()
     return {"branch": data.get("default_branch"), "language": data.get("language")}
 
 
-def make_request(url: str) -> requests.Response:
-    """Makes a GET request to the specified URL with the configured headers.
+def make_request(
+    url: str,
+    stream: bool = False,
+    env: config.EnvConfig = None,
+    params: Dict[str, Any] = None,
+    headers: Dict[str, str] = None,
+    metrics: _metrics.Metrics = None,
+) -> requests.Response:
+    """Makes a GET request to the specified URL with the shared client.
 
     Args:
         url: The URL to make the request to.
+        stream: Boolean flag to defer downloading the response body until it is iterated.
+        env: Configuration to authenticate the request with, defaults to ``config.env``.
+        params: Query parameters for the request.
+        headers: Additional headers for the request, overriding the default ones.
+        metrics: Metrics to count the requests and retries in.
 
     Returns:
         requests.Response: The response object from the GET request.
     """
-    for attempt in range(5):
-        LOGGER.debug("Attempt %d to fetch %s", attempt + 1, url)
-        try:
-            response = requests.get(
-                url,
-                headers={
-                    "Accept": "application/vnd.github+json",
-                    "Authorization": f"Bearer {config.env.git_token}",
-                },
-            )
-            assert response.ok, response.text
-        except requests.exceptions.RequestException as error:
-            LOGGER.error(error)
-            LOGGER.warning("Request failed on attempt %d, retrying...", attempt + 1)
-            continue
-        return response
-    raise RuntimeError(f"Request failed on {url}")
+    return client.get(
+        url, stream=stream, env=env, params=params, headers=headers, metrics=metrics
+    )
+
+
+def get_commit_sha(
+    repo: str,
+    branch: str = None,
+    env: config.EnvConfig = None,
+    etag: str = None,
+) -> Dict[str, str]:
+    """Resolves a branch of a GitHub repository to its head commit SHA.
+
+    Args:
+        repo: The name of the repository.
+        branch: Branch name to resolve. If not specified, the default branch will be used.
+        env: Configuration for the repository's owner and authentication, defaults to ``config.env``.
+        etag: ETag of a previous response, to make a conditional request.
+
+    Returns:
+        Dict[str, str]:
+        A dictionary containing the commit SHA (None when unchanged since ``etag``) and the ETag of the response.
+
+    Notes:
+        Conditional requests answered with ``304 Not Modified`` do not count against GitHub's rate limit.
+    """
+    env = env or config.env
+    url = utils.urljoin(env.repos_url, env.git_owner, repo, "commits", branch or "HEAD")
+    headers = {"Accept": "application/vnd.github.sha"}
+    if etag:
+        headers["If-None-Match"] = etag
+    response = make_request(url, env=env, headers=headers)
+    if response.status_code == 304:
+        return {"sha": None, "etag": etag}
+    return {"sha": response.text.strip(), "etag": response.headers.get("ETag")}
+
+
+def list_repos(
+    owner: str = None,
+    env: config.EnvConfig = None,
+) -> List[str]:
+    """Lists the names of all the repositories of a GitHub user or organization.
+
+    Args:
+        owner: Name of the user or organization, defaults to the owner in the configuration.
+        env: Configuration for authentication, defaults to ``config.env``.
+
+    Returns:
+        List[str]:
+        Names of the repositories, paged through until the last page.
+    """
+    env = env or config.env
+    owner = owner or env.git_owner
+    assert owner, "'git_owner' is required to list the repositories"
+    account = make_request(utils.urljoin(env.git_api_url, "users", owner), env=env)
+    kind = "orgs" if account.json().get("type") == "Organization" else "users"
+    LOGGER.info("Listing repositories for %s/%s...", kind, owner)
+    url = utils.urljoin(env.git_api_url, kind, owner, "repos")
+    params = {"per_page": 100}
+    repos = []
+    while url:
+        response = make_request(url, env=env, params=params)
+        repos.extend(repo["name"] for repo in response.json())
+        # The 'next' link already carries the query parameters
+        url, params = response.links.get("next", {}).get("url"), None
+    return repos
+
+
+def download_archive(
+    repo: str,
+    branch: str = None,
+    env: config.EnvConfig = None,
+    archive: IO[bytes] = None,
+    metrics: _metrics.Metrics = None,
+) -> Dict[str, Any]:
+    """Streams a GitHub repository's zipball into a spooled temporary file.
+
+    Args:
+        repo: Repository name.
+        branch: Branch name to download. If not specified, the default branch will be used.
+        env: Configuration for the repository's owner and authentication, defaults to ``config.env``.
+        archive: Binary file object to stream the zipball into, instead of a spooled temporary file.
+        metrics: Metrics to record the time spent and the bytes downloaded in.
+
+    Returns:
+        Dict[str, Any]:
+        A dictionary containing the archive as a binary file object (rewound to the start) and the repo's language.
+
+    Notes:
+        The archive is held in memory until it exceeds ``SPOOL_SIZE``, after which it is rolled over to disk.
+    """
+    env = env or config.env
+    metrics = metrics or _metrics.Metrics()
+    repo_info = get_repo_info(repo=repo, env=env, metrics=metrics)
+    url = utils.urljoin(
+        env.repos_url,
+        env.git_owner,
+        repo,
+        "zipball",
+        branch or repo_info["branch"],
+    )
+    LOGGER.info("Downloading '%s/%s'", env.git_owner, repo)
+    if archive is None:
+        archive = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    with metrics.stage("download"), make_request(
+        url=url, stream=True, env=env, metrics=metrics
+    ) as response:
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            archive.write(chunk)
+            metrics.count("bytes_downloaded", len(chunk))
+    archive.seek(0)
+    LOGGER.debug("Download successful")
+    return {"archive": archive, "language": repo_info["language"]}
 
 
 def download_and_extract(
     repo: str,
     dest_dir: str,
     branch: str = None,
+    env: config.EnvConfig = None,
+    metrics: _metrics.Metrics = None,
 ) -> Dict[str, str]:
     """Downloads a GitHub repository as a zip file and extracts it to the specified directory.
 
@@ -77,23 +386,38 @@ def download_and_extract(
         repo: Repository name.
         dest_dir: Destination directory where the repository will be extracted.
         branch: Branch name to download. If not specified, the default branch will be used.
+        env: Configuration for the repository's owner and authentication, defaults to ``config.env``.
+        metrics: Metrics to record the time spent on the download and the extraction in.
 
     Returns:
         str:
         True path to the extracted repository directory.
     """
-    repo_info = get_repo_info(repo=repo)
-    url = utils.urljoin(
-        config.env.repos_url,
-        config.env.git_owner,
-        repo,
-        "zipball",
-        branch or repo_info["branch"],
-    )
-    LOGGER.info("Downloading '%s/%s' to '%s'", config.env.git_owner, repo, dest_dir)
-    response = make_request(url=url)
-    LOGGER.debug("Download successful, unzipping...")
-    with zipfile.ZipFile(io.BytesIO(response.content)) as zip_ref:
+    metrics = metrics or _metrics.Metrics()
+    downloaded = download_archive(repo=repo, branch=branch, env=env, metrics=metrics)
+    with downloaded["archive"] as archive, metrics.stage("extract"):
+        true_path = extract_archive(archive=archive, repo=repo, dest_dir=dest_dir)
+    return {"path": true_path, "language": downloaded["language"]}
+
+
+def extract_archive(
+    archive: str | os.PathLike | IO[bytes],
+    repo: str,
+    dest_dir: str,
+) -> str:
+    """Extracts a zipball to the specified directory, renaming its top-level directory to the repository name.
+
+    Args:
+        archive: Path to the zip archive or a binary file object containing it.
+        repo: Repository name.
+        dest_dir: Destination directory where the repository will be extracted.
+
+    Returns:
+        str:
+        True path to the extracted repository directory.
+    """
+    LOGGER.debug("Unzipping '%s' to '%s'", repo, dest_dir)
+    with zipfile.ZipFile(archive) as zip_ref:
         zip_ref.extractall(dest_dir)
         subdir = zip_ref.namelist()[0].split("/")[0]
     LOGGER.debug(f"Repository unzipped to: {dest_dir}")
@@ -105,4 +429,305 @@ def download_and_extract(
         shutil.rmtree(true_path)
     LOGGER.debug("Renaming '%s' to '%s'", subdir, repo)
     os.rename(os.path.join(dest_dir, subdir), true_path)
-    return {"path": true_path, "language": repo_info["language"]}
+    return true_path
+
+
+def get_tree(
+    repo: str,
+    branch: str,
+    env: config.EnvConfig = None,
+    metrics: _metrics.Metrics = None,
+) -> Dict[str, Any]:
+    """Lists every file and directory in a branch of a GitHub repository, with a single call to the Git Trees API.
+
+    Args:
+        repo: Repository name.
+        branch: Branch name, or the SHA of a commit or tree.
+        env: Configuration for the repository's owner and authentication, defaults to ``config.env``.
+        metrics: Metrics to count the requests and retries in.
+
+    Returns:
+        Dict[str, Any]:
+        The recursive tree, with the path, type, SHA and size of each entry.
+        The tree is flagged as ``truncated`` when the repository is too large to be listed at once.
+    """
+    env = env or config.env
+    url = utils.urljoin(env.repos_url, env.git_owner, repo, "git", "trees", branch)
+    return make_request(url, env=env, params={"recursive": 1}, metrics=metrics).json()
+
+
+def get_blob(
+    repo: str,
+    sha: str,
+    env: config.EnvConfig = None,
+    metrics: _metrics.Metrics = None,
+) -> bytes:
+    """Fetches the raw content of a file in a GitHub repository, by the SHA of its blob.
+
+    Args:
+        repo: Repository name.
+        sha: SHA of the blob.
+        env: Configuration for the repository's owner and authentication, defaults to ``config.env``.
+        metrics: Metrics to count the requests and retries in.
+
+    Returns:
+        bytes:
+        Content of the file.
+    """
+    env = env or config.env
+    url = utils.urljoin(env.repos_url, env.git_owner, repo, "git", "blobs", sha)
+    headers = {"Accept": "application/vnd.github.raw+json"}
+    return make_request(url, env=env, headers=headers, metrics=metrics).content
+
+
+def is_ignored(
+    matcher: ignore.Matcher, ignored: Dict[tuple, bool], parts: tuple
+) -> bool:
+    """Checks if a directory or any of its parents is ignored, remembering the result for its siblings.
+
+    Args:
+        matcher: Matcher for the ignored names and patterns.
+        ignored: Results for the directories checked so far, mapped by their path parts.
+        parts: Path parts of the directory relative to the root.
+
+    Returns:
+        bool:
+        Returns a boolean flag to indicate if the directory is ignored.
+    """
+    if not parts:
+        return False
+    if (result := ignored.get(parts)) is None:
+        result = is_ignored(matcher, ignored, parts[:-1]) or matcher.match(
+            parts[-1], "/".join(parts), True
+        )
+        ignored[parts] = result
+    return result
+
+
+def get_capped(entry: Dict[str, Any], max_file_size: int = None) -> int:
+    """Gets the size of a file in the listing, up to the size it is truncated to.
+
+    Args:
+        entry: Blob entry of the listing.
+        max_file_size: Size each file is truncated to.
+
+    Returns:
+        int:
+        Size of the file in bytes, counted in the output.
+    """
+    if max_file_size is None:
+        return entry["size"]
+    return min(entry["size"], max_file_size)
+
+
+def walk_key(entry: Dict[str, Any]) -> tuple:
+    """Gets the key to order the files of the listing in, the same order they are selected for the output in.
+
+    Args:
+        entry: Blob entry of the listing.
+
+    Returns:
+        tuple:
+        Key that puts the files of a directory before the files of its subdirectories, each sorted by name.
+    """
+    *directories, name = entry["path"].split("/")
+    return tuple((1, part.casefold(), part) for part in directories) + (
+        (0, name.casefold(), name),
+    )
+
+
+def get_budgeted(
+    matches: List[Dict[str, Any]], max_total_size: int, max_file_size: int = None
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Splits the files of the listing into the ones that fit within the total size, and the ones beyond it.
+
+    Args:
+        matches: Blob entries that pass the filters.
+        max_total_size: Maximum total size of the files in bytes.
+        max_file_size: Size each file is truncated to, files are counted up to this size.
+
+    Returns:
+        Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        The files to fetch, and the files that are left out of the output.
+
+    Notes:
+        The files are admitted in the order ``main.Budget`` walks them in, so the same files are left out as from the
+        zipball. The output excludes the files left out here by their paths, rather than relying on the two agreeing.
+    """
+    admitted, oversized = [], []
+    total = 0
+    # Same as main.Budget, which admits the files in walk order
+    for entry in sorted(matches, key=walk_key):
+        size = get_capped(entry, max_file_size)
+        if total + size > max_total_size:
+            oversized.append(entry)
+        else:
+            total += size
+            admitted.append(entry)
+    return admitted, oversized
+
+
+def sparse_fetch(
+    repo: str,
+    dest_dir: str,
+    branch: str = None,
+    language_filter: bool | str = False,
+    gitignore: bool = False,
+    env: config.EnvConfig = None,
+    workers: int = 8,
+    max_ratio: float = SPARSE_RATIO,
+    max_file_size: int = None,
+    max_total_size: int = None,
+    metrics: _metrics.Metrics = None,
+) -> Dict[str, Any]:
+    """Fetches only the files of a GitHub repository that pass the filters, falling back to the zipball otherwise.
+
+    Args:
+        repo: Repository name.
+        dest_dir: Destination directory where the repository will be written.
+        branch: Branch name to fetch. If not specified, the default branch will be used.
+        language_filter: Boolean flag to only fetch the files in the repository's language, or comma-separated
+            languages to fetch the files of.
+        gitignore: Boolean flag to also skip the patterns in the repository's ``.gitignore`` and ``.repo2mdignore``,
+            and in the ``.gitignore`` files of its subdirectories.
+        env: Configuration for the repository's owner and authentication, defaults to ``config.env``.
+        workers: Number of threads to fetch the files with.
+        max_ratio: Fraction of the repository's bytes matching the filters, above which the zipball is downloaded.
+        max_file_size: Maximum size of a file in bytes, only enough of a larger file is written to truncate it.
+        max_total_size: Maximum total size of the files in bytes, files beyond it are not fetched.
+        metrics: Metrics to record the time spent and the bytes downloaded in.
+
+    Returns:
+        Dict[str, Any]:
+        A dictionary containing the path to the repository and its language, same as ``download_and_extract``,
+        along with the paths of the files left out by ``max_total_size`` as ``skipped``.
+
+    Notes:
+        - The tree is listed with the Git Trees API, and the ignore and language filters are applied to the listing.
+        - Files in other languages are written empty, so the directory tree of the output stays the same.
+        - Files beyond ``max_total_size`` are written empty too, and are to be excluded from the output's budget.
+        - The zipball is downloaded when the listing is truncated, or when the matching files are too many to fetch
+          one by one or make up more than ``max_ratio`` of the repository.
+    """
+    env = env or config.env
+    metrics = metrics or _metrics.Metrics()
+    repo_info = get_repo_info(repo=repo, env=env, metrics=metrics)
+    with metrics.stage("metadata"):
+        listing = get_tree(
+            repo=repo, branch=branch or repo_info["branch"], env=env, metrics=metrics
+        )
+    if listing.get("truncated"):
+        LOGGER.warning("Tree of '%s' is too large to be listed, fetching zipball", repo)
+        return download_and_extract(
+            repo=repo, dest_dir=dest_dir, branch=branch, env=env, metrics=metrics
+        )
+    # Symbolic links and submodules are left out, same as in the scan of an extracted repository
+    entries = [
+        entry
+        for entry in listing["tree"]
+        if entry["type"] == "tree"
+        or (entry["type"] == "blob" and entry["mode"] != "120000")
+    ]
+    matcher = ignore.Matcher(
+        files=utils.IGNORE_FILES, directories=utils.IGNORE_DIRECTORIES
+    )
+    sources = {}
+    if gitignore:
+        blobs = {
+            entry["path"]: entry["sha"] for entry in entries if entry["type"] == "blob"
+        }
+        for name in ignore.IGNORE_SOURCES:
+            if sha := blobs.get(name):
+                sources[name] = get_blob(repo=repo, sha=sha, env=env, metrics=metrics)
+                matcher.add(sources[name].decode("utf-8", "replace").splitlines())
+        # Parents are loaded before their subdirectories, so the files within ignored directories are never fetched
+        nested = [path for path in blobs if path.endswith(f"/{ignore.NESTED_SOURCE}")]
+        for path in sorted(nested, key=lambda path: path.count("/")):
+            parts = tuple(path.split("/"))
+            if is_ignored(matcher, {}, parts[:-1]):
+                continue
+            sources[path] = get_blob(
+                repo=repo, sha=blobs[path], env=env, metrics=metrics
+            )
+            matcher.add(
+                sources[path].decode("utf-8", "replace").splitlines(),
+                base="/".join(parts[:-1]) + "/",
+            )
+    language_matcher = languages.get_filter(
+        languages.get_language(language_filter, repo_info["language"])
+    )
+    ignored: Dict[tuple, bool] = {}
+    directories, placeholders, matches, sniffed = [], [], [], []
+    total = 0
+    for entry in entries:
+        parts = tuple(entry["path"].split("/"))
+        if entry["type"] == "tree":
+            if not is_ignored(matcher, ignored, parts):
+                directories.append(parts)
+            continue
+        # Ignored files count too, a repository of mostly vendored files is where fetching the rest saves the most
+        total += entry["size"]
+        if is_ignored(matcher, ignored, parts[:-1]) or matcher.match(
+            parts[-1], entry["path"], False
+        ):
+            continue
+        if entry["path"] in sources:
+            continue
+        if not language_matcher or language_matcher.match(parts[-1]):
+            matches.append(entry)
+        elif language_matcher.sniffs(parts[-1]):
+            # Files without an extension may match by their shebang, which is only known once they are fetched
+            sniffed.append(entry)
+        else:
+            placeholders.append(parts)
+    oversized = []
+    if max_total_size is not None:
+        matches, oversized = get_budgeted(matches, max_total_size, max_file_size)
+    # Files without an extension are decided on by the output, once their shebang is known
+    matches += sniffed
+    size = sum(get_capped(entry, max_file_size) for entry in matches)
+    if len(matches) > SPARSE_FILES or size > max_ratio * total:
+        LOGGER.info(
+            "Filters match %d files with %d of %d bytes in '%s', fetching zipball",
+            len(matches),
+            size,
+            total,
+            repo,
+        )
+        return download_and_extract(
+            repo=repo, dest_dir=dest_dir, branch=branch, env=env, metrics=metrics
+        )
+    LOGGER.info("Fetching %d files with %d bytes from '%s'", len(matches), size, repo)
+    true_path = os.path.join(dest_dir, repo)
+    if os.path.exists(true_path):
+        LOGGER.warning(
+            "Directory '%s' already exists, removing it before fetching", true_path
+        )
+        shutil.rmtree(true_path)
+    os.makedirs(true_path)
+    for parts in directories:
+        os.makedirs(os.path.join(true_path, *parts), exist_ok=True)
+    skipped = [
+        os.path.join(true_path, *entry["path"].split("/")) for entry in oversized
+    ]
+    for parts in placeholders:
+        open(os.path.join(true_path, *parts), "wb").close()
+    for filepath in skipped:
+        open(filepath, "wb").close()
+    for name, content in sources.items():
+        with open(os.path.join(true_path, *name.split("/")), "wb") as file:
+            file.write(content)
+
+    def fetch(entry: Dict[str, Any]) -> bytes:
+        """Fetches the content of a file in the listing."""
+        return get_blob(repo=repo, sha=entry["sha"], env=env, metrics=metrics)
+
+    with metrics.stage("download"):
+        for entry, content in zip(matches, utils.ordered_map(fetch, matches, workers)):
+            with open(os.path.join(true_path, *entry["path"].split("/")), "wb") as file:
+                # One byte past the limit is kept, so the file is still truncated with a note in the output
+                file.write(
+                    content if max_file_size is None else content[: max_file_size + 1]
+                )
+            metrics.count("bytes_downloaded", len(content))
+    return {"path": true_path, "language": repo_info["language"], "skipped": skipped}
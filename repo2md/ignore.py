@@ -0,0 +1,165 @@
+import logging
+import re
+from typing import Dict, Iterable, Tuple
+
+LOGGER = logging.getLogger("repo2md")
+
+# Files at the root of a repository, to load additional ignore patterns from
+IGNORE_SOURCES = (".gitignore", ".repo2mdignore")
+# Files in the subdirectories of a repository, to load the ignore patterns of that directory from
+NESTED_SOURCE = ".gitignore"
+
+
+def translate(pattern: str, base: str = "") -> Tuple[str, bool]:
+    """Translates a gitignore style glob pattern into a regular expression for paths relative to the root.
+
+    Args:
+        pattern: Glob pattern, a trailing slash matches only directories and a slash elsewhere anchors it to the root.
+        base: Relative path of the directory the pattern was read in with a trailing slash, it matches only within.
+
+    Returns:
+        Tuple[str, bool]:
+        Regular expression for the relative path, and a boolean flag to indicate if it matches only directories.
+    """
+    dir_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+    parts = []
+    i, n = 0, len(pattern)
+    while i < n:
+        char = pattern[i]
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+            continue
+        if char == "*":
+            parts.append("[^/]*")
+        elif char == "?":
+            parts.append("[^/]")
+        elif char == "[" and (end := pattern.find("]", i + 2)) != -1:
+            start = i + 1
+            group = pattern[start:end].replace("\\", "\\\\")
+            if group[0] == "!":
+                group = "^" + group[1:]
+            parts.append(f"[{group}]")
+            i = end
+        elif char == "\\" and i + 1 < n:
+            parts.append(re.escape(pattern[i + 1]))
+            i += 1
+        else:
+            parts.append(re.escape(char))
+        i += 1
+    expression = "".join(parts)
+    return (
+        re.escape(base) + (expression if anchored else f"(?:.*/)?{expression}"),
+        dir_only,
+    )
+
+
+class Matcher:
+    """A class to match files and directories against exact names and compiled glob patterns.
+
+    >>> Matcher
+
+    """
+
+    def __init__(
+        self,
+        files: Iterable[str] = None,
+        directories: Iterable[str] = None,
+        patterns: Iterable[str] = None,
+    ):
+        """Initialize the matcher with exact names and gitignore style patterns.
+
+        Args:
+            files: Names of files to ignore.
+            directories: Names of directories to ignore, files within them are never visited.
+            patterns: Lines of a gitignore style file, with glob patterns and negations.
+
+        Notes:
+            Names and patterns are matched case-insensitively. Negations re-include anything matched by any other
+            pattern, regardless of the order they are listed in, so a nested ``.gitignore`` can re-include the files
+            ignored by its parents.
+        """
+        self.files = {name.lower() for name in files or ()}
+        self.directories = {name.lower() for name in directories or ()}
+        # Expressions are grouped by whether they are negated and whether they match only directories
+        self.expressions: Dict[Tuple[bool, bool], list] = {}
+        self.compiled: Dict[Tuple[bool, bool], re.Pattern] = {}
+        if patterns:
+            self.add(patterns)
+
+    def add(self, patterns: Iterable[str], base: str = "") -> None:
+        """Adds gitignore style patterns to the matcher, and compiles them into one expression per kind.
+
+        Args:
+            patterns: Lines of a gitignore style file, blank lines and comments are skipped.
+            base: Relative path of the directory the file is in with a trailing slash, eg: ``src/`` for
+                ``src/.gitignore``. Its patterns only match within that directory.
+        """
+        for line in patterns:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            negated = line.startswith("!")
+            if negated:
+                line = line[1:]
+            name = line.rstrip("/")
+            if (
+                not base
+                and not negated
+                and name
+                and not any(c in name for c in "/*?[\\")
+            ):
+                # Plain names are looked up in a set, without running any expression
+                self.directories.add(name.lower())
+                if not line.endswith("/"):
+                    self.files.add(name.lower())
+                continue
+            expression, dir_only = translate(line, base)
+            self.expressions.setdefault((negated, dir_only), []).append(expression)
+        self.compiled = {
+            kind: re.compile("|".join(f"(?:{e})" for e in expressions), re.IGNORECASE)
+            for kind, expressions in self.expressions.items()
+        }
+
+    def search(self, path: str, is_dir: bool, negated: bool = False) -> bool:
+        """Searches the compiled patterns for a relative path.
+
+        Args:
+            path: Path relative to the root, with forward slashes.
+            is_dir: Boolean flag to indicate if the path is a directory.
+            negated: Boolean flag to search the negated patterns instead.
+
+        Returns:
+            bool:
+            Returns a boolean flag to indicate if any of the patterns match the path.
+        """
+        if (pattern := self.compiled.get((negated, False))) and pattern.fullmatch(path):
+            return True
+        if is_dir and (pattern := self.compiled.get((negated, True))):
+            return bool(pattern.fullmatch(path))
+        return False
+
+    def match(self, name: str, path: str, is_dir: bool) -> bool:
+        """Checks if a file or a directory is ignored.
+
+        Args:
+            name: Name of the file or directory.
+            path: Path relative to the root, with forward slashes.
+            is_dir: Boolean flag to indicate if the path is a directory.
+
+        Returns:
+            bool:
+            Returns a boolean flag to indicate if the file or directory is ignored.
+        """
+        if name.lower() in (self.directories if is_dir else self.files):
+            ignored = True
+        else:
+            ignored = self.search(path, is_dir)
+        return ignored and not self.search(path, is_dir, negated=True)
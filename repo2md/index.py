@@ -0,0 +1,502 @@
+import io
+import logging
+import os
+import pathlib
+import zipfile
+from collections.abc import Generator
+from typing import IO, Dict, List, Sequence, Tuple
+
+from repo2md import git, ignore, utils
+
+LOGGER = logging.getLogger("repo2md")
+
+
+def sort_key(node: "Node | os.DirEntry") -> tuple:
+    """Gets the key to order the children of a directory by, regardless of the filesystem or the archive.
+
+    Args:
+        node: File or directory node, or an entry of a directory scan.
+
+    Returns:
+        tuple:
+        Case-insensitive name of the node, with the exact name to break ties between names that differ only in case.
+    """
+    return node.name.casefold(), node.name
+
+
+class Node:
+    """A class to represent a file or a directory in the directory index.
+
+    >>> Node
+
+    """
+
+    __slots__ = ("name", "path", "is_dir", "children")
+
+    def __init__(self, name: str, path: str, is_dir: bool):
+        """Initialize the node with its name, path and type.
+
+        Args:
+            name: Name of the file or directory.
+            path: Full path to the file or directory.
+            is_dir: Boolean flag to indicate if the node is a directory.
+        """
+        self.name = name
+        self.path = path
+        self.is_dir = is_dir
+        self.children: List[Node] = []
+
+    def __repr__(self) -> str:
+        """Returns a string representation of the node."""
+        return f"{self.__class__.__name__}(path={self.path!r}, is_dir={self.is_dir})"
+
+
+class Index:
+    """A class to scan a directory once and serve both the tree and the file contents from memory.
+
+    >>> Index
+
+    """
+
+    def __init__(
+        self,
+        path: str | pathlib.Path | os.PathLike,
+        ignore_files: Sequence[str] = None,
+        ignore_directories: Sequence[str] = None,
+        gitignore: bool = False,
+    ):
+        """Initialize the index and scan the directory.
+
+        Args:
+            path: The root path to scan.
+            ignore_files: Files to ignore in the scan.
+            ignore_directories: Directories to ignore in the scan, ignored directories are never descended into.
+            gitignore: Boolean flag to also ignore the patterns in the ``.gitignore`` and ``.repo2mdignore`` files
+                at the root, and in the ``.gitignore`` files of the subdirectories within them.
+        """
+        self.path = os.fspath(path)
+        self.gitignore = gitignore
+        self.matcher = ignore.Matcher(
+            files=ignore_files or utils.IGNORE_FILES,
+            directories=ignore_directories or utils.IGNORE_DIRECTORIES,
+        )
+        if gitignore:
+            for name in ignore.IGNORE_SOURCES:
+                if (patterns := self.read_root(name)) is not None:
+                    LOGGER.info("Loading ignore patterns from %s", name)
+                    self.matcher.add(patterns.splitlines())
+        self.ignored = 0
+        self.root = self.scan()
+        self.sort()
+
+    def add_nested(self, relative: str) -> None:
+        """Adds the patterns of the ``.gitignore`` file in a subdirectory, if there is one.
+
+        Args:
+            relative: Path of the subdirectory relative to the root, with forward slashes and a trailing slash.
+        """
+        if (
+            patterns := self.read_root(f"{relative}{ignore.NESTED_SOURCE}")
+        ) is not None:
+            LOGGER.info(
+                "Loading ignore patterns from %s%s", relative, ignore.NESTED_SOURCE
+            )
+            self.matcher.add(patterns.splitlines(), base=relative)
+
+    def read_root(self, name: str) -> str | None:
+        """Reads a text file at the root, before the directory is scanned.
+
+        Args:
+            name: Name of the file, or its path relative to the root with forward slashes.
+
+        Returns:
+            str | None:
+            Content of the file, or None if it doesn't exist.
+        """
+        try:
+            with open(
+                os.path.join(self.path, name), encoding="utf-8", errors="replace"
+            ) as file:
+                return file.read()
+        except OSError:
+            return None
+
+    def scan(self) -> Node:
+        """Builds the in-memory directory index using a single ``os.scandir`` call per directory.
+
+        Returns:
+            Node:
+            The root node of the directory index.
+        """
+        LOGGER.info("Scanning directory %s", self.path)
+        root = Node(
+            name=os.path.basename(os.path.normpath(self.path)) or self.path,
+            path=self.path,
+            is_dir=True,
+        )
+        # Relative paths are tracked alongside the nodes, to match the anchored ignore patterns
+        stack = [(root, "")]
+        while stack:
+            node, relative = stack.pop()
+            if self.gitignore and relative:
+                # Patterns of a subdirectory are loaded before its entries are matched, and only match within it
+                self.add_nested(relative)
+            try:
+                with os.scandir(node.path) as entries:
+                    for entry in entries:
+                        # DirEntry caches the type information, so no additional stat calls are made here
+                        if entry.is_dir(follow_symlinks=False):
+                            is_dir = True
+                        elif entry.is_file():
+                            is_dir = False
+                        else:
+                            continue
+                        path = f"{relative}{entry.name}"
+                        if self.matcher.match(entry.name, path, is_dir):
+                            LOGGER.debug("Ignoring %s", entry.path)
+                            self.ignored += 1
+                            continue
+                        child = Node(entry.name, entry.path, is_dir)
+                        if is_dir:
+                            # Ignored directories are pruned above, so their contents are never scanned
+                            stack.append((child, f"{path}/"))
+                        node.children.append(child)
+            except OSError as error:
+                # Unreadable directories stay in the tree without their contents, instead of failing the whole scan
+                LOGGER.warning("Failed to scan %s: %s", node.path, error)
+        return root
+
+    def sort(self) -> None:
+        """Sorts the children of every directory by name, so the tree and the contents are in a reproducible order.
+
+        Notes:
+            Directory entries are listed in an arbitrary order that depends on the filesystem, and archive members in
+            the order they were added. Sorting them once here keeps the output the same for the same commit.
+        """
+        for node in self.walk():
+            node.children.sort(key=sort_key)
+
+    def open(self, path: str) -> IO[bytes]:
+        """Opens a file from the index in binary mode.
+
+        Args:
+            path: Path of the file node to open.
+
+        Returns:
+            IO[bytes]:
+            A readable binary stream for the file.
+        """
+        return open(path, "rb")
+
+    def size(self, path: str) -> int:
+        """Gets the size of a file from the index, without reading it.
+
+        Args:
+            path: Path of the file node.
+
+        Returns:
+            int:
+            Size of the file in bytes.
+        """
+        return os.stat(path).st_size
+
+    def walk(self) -> Generator[Node]:
+        """Walks through the index in pre-order, in the same order as the rendered tree.
+
+        Yields:
+            Node:
+            Every file and directory node in the index, starting with the root.
+        """
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children))
+
+    def files(self) -> Generator[Node]:
+        """Walks through the index and yields only the file nodes.
+
+        Yields:
+            Node:
+            File nodes in the index.
+        """
+        for node in self.walk():
+            if not node.is_dir:
+                yield node
+
+
+class ArchiveIndex(Index):
+    """A class to index the members of a zip archive without extracting it.
+
+    >>> ArchiveIndex
+
+    """
+
+    def __init__(
+        self,
+        archive: zipfile.ZipFile,
+        name: str,
+        ignore_files: Sequence[str] = None,
+        ignore_directories: Sequence[str] = None,
+        gitignore: bool = False,
+    ):
+        """Initialize the index and scan the archive members.
+
+        Args:
+            archive: Zip archive to index, the top-level directory of its members is replaced with ``name``.
+            name: Name of the root node, used as the prefix for the paths of all the nodes.
+            ignore_files: Files to ignore in the scan.
+            ignore_directories: Directories to ignore in the scan, members within ignored directories are skipped.
+            gitignore: Boolean flag to also ignore the patterns in the ``.gitignore`` and ``.repo2mdignore`` files
+                at the root of the archive, and in the ``.gitignore`` files of its subdirectories.
+        """
+        self.archive = archive
+        self.members: Dict[str, str] = {}
+        super().__init__(
+            name,
+            ignore_files=ignore_files,
+            ignore_directories=ignore_directories,
+            gitignore=gitignore,
+        )
+
+    def scan(self) -> Node:
+        """Builds the in-memory directory index from the member names of the archive.
+
+        Returns:
+            Node:
+            The root node of the directory index.
+        """
+        LOGGER.info("Scanning members for %s", self.path)
+        if self.gitignore:
+            # Members are listed in no particular order, so the patterns of all the subdirectories are loaded first
+            for relative in self.nested():
+                self.add_nested(relative)
+        root = Node(name=self.path, path=self.path, is_dir=True)
+        directories = {(): root}
+        # Whether each directory is ignored, either by itself or by one of its parents
+        ignored = {(): False}
+        for member, parts, is_dir in self.entries():
+            if self.__ignored(ignored, parts[:-1]):
+                continue
+            if is_dir:
+                if self.__ignored(ignored, parts):
+                    LOGGER.debug("Ignoring directory %s", member)
+                    self.ignored += 1
+                    continue
+                self.__directory(directories, parts)
+                continue
+            if self.matcher.match(parts[-1], "/".join(parts), False):
+                LOGGER.debug("Ignoring file %s", member)
+                self.ignored += 1
+                continue
+            parent = self.__directory(directories, parts[:-1])
+            path = os.path.join(parent.path, parts[-1])
+            parent.children.append(Node(parts[-1], path, False))
+            self.members[path] = member
+        return root
+
+    def entries(self) -> Generator[Tuple[str, tuple, bool]]:
+        """Yields the members of the archive, with their paths relative to the top-level directory.
+
+        Yields:
+            Tuple[str, tuple, bool]:
+            Name of the member, its path parts relative to the root, and whether it is a directory.
+        """
+        for info in self.archive.infolist():
+            # Members are stored under a top-level directory, eg: owner-repo-sha/path/to/file
+            if parts := tuple(info.filename.rstrip("/").split("/")[1:]):
+                yield info.filename, parts, info.is_dir()
+
+    def nested(self) -> Generator[str]:
+        """Yields the subdirectories with a ``.gitignore`` file of their own.
+
+        Yields:
+            str:
+            Path of the subdirectory relative to the root, with forward slashes and a trailing slash.
+        """
+        for _, parts, is_dir in self.entries():
+            if not is_dir and len(parts) > 1 and parts[-1] == ignore.NESTED_SOURCE:
+                yield "/".join(parts[:-1]) + "/"
+
+    def __ignored(self, ignored: Dict[tuple, bool], parts: tuple) -> bool:
+        """Checks if a directory or any of its parents is ignored, remembering the result for its siblings.
+
+        Args:
+            ignored: Results for the directories checked so far, mapped by their path parts.
+            parts: Path parts of the directory relative to the root.
+
+        Returns:
+            bool:
+            Returns a boolean flag to indicate if the directory is ignored.
+        """
+        if (result := ignored.get(parts)) is None:
+            result = self.__ignored(ignored, parts[:-1]) or self.matcher.match(
+                parts[-1], "/".join(parts), True
+            )
+            ignored[parts] = result
+        return result
+
+    def read_root(self, name: str) -> str | None:
+        """Reads a text file at the root of the archive, before the members are scanned.
+
+        Args:
+            name: Name of the file, or its path relative to the root with forward slashes.
+
+        Returns:
+            str | None:
+            Content of the file, or None if it doesn't exist.
+        """
+        for info in self.archive.infolist():
+            # The first member is enough to find the top-level directory of the archive
+            top = info.filename.split("/")[0]
+            try:
+                return self.archive.read(f"{top}/{name}").decode("utf-8", "replace")
+            except KeyError:
+                return None
+        return None
+
+    @staticmethod
+    def __directory(directories: Dict[tuple, Node], parts: tuple) -> Node:
+        """Gets the directory node for the given path parts, creating it and its parents if needed.
+
+        Args:
+            directories: Directory nodes mapped by their path parts.
+            parts: Path parts of the directory relative to the root.
+
+        Returns:
+            Node:
+            The directory node.
+        """
+        if node := directories.get(parts):
+            return node
+        parent = ArchiveIndex.__directory(directories, parts[:-1])
+        node = Node(parts[-1], os.path.join(parent.path, parts[-1]), True)
+        parent.children.append(node)
+        directories[parts] = node
+        return node
+
+    def open(self, path: str) -> IO[bytes]:
+        """Opens a member of the archive in binary mode.
+
+        Args:
+            path: Path of the file node to open.
+
+        Returns:
+            IO[bytes]:
+            A readable binary stream for the archive member.
+        """
+        return self.archive.open(self.members[path])
+
+    def size(self, path: str) -> int:
+        """Gets the uncompressed size of a member of the archive, without reading it.
+
+        Args:
+            path: Path of the file node.
+
+        Returns:
+            int:
+            Size of the archive member in bytes.
+        """
+        return self.archive.getinfo(self.members[path]).file_size
+
+
+class GitIndex(ArchiveIndex):
+    """A class to index the files of a commit in a local git repository, without a checkout.
+
+    >>> GitIndex
+
+    """
+
+    def __init__(
+        self,
+        repository: git.Repository,
+        name: str,
+        since: str = None,
+        ignore_files: Sequence[str] = None,
+        ignore_directories: Sequence[str] = None,
+        gitignore: bool = False,
+    ):
+        """Initialize the index and scan the tree of the commit.
+
+        Args:
+            repository: Repository to read the tree and the files of the commit from.
+            name: Name of the root node, used as the prefix for the paths of all the nodes.
+            since: Branch, tag or commit to compare with, only the files changed since then are indexed.
+            ignore_files: Files to ignore in the scan.
+            ignore_directories: Directories to ignore in the scan, files within ignored directories are skipped.
+            gitignore: Boolean flag to also ignore the patterns in the ``.gitignore`` and ``.repo2mdignore`` files
+                at the root of the tree, and in the ``.gitignore`` files of its subdirectories.
+        """
+        self.repository = repository
+        # Only the tracked files are listed, so untracked and ignored files in a working tree never show up
+        self.blobs = {path: (sha, size) for path, sha, size in repository.ls_tree()}
+        self.changed = repository.changed(since) if since else None
+        self.members: Dict[str, str] = {}
+        Index.__init__(
+            self,
+            name,
+            ignore_files=ignore_files,
+            ignore_directories=ignore_directories,
+            gitignore=gitignore,
+        )
+
+    def entries(self) -> Generator[Tuple[str, tuple, bool]]:
+        """Yields the files in the tree of the commit, or only the ones changed since the reference to compare with.
+
+        Yields:
+            Tuple[str, tuple, bool]:
+            Path of the file in the tree, its path parts, and False since directories are implied by the files.
+        """
+        for member in self.blobs:
+            if self.changed is None or member in self.changed:
+                yield member, tuple(member.split("/")), False
+
+    def nested(self) -> Generator[str]:
+        """Yields the subdirectories with a ``.gitignore`` file of their own, including the unchanged ones.
+
+        Yields:
+            str:
+            Path of the subdirectory relative to the root, with forward slashes and a trailing slash.
+        """
+        for member in self.blobs:
+            directory, _, name = member.rpartition("/")
+            if directory and name == ignore.NESTED_SOURCE:
+                yield f"{directory}/"
+
+    def read_root(self, name: str) -> str | None:
+        """Reads a text file at the root of the tree, before the files are scanned.
+
+        Args:
+            name: Name of the file, or its path relative to the root with forward slashes.
+
+        Returns:
+            str | None:
+            Content of the file, or None if it doesn't exist.
+        """
+        if blob := self.blobs.get(name):
+            return self.repository.read(blob[0]).decode("utf-8", "replace")
+        return None
+
+    def open(self, path: str) -> IO[bytes]:
+        """Opens a file of the commit in binary mode, reading it from the object database.
+
+        Args:
+            path: Path of the file node to open.
+
+        Returns:
+            IO[bytes]:
+            A readable binary stream for the file.
+        """
+        return io.BytesIO(self.repository.read(self.blobs[self.members[path]][0]))
+
+    def size(self, path: str) -> int:
+        """Gets the size of a file of the commit, from the tree listing.
+
+        Args:
+            path: Path of the file node.
+
+        Returns:
+            int:
+            Size of the file in bytes.
+        """
+        return self.blobs[self.members[path]][1]
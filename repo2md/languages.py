@@ -0,0 +1,291 @@
+import functools
+import logging
+import os
+import re
+from collections.abc import Callable, Iterable
+from typing import IO, Dict, Tuple
+
+from repo2md import utils
+
+LOGGER = logging.getLogger("repo2md")
+
+# Bytes read from the start of a file without an extension, to find its shebang line
+HEAD_SIZE = 256
+
+
+class Index:
+    """A class to map extensions, filenames and shebang interpreters to a language, with a lookup per file.
+
+    >>> Index
+
+    """
+
+    def __init__(self):
+        """Initialize the reverse maps, the first language listed wins when they share an extension or a name."""
+        self.extensions: Dict[str, str] = {}
+        self.filenames: Dict[str, str] = {}
+        self.interpreters: Dict[str, str] = {}
+        for language, extensions in utils.LANGUAGE_EXTENSIONS.items():
+            for extension in extensions:
+                self.extensions.setdefault(extension.lower(), language)
+        for language, filenames in utils.LANGUAGE_FILENAMES.items():
+            for filename in filenames:
+                self.filenames.setdefault(filename.lower(), language)
+        for language, interpreters in utils.LANGUAGE_INTERPRETERS.items():
+            for interpreter in interpreters:
+                self.interpreters.setdefault(interpreter, language)
+
+    def detect(self, name: str, content: str = None) -> str | None:
+        """Detects the language of a file from its name, or from the shebang line of its content.
+
+        Args:
+            name: Name of the file.
+            content: Content of the file, to read the shebang line of when the name doesn't match a language.
+
+        Returns:
+            str | None:
+            The language of the file, or None if it isn't recognized.
+        """
+        lowered = name.lower()
+        if language := self.filenames.get(lowered):
+            return language
+        if language := self.extensions.get(os.path.splitext(lowered)[1]):
+            return language
+        if content and (interpreter := get_interpreter(content)):
+            return self.interpreters.get(interpreter) or self.interpreters.get(
+                re.sub(r"[\d.]+$", "", interpreter)
+            )
+        return None
+
+    def sniff(self, name: str, head: Callable[[], str]) -> str | None:
+        """Detects the language of a file from its name, reading its shebang line only when it has no extension.
+
+        Args:
+            name: Name of the file.
+            head: Callable to read the start of the file with.
+
+        Returns:
+            str | None:
+            The language of the file, or None if it isn't recognized.
+        """
+        if language := self.detect(name):
+            return language
+        if not os.path.splitext(name)[1]:
+            return self.detect(name, head())
+        return None
+
+
+class Filter:
+    """A class to match files against a set of languages, by their extensions, names and shebang interpreters.
+
+    >>> Filter
+
+    """
+
+    def __init__(self, languages: Iterable[str]):
+        """Initialize the sets of extensions, filenames and interpreters of the languages.
+
+        Args:
+            languages: Names of the languages to match.
+        """
+        self.languages = tuple(languages)
+        self.extensions = frozenset(
+            extension.lower()
+            for language in self.languages
+            for extension in utils.LANGUAGE_EXTENSIONS.get(language, [])
+        )
+        self.filenames = frozenset(
+            filename.lower()
+            for language in self.languages
+            for filename in utils.LANGUAGE_FILENAMES.get(language, [])
+        )
+        self.interpreters = frozenset(
+            interpreter
+            for language in self.languages
+            for interpreter in utils.LANGUAGE_INTERPRETERS.get(language, [])
+        )
+
+    def match(self, name: str, head: Callable[[], str] = None) -> bool:
+        """Checks if a file belongs to any of the languages.
+
+        Args:
+            name: Name of the file.
+            head: Callable to read the start of the file with, to match the shebang line of a file without an extension.
+
+        Returns:
+            bool:
+            Returns a boolean flag to indicate if the file matches.
+        """
+        lowered = name.lower()
+        if lowered in self.filenames:
+            return True
+        if extension := os.path.splitext(lowered)[1]:
+            return extension in self.extensions
+        if head is None or not self.interpreters:
+            return False
+        if interpreter := get_interpreter(head()):
+            return (
+                interpreter in self.interpreters
+                or re.sub(r"[\d.]+$", "", interpreter) in self.interpreters
+            )
+        return False
+
+    def sniffs(self, name: str) -> bool:
+        """Checks if a file that doesn't match by its name could still match by its shebang line.
+
+        Args:
+            name: Name of the file.
+
+        Returns:
+            bool:
+            Returns a boolean flag to indicate if the start of the file has to be read to match it.
+        """
+        lowered = name.lower()
+        return bool(
+            self.interpreters
+            and lowered not in self.filenames
+            and not os.path.splitext(lowered)[1]
+        )
+
+
+@functools.cache
+def get_index() -> Index:
+    """Builds the language index once, on first use.
+
+    Returns:
+        Index:
+        The language index for ``LANGUAGE_EXTENSIONS``, ``LANGUAGE_FILENAMES`` and ``LANGUAGE_INTERPRETERS``.
+    """
+    return Index()
+
+
+def get_languages(language: str | Iterable[str]) -> Tuple[str, ...]:
+    """Parses one or more languages into their names.
+
+    Args:
+        language: Name of a language, comma-separated names, or an iterable of names.
+
+    Returns:
+        Tuple[str, ...]:
+        Lowercase names of the languages.
+
+    Raises:
+        ValueError:
+        If any of the languages is not supported.
+    """
+    if isinstance(language, str):
+        language = language.split(",")
+    languages = tuple(name.strip().lower() for name in language if name.strip())
+    supported = utils.LANGUAGE_EXTENSIONS.keys() | utils.LANGUAGE_FILENAMES.keys()
+    if unknown := [name for name in languages if name not in supported]:
+        raise ValueError(f"Unsupported languages: {', '.join(unknown)}")
+    return languages
+
+
+def get_filter(language: str | Iterable[str] = None) -> Filter | None:
+    """Gets the filter for one or more languages, built once for each combination.
+
+    Args:
+        language: Name of a language, comma-separated names, or an iterable of names.
+
+    Returns:
+        Filter | None:
+        The filter for the languages, or None when no language is given.
+    """
+    if not language:
+        return None
+    return build_filter(get_languages(language))
+
+
+@functools.cache
+def build_filter(languages: Tuple[str, ...]) -> Filter:
+    """Builds the filter for a combination of languages.
+
+    Args:
+        languages: Lowercase names of the languages.
+
+    Returns:
+        Filter:
+        The filter for the languages.
+    """
+    return Filter(languages)
+
+
+def read_head(path: str, opener: Callable[[str], IO[bytes]] = None) -> str:
+    """Reads the start of a file, enough for its shebang line.
+
+    Args:
+        path: Path of the file.
+        opener: Callable to open the file in binary mode with, defaults to opening it from the filesystem.
+
+    Returns:
+        str:
+        Start of the file, or an empty string if it can't be read.
+    """
+    try:
+        with (opener or functools.partial(open, mode="rb"))(path) as file:
+            return file.read(HEAD_SIZE).decode("utf-8", "replace")
+    except OSError as error:
+        LOGGER.debug("Failed to read %s: %s", path, error)
+        return ""
+
+
+def get_interpreter(content: str) -> str | None:
+    """Gets the interpreter from the shebang line of a script.
+
+    Args:
+        content: Content of the script.
+
+    Returns:
+        str | None:
+        Name of the interpreter, eg: ``python3`` for ``#!/usr/bin/env python3``, or None without a shebang.
+    """
+    if not content.startswith("#!"):
+        return None
+    words = content[2:].split("\n", 1)[0].split()
+    if words and os.path.basename(words[0]) == "env":
+        # Options and variable assignments of env come before the interpreter
+        words = [
+            word for word in words[1:] if not word.startswith("-") and "=" not in word
+        ]
+    return os.path.basename(words[0]) if words else None
+
+
+def get_fence(name: str, content: str = None) -> str:
+    """Gets the info string for the fenced code block of a file.
+
+    Args:
+        name: Name of the file.
+        content: Content of the file, to read the shebang line of when the name doesn't match a language.
+
+    Returns:
+        str:
+        Language of the file as it is known to Markdown renderers, or an empty string if it isn't recognized.
+    """
+    if language := get_index().detect(name, content):
+        return utils.LANGUAGE_FENCES.get(language, language)
+    return ""
+
+
+def get_language(language_filter: bool | str, detected: str = None) -> str | None:
+    """Gets the languages to filter files by.
+
+    Args:
+        language_filter: Boolean flag to filter files by the detected language, or the languages to filter by as
+            comma-separated names.
+        detected: Language of the repository, eg: the primary language reported by GitHub.
+
+    Returns:
+        str | None:
+        The languages to filter by, or None to keep all the files.
+    """
+    if isinstance(language_filter, str):
+        return language_filter or None
+    if not (language_filter and detected):
+        return None
+    try:
+        get_languages(detected)
+    except ValueError:
+        LOGGER.warning("Language %r is not supported, files are not filtered", detected)
+        return None
+    return detected
@@ -1,34 +1,377 @@
+import codecs
+import functools
+import io
+import itertools
+import json
 import logging
+import mmap
 import os
 import pathlib
 import shutil
+import zipfile
 from collections.abc import Generator
-from typing import Dict, List, Tuple
+from typing import (
+    IO,
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    Iterable,
+    List,
+    Tuple,
+)
 
-from repo2md import config, github, tree, utils
+from repo2md import config
+from repo2md import dedup as _dedup
+from repo2md import git, index, languages, manifest
+from repo2md import metrics as _metrics
+from repo2md import tree, utils
+
+if TYPE_CHECKING:
+    # GitHub modules import requests, which conversions of a local source never need
+    from repo2md import cache as _cache
 
 LOGGER = logging.getLogger("repo2md")
 
+# Number of leading bytes sniffed to detect binary files
+SNIFF_SIZE = 8 * 1024
+# Content written in place of binary and undecodable files
+PLACEHOLDER = "No unicode data available"
+# Approximate number of bytes per token, to estimate the token counts of the files
+BYTES_PER_TOKEN = 4
+# Extensions of the supported languages rank ahead of all the other files, with the "extension" policy
+EXTENSION_RANK = {
+    extension: rank
+    for rank, extension in enumerate(
+        dict.fromkeys(itertools.chain.from_iterable(utils.LANGUAGE_EXTENSIONS.values()))
+    )
+}
+# Orders to select the files in with a token budget, files are selected in walk order when unset
+POLICIES = {
+    "smallest": lambda path, size: size,
+    "extension": lambda path, size: (
+        EXTENSION_RANK.get(pathlib.Path(path).suffix.lower(), len(EXTENSION_RANK)),
+        size,
+    ),
+    "depth": lambda path, size: (path.count(os.path.sep), size),
+}
+# Files from this size on are memory-mapped, smaller files are cheaper to read in one call
+MMAP_SIZE = 256 * 1024
+
+
+def decode_content(filepath: str, data: bytes | memoryview, limit: int = None) -> str:
+    """Decodes the raw content of a file in one pass, without splitting it into lines.
+
+    Args:
+        filepath: File path the content was read from.
+        data: Raw content of the file, at most ``limit + 1`` bytes are looked at.
+        limit: Maximum number of bytes to decode, the content is truncated beyond this.
 
-def get_content(filepath: str) -> Dict[str, str]:
+    Returns:
+        str:
+        Decoded content with normalized line endings, or a placeholder for binary and undecodable files.
+    """
+    if utils.is_binary(bytes(data[:SNIFF_SIZE])):
+        LOGGER.debug("Skipping binary file %s", filepath)
+        return PLACEHOLDER
+    truncated = limit is not None and len(data) > limit
+    try:
+        if truncated:
+            # An incremental decoder drops the partial character left at the cut-off
+            content = codecs.getincrementaldecoder("utf-8")().decode(data[:limit])
+        else:
+            content = str(data, "utf-8")
+    except UnicodeDecodeError as error:
+        LOGGER.warning("Error reading file %s: %s", filepath, error)
+        return PLACEHOLDER
+    # Most files only use LF, so the content is scanned once and left as is
+    if "\r" in content:
+        content = content.replace("\r\n", "\n").replace("\r", "\n")
+    if truncated:
+        LOGGER.debug("Truncated file %s at %d bytes", filepath, limit)
+        content += f"\n... truncated at {limit} bytes"
+    return content
+
+
+def get_content(
+    filepath: str, opener: Callable[[str], IO[bytes]] = None, limit: int = None
+) -> Dict[str, str]:
     """Reads the content of a file and returns it as a dictionary with the filepath as the key.
 
     Args:
         filepath: File path to read.
+        opener: Callable to open the file in binary mode, defaults to the builtin ``open``.
+        limit: Maximum number of bytes to read, the content is truncated beyond this.
 
     Returns:
         Dict[str, str]:
         A dictionary with the file path as the key and the file content as the value.
+
+    Notes:
+        - Large files on disk are memory-mapped and decoded in place, instead of being copied into a buffer first.
+        - The first few KB are sniffed for NUL bytes and magic numbers, so binary files are never read completely.
     """
     LOGGER.debug("Reading file %s", filepath)
+    opener = opener or functools.partial(open, mode="rb")
+    with opener(filepath) as fstream:
+        try:
+            size = os.fstat(fstream.fileno()).st_size
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            # Archive members and other streams have no file descriptor to map
+            size = 0
+        if size >= MMAP_SIZE:
+            try:
+                mapped = mmap.mmap(fstream.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError) as error:
+                LOGGER.debug("Unable to memory-map %s: %s", filepath, error)
+            else:
+                with mapped, memoryview(mapped) as view:
+                    return {filepath: decode_content(filepath, view, limit)}
+        head = fstream.read(SNIFF_SIZE if limit is None else min(SNIFF_SIZE, limit))
+        if utils.is_binary(head):
+            LOGGER.debug("Skipping binary file %s", filepath)
+            return {filepath: PLACEHOLDER}
+        rest = fstream.read(-1 if limit is None else limit + 1 - len(head))
+    return {filepath: decode_content(filepath, head + rest if rest else head, limit)}
+
+
+def is_placeholder(
+    filepath: str, opener: Callable[[str], IO[bytes]] = None, limit: int = None
+) -> bool:
+    """Checks if a file is rendered as the placeholder, by sniffing its leading bytes the same way it is read.
+
+    Args:
+        filepath: File path to sniff.
+        opener: Callable to open the file in binary mode, defaults to the builtin ``open``.
+        limit: Maximum number of bytes read from the file, when it is truncated.
+
+    Returns:
+        bool:
+        Returns a boolean flag to indicate if the file is binary, or can't be decoded as far as it was sniffed.
+    """
+    opener = opener or functools.partial(open, mode="rb")
+    with opener(filepath) as fstream:
+        head = fstream.read(SNIFF_SIZE if limit is None else min(SNIFF_SIZE, limit))
+    if utils.is_binary(head):
+        return True
     try:
-        with open(filepath) as fstream:
-            return {
-                filepath: "\n".join([f.replace("\n", "") for f in fstream.readlines()])
-            }
-    except UnicodeDecodeError as error:
-        LOGGER.warning("Error reading file %s: %s", filepath, error)
-        return {filepath: "No unicode data available"}
+        # A character cut off at the end of the sniffed bytes is left pending, instead of failing the decode
+        codecs.getincrementaldecoder("utf-8")().decode(head)
+    except UnicodeDecodeError:
+        return True
+    return False
+
+
+class Budget:
+    """A class to cap the total size of the files selected for the output.
+
+    >>> Budget
+
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        size: Callable[[str], int] = os.path.getsize,
+        max_file_size: int = None,
+        excluded: Collection[str] = (),
+    ):
+        """Initialize the budget.
+
+        Args:
+            max_size: Maximum total size of the selected files in bytes.
+            size: Callable to get the size of a file without reading it.
+            max_file_size: Size each file is truncated to, files are counted up to this size.
+            excluded: Paths of the files already left out of the budget, eg: by a sparse fetch that didn't fetch them.
+        """
+        self.max_size = max_size
+        self.size = size
+        self.max_file_size = max_file_size
+        self.excluded = frozenset(excluded)
+        self.total = 0
+        self.skipped = 0
+
+    def admit(self, filepath: str) -> bool:
+        """Checks if a file fits within the remaining budget, and deducts its size if it does.
+
+        Args:
+            filepath: Path of the file.
+
+        Returns:
+            bool:
+            Returns a boolean flag to indicate if the file fits within the budget.
+        """
+        size = self.size(filepath)
+        if self.max_file_size is not None:
+            size = min(size, self.max_file_size)
+        if filepath in self.excluded or self.total + size > self.max_size:
+            if not self.skipped:
+                LOGGER.warning(
+                    "Total size limit of %d bytes reached, skipping the files that don't fit",
+                    self.max_size,
+                )
+            LOGGER.debug("Skipping file %s", filepath)
+            self.skipped += 1
+            return False
+        self.total += size
+        return True
+
+
+def estimate_tokens(size: int) -> int:
+    """Estimates the number of tokens in a text of the given size.
+
+    Args:
+        size: Size of the text in bytes.
+
+    Returns:
+        int:
+        Approximate number of tokens.
+    """
+    return -(-size // BYTES_PER_TOKEN)
+
+
+class Selection:
+    """A class to select the files for the output within a token budget, before any of them are read.
+
+    >>> Selection
+
+    """
+
+    def __init__(
+        self,
+        source_index: index.Index,
+        language: str = None,
+        max_tokens: int = None,
+        policy: str = None,
+        max_file_size: int = None,
+        max_total_size: int = None,
+        excluded: Collection[str] = (),
+    ):
+        """Initialize the selection from the file sizes in the index.
+
+        Args:
+            source_index: Directory index to select the files from.
+            language: Language to filter files.
+            max_tokens: Maximum number of tokens in the selected files, estimated from their sizes. Binary and
+                undecodable files are counted as the placeholder written in their place.
+            policy: Order to fill the token budget in, one of ``smallest``, ``extension`` or ``depth``.
+            max_file_size: Size each file is truncated to, files are counted up to this size.
+            max_total_size: Maximum total size of the selected files in bytes, spent in walk order.
+            excluded: Paths of the files already left out of the total size.
+        """
+        assert (
+            policy is None or policy in POLICIES
+        ), f"'policy' must be one of {', '.join(POLICIES)}, got {policy!r}"
+        budget = None
+        if max_total_size is not None:
+            budget = Budget(max_total_size, source_index.size, max_file_size, excluded)
+        candidates = []
+        for directory in source_index.walk():
+            if not directory.is_dir:
+                continue
+            for node in select_files(directory, language, budget, source_index.open):
+                size = source_index.size(node.path)
+                if max_file_size is not None:
+                    size = min(size, max_file_size)
+                if size and is_placeholder(node.path, source_index.open, max_file_size):
+                    # Binary and undecodable files cost only the one line written in their place
+                    size = len(PLACEHOLDER)
+                candidates.append((node.path, size))
+        if policy:
+            candidates.sort(key=lambda item: POLICIES[policy](*item))
+        self.max_tokens = max_tokens
+        self.sizes: Dict[str, int] = {}
+        self.tokens = 0
+        skipped = 0
+        for path, size in candidates:
+            tokens = estimate_tokens(size)
+            if max_tokens is not None and self.tokens + tokens > max_tokens:
+                LOGGER.debug("Skipping file %s with %d tokens", path, tokens)
+                skipped += 1
+                continue
+            self.sizes[path] = size
+            self.tokens += tokens
+        if skipped:
+            LOGGER.warning(
+                "Token limit of %d reached, skipped %d files that don't fit",
+                max_tokens,
+                skipped,
+            )
+        self.skipped = skipped if budget is None else skipped + budget.skipped
+
+    def admit(self, filepath: str) -> bool:
+        """Checks if a file was selected, so the selection can be used in place of a budget.
+
+        Args:
+            filepath: Path of the file.
+
+        Returns:
+            bool:
+            Returns a boolean flag to indicate if the file was selected.
+        """
+        return filepath in self.sizes
+
+    def table(self) -> str:
+        """Summarizes the selected files by extension as a Markdown table.
+
+        Returns:
+            str:
+            Markdown table with the number of files, bytes and estimated tokens for each extension.
+        """
+        rows: Dict[str, List[int]] = {}
+        for path, size in self.sizes.items():
+            row = rows.setdefault(
+                pathlib.Path(path).suffix.lower() or "(none)", [0, 0, 0]
+            )
+            row[0] += 1
+            row[1] += size
+            row[2] += estimate_tokens(size)
+        lines = [
+            "| Extension | Files | Bytes | Tokens (est.) |",
+            "|-----------|------:|------:|--------------:|",
+        ]
+        for extension, (files, size, tokens) in sorted(
+            rows.items(), key=lambda item: item[1][2], reverse=True
+        ):
+            lines.append(f"| {extension} | {files:,} | {size:,} | {tokens:,} |")
+        lines.append(
+            f"| **Total** | {len(self.sizes):,} | {sum(self.sizes.values()):,} | {self.tokens:,} |"
+        )
+        if self.skipped:
+            lines.append(f"\nFiles left out to fit within the limits: {self.skipped:,}")
+        return "\n".join(lines)
+
+
+class Stats:
+    """A class to count the bytes, lines and approximate tokens of each file, as it is written to the output.
+
+    >>> Stats
+
+    """
+
+    def __init__(self):
+        """Initialize the counters."""
+        self.files: Dict[str, Dict[str, int]] = {}
+        self.bytes = 0
+        self.lines = 0
+        self.tokens = 0
+
+    def add(self, filepath: str, content: str) -> None:
+        """Counts the content of a file.
+
+        Args:
+            filepath: Path of the file.
+            content: Content of the file, as it is written to the output.
+        """
+        # ASCII content is one byte per character, so it is counted without encoding it
+        size = len(content) if content.isascii() else len(content.encode("utf-8"))
+        lines = content.count("\n") + 1 if content else 0
+        tokens = estimate_tokens(size)
+        self.files[filepath] = {"bytes": size, "lines": lines, "tokens": tokens}
+        self.bytes += size
+        self.lines += lines
+        self.tokens += tokens
 
 
 def get_current(
@@ -46,16 +389,112 @@ def get_current(
         A dictionary with the file path as the key and the file content as the value.
     """
     LOGGER.debug("Reading directory %s", dir_path)
-    extensions = utils.LANGUAGE_EXTENSIONS[language.lower()] if language else []
-    for file in os.listdir(dir_path):
-        if file.lower() in ignore_files:
-            LOGGER.debug("Ignoring file %s in directory %s", file, dir_path)
+    matcher = languages.get_filter(language)
+    with os.scandir(dir_path) as scanner:
+        entries = sorted(scanner, key=index.sort_key)
+    for entry in entries:
+        if entry.name.lower() in ignore_files:
+            LOGGER.debug("Ignoring file %s in directory %s", entry.name, dir_path)
             continue
-        if extensions and pathlib.Path(file).suffix not in extensions:
+        if matcher and not matcher.match(
+            entry.name, functools.partial(languages.read_head, entry.path)
+        ):
             continue
-        filepath = os.path.join(dir_path, file)
-        if os.path.isfile(filepath):
-            yield get_content(filepath)
+        if entry.is_file():
+            yield get_content(entry.path)
+
+
+def select_files(
+    directory: index.Node,
+    language: str = None,
+    budget: Budget | Selection = None,
+    opener: Callable[[str], IO[bytes]] = None,
+) -> Generator[index.Node]:
+    """Loops through the children of an indexed directory and yields the files that match the language filter.
+
+    Args:
+        directory: Directory node from the index.
+        language: Language to filter files.
+        budget: Budget or selection to admit the files with, files beyond it are skipped.
+        opener: Callable to open a file from the index with, to match files without an extension by their shebang.
+
+    Yields:
+        index.Node:
+        File nodes in the directory.
+    """
+    matcher = languages.get_filter(language)
+    for node in directory.children:
+        if node.is_dir:
+            continue
+        if matcher and not matcher.match(
+            node.name,
+            opener and functools.partial(languages.read_head, node.path, opener),
+        ):
+            continue
+        if budget and not budget.admit(node.path):
+            continue
+        yield node
+
+
+def get_indexed(
+    directory: index.Node,
+    language: str = None,
+    reader: Callable[[str], Dict[str, str]] = get_content,
+    budget: Budget | Selection = None,
+    opener: Callable[[str], IO[bytes]] = None,
+) -> Generator[Dict[str, str]]:
+    """Loops through the files of an indexed directory and yields file contents as dictionaries.
+
+    Args:
+        directory: Directory node from the index.
+        language: Language to filter files.
+        reader: Callable to read a file path into a dictionary of its content, defaults to ``get_content``.
+        budget: Budget or selection to admit the files with, files beyond it are skipped.
+        opener: Callable to open a file from the index with, to match files without an extension by their shebang.
+
+    Yields:
+        Dict[str, str]:
+        A dictionary with the file path as the key and the file content as the value.
+    """
+    LOGGER.debug("Reading directory %s", directory.path)
+    for node in select_files(directory, language, budget, opener):
+        yield reader(node.path)
+
+
+def get_prefetched(
+    source_index: index.Index,
+    language: str = None,
+    workers: int = 2,
+    reader: Callable[[str], Dict[str, str]] = get_content,
+    budget: Budget | Selection = None,
+) -> Generator[Tuple[str, Iterable[Dict[str, str]]]]:
+    """Reads the files of an index in a thread pool and yields directories with their file contents in walk order.
+
+    Args:
+        source_index: Directory index to read the files from.
+        language: Language to filter files.
+        workers: Number of threads to read the files with.
+        reader: Callable to read a file path into a dictionary of its content, defaults to ``get_content``.
+        budget: Budget or selection to admit the files with, files beyond it are skipped.
+
+    Yields:
+        Tuple[str, Iterable[Dict[str, str]]]:
+        A generator yielding tuples of directory paths and lazy iterables of dictionaries containing file contents.
+    """
+    # Files are selected in walk order on the calling thread, so the budget is spent deterministically
+    selected = (
+        (directory.path, node.path)
+        for directory in source_index.walk()
+        if directory.is_dir
+        for node in select_files(directory, language, budget, source_index.open)
+    )
+    contents = utils.ordered_map(
+        lambda item: (item[0], reader(item[1])),
+        selected,
+        workers=workers,
+    )
+    for dir_path, group in itertools.groupby(contents, key=lambda item: item[0]):
+        yield dir_path, (content for _, content in group)
 
 
 def get_files(
@@ -63,7 +502,13 @@ def get_files(
     ignore_directories: List[str] = None,
     ignore_files: List[str] = None,
     language: str = None,
-) -> Generator[Tuple[str, List[Dict[str, str]]]]:
+    source_index: index.Index = None,
+    workers: int = None,
+    reader: Callable[[str], Dict[str, str]] = None,
+    max_file_size: int = None,
+    max_total_size: int = None,
+    selection: Budget | Selection = None,
+) -> Generator[Tuple[str, Iterable[Dict[str, str]]]]:
     """Walks through the source directory and yields directories with their file contents.
 
     Args:
@@ -71,87 +516,709 @@ def get_files(
         ignore_directories: Directories to ignore in the walk.
         ignore_files: Files to ignore in the directories.
         language: Language to filter files.
+        source_index: Pre-built directory index to walk, instead of scanning the source directory again.
+        workers: Number of threads to prefetch file contents with, files are read sequentially when unset.
+        reader: Callable to read a file path into a dictionary of its content, defaults to reading from the index.
+        max_file_size: Maximum size of a file in bytes, larger files are truncated.
+        max_total_size: Maximum total size of the files in bytes, based on their size on disk before reading.
+            Files beyond the limit are left out of the contents, but remain in the tree.
+        selection: Budget, or files selected up front within a token budget, which replaces the total size limit.
 
     Yields:
-        Tuple[str, List[Dict[str, str]]]:
-        A generator yielding tuples of directory paths and lists of dictionaries containing file contents.
+        Tuple[str, Iterable[Dict[str, str]]]:
+        A generator yielding tuples of directory paths and lazy iterables of dictionaries containing file contents.
+
+    Notes:
+        File contents are read only when the inner iterable is consumed, so a single file is held in memory at a time.
+        With ``workers``, at most twice as many files as workers are held in memory while prefetching.
     """
-    ignore_files = ignore_files or utils.IGNORE_FILES
-    ignore_files = [f.lower() for f in ignore_files]
-    ignore_directories = ignore_directories or utils.IGNORE_DIRECTORIES
-    ignore_directories = [d.lower() for d in ignore_directories]
+    if not source_index:
+        source_index = index.Index(
+            src, ignore_files=ignore_files, ignore_directories=ignore_directories
+        )
+    reader = reader or functools.partial(
+        get_content, opener=source_index.open, limit=max_file_size
+    )
+    budget = selection
+    if budget is None and max_total_size is not None:
+        budget = Budget(max_total_size, source_index.size, max_file_size)
     LOGGER.info("Walking directory %s", src)
-    for __path, directories, files in os.walk(src):
-        if any(
-            (
-                ignore.lower() in __path.lower().split(os.path.sep)
-                for ignore in ignore_directories
+    if workers and workers > 1:
+        yield from get_prefetched(source_index, language, workers, reader, budget)
+        return
+    for node in source_index.walk():
+        if node.is_dir:
+            yield node.path, get_indexed(
+                node, language, reader, budget, source_index.open
             )
+
+
+class Shards:
+    """A class to split the Markdown output into numbered part files, with an index of the file paths in each part.
+
+    >>> Shards
+
+    """
+
+    def __init__(self, filename: str, max_size: int = None, by_directory: bool = False):
+        """Initialize the shards, the first part is opened on the first write.
+
+        Args:
+            filename: Filename of the unsharded output, parts are stored as ``{name}.part-NNN.md`` next to it.
+            max_size: Size of the text in a part in UTF-8 bytes, from which on the next file starts a new part.
+            by_directory: Boolean flag to start a new part for each top-level directory.
+        """
+        self.prefix = filename[:-3] if filename.endswith(".md") else filename
+        self.max_size = max_size
+        self.by_directory = by_directory
+        self.filenames: List[str] = []
+        self.files: Dict[str, str] = {}
+        self.file: IO[str] | None = None
+        self.size = 0
+        self.count = 0
+        self.key = None
+
+    def open(self) -> None:
+        """Finishes the current part and opens the next one, so each part is complete on disk once it fills."""
+        if self.file:
+            self.file.write("\n")
+            self.file.close()
+        filename = f"{self.prefix}.part-{len(self.filenames) + 1:03d}.md"
+        LOGGER.info("Storing output in %s", filename)
+        self.filenames.append(filename)
+        self.file = open(filename, "w")
+        self.size = 0
+        self.count = 0
+
+    def write(self, text: str) -> None:
+        """Writes a chunk of text to the current part.
+
+        Args:
+            text: Text to write.
+        """
+        if not self.file:
+            self.open()
+        self.file.write(text)
+        self.size += len(text) if text.isascii() else len(text.encode("utf-8"))
+
+    def start(self, filepath: str) -> bool:
+        """Assigns a file to a part before it is written, opening a new part when the current one is full.
+
+        Args:
+            filepath: Path of the file relative to the parent of the root, as written in its heading.
+
+        Returns:
+            bool:
+            Returns a boolean flag to indicate if the file is the first one in its part.
+        """
+        # Files directly under the root share a part, every top-level directory gets its own
+        parts = filepath.split(os.path.sep)
+        key = parts[1] if len(parts) > 2 else ""
+        if not self.file:
+            self.open()
+        elif self.count and (
+            (self.by_directory and key != self.key)
+            or (self.max_size is not None and self.size >= self.max_size)
         ):
-            LOGGER.debug("Ignoring directory %s", __path)
-            continue
-        # Loops through root directory
-        if __path == src:
-            yield src, list(get_current(src, ignore_files, language))
-        # Loops through subdirectories
-        for directory in directories:
-            if directory.lower() in ignore_directories:
-                LOGGER.debug("Ignoring directory %s", directory)
-                continue
-            dir_path = os.path.join(__path, directory)
-            yield dir_path, list(get_current(dir_path, ignore_files, language))
+            self.open()
+        self.key = key
+        self.files[filepath] = os.path.basename(self.filenames[-1])
+        self.count += 1
+        return self.count == 1
+
+    def close(self) -> str:
+        """Finishes the last part and stores the index of the file paths in each part.
+
+        Returns:
+            str:
+            Filename of the index.
+        """
+        if self.file:
+            self.file.close()
+        filename = f"{self.prefix}.index.json"
+        with open(filename, "w") as file:
+            json.dump(
+                {
+                    "parts": [os.path.basename(part) for part in self.filenames],
+                    "files": self.files,
+                },
+                file,
+                indent=2,
+            )
+        return filename
+
+
+def get_writer(output: IO[str] | Callable[[str], Any]) -> Callable[[str], Any]:
+    """Resolves the output target into a callable that accepts chunks of text.
+
+    Args:
+        output: A writable text stream (file object, ``io.TextIOBase``), a binary stream (``io.BytesIO``, a socket
+            file or a file opened in binary mode) that the text is encoded into as UTF-8, or a callable that accepts
+            a string.
+
+    Returns:
+        Callable[[str], Any]:
+        A callable to write chunks of text to the output.
+    """
+    if isinstance(output, (io.RawIOBase, io.BufferedIOBase)):
+        return lambda text: output.write(text.encode("utf-8"))
+    if callable(write := getattr(output, "write", None)):
+        return write
+    if callable(output):
+        return output
+    raise TypeError(
+        f"'output' must be a writable stream or a callable, got: {type(output).__name__!r}"
+    )
+
+
+def write_code(
+    base_path: str,
+    iterator: Iterable[Tuple[str, Iterable[Dict[str, str]]]],
+    output: IO[str] | Callable[[str], Any],
+    stats: Stats = None,
+    dedup: _dedup.Dedup = None,
+) -> int:
+    """Writes formatted code contents from the iterator to the output, one file at a time.
+
+    Args:
+        base_path: Base path to strip from file paths in the output.
+        iterator: Iterator yielding directory paths and iterables of file contents.
+        output: A writable text stream or a callable that accepts a string.
+            With ``Shards``, each file is assigned to a part before it is written.
+        stats: Stats to count each file in, as it is written.
+        dedup: Dedup to replace the contents that were written before with a reference to the file.
+
+    Returns:
+        int:
+        Number of files written to the output.
+    """
+    writer = get_writer(output)
+    shards = output if isinstance(output, Shards) else None
+    count = 0
+    for __dir, content_list in iterator:
+        for file_content_map in content_list:
+            for filepath, content in file_content_map.items():
+                relative = filepath.replace(base_path, "").lstrip(os.path.sep)
+                first = shards.start(relative) if shards else not count
+                if not first:
+                    writer("\n\n")
+                writer(f"###### {relative}\n\n")
+                # Large contents are written as is, instead of being copied into a formatted string
+                content = content.strip()
+                if dedup and (original := dedup.find(relative, content)):
+                    content = f"Identical to `{original}`"
+                    writer(content)
+                else:
+                    if dedup:
+                        content = dedup.replace(relative, content)
+                    writer(
+                        f"```{languages.get_fence(os.path.basename(relative), content)}\n"
+                    )
+                    writer(content)
+                    writer("\n```")
+                if stats is not None:
+                    stats.add(filepath, content)
+                count += 1
+    return count
 
 
 def get_code(
-    base_path: str, iterator: Generator[Tuple[str, List[Dict[str, str]]]]
+    base_path: str, iterator: Iterable[Tuple[str, Iterable[Dict[str, str]]]]
 ) -> str:
     """Generates a formatted string of code contents from the iterator.
 
     Args:
         base_path: Base path to strip from file paths in the output.
-        iterator: Iterator yielding directory paths and lists of file contents.
+        iterator: Iterator yielding directory paths and iterables of file contents.
 
     Returns:
         str:
         A formatted string containing the code contents, either in Markdown format or plain text.
     """
-    text = ""
-    for __dir, content_list in iterator:
-        for file_content_map in content_list:
-            for filepath, content in file_content_map.items():
-                text += (
-                    f"###### {filepath.replace(base_path, '').lstrip(os.path.sep)}\n\n"
-                )
-                text += f"```\n{content.strip()}\n```"
-                text += "\n\n"
-    return text
+    buffer = io.StringIO()
+    write_code(base_path, iterator, buffer)
+    return buffer.getvalue()
+
+
+def generate_index_markdown(
+    source_index: index.Index,
+    name: str,
+    filename: str = None,
+    output: IO[str] | Callable[[str], Any] = None,
+    language: str = None,
+    workers: int = None,
+    max_file_size: int = None,
+    max_total_size: int = None,
+    max_tokens: int = None,
+    policy: str = None,
+    summary: bool = False,
+    tree_depth: int = None,
+    tree_entries: int = None,
+    dedup: str = None,
+    shard_size: int = None,
+    shard_tokens: int = None,
+    shard_directories: bool = False,
+    reader: Callable[[str], str] = None,
+    excluded: Collection[str] = (),
+    metrics: _metrics.Metrics = None,
+) -> Stats:
+    """Generates a Markdown file with the directory tree and code contents of an index.
+
+    Args:
+        source_index: Index of the files to render, from a directory, a zip archive or a git commit.
+        name: Name of the repository, the output is stored as ``{name}.md`` when no filename is given.
+        filename: Filename for the output Markdown file.
+        output: Writable text stream or callable to stream the Markdown into, instead of writing to ``filename``.
+        language: Programming language of the code files.
+        workers: Number of threads to read files with, files are read sequentially when unset.
+        max_file_size: Maximum size of a file in bytes, larger files are truncated.
+        max_total_size: Maximum total size of the files in bytes, files beyond it are left out of the contents.
+        max_tokens: Maximum number of tokens in the code contents, estimated from the file sizes before reading.
+        policy: Order to fill the token budget in, one of ``smallest``, ``extension`` or ``depth``.
+            Files are selected in walk order when unset.
+        summary: Boolean flag to write a table of the selected files by extension, after the directory tree.
+        tree_depth: Maximum depth of the directories to expand in the tree, deeper contents are summarized in one line.
+        tree_entries: Maximum number of entries to list per directory in the tree, the rest are summarized in one line.
+        dedup: Mode to replace the contents written before with references, ``exact`` for whole files only, or
+            ``near`` to also replace the repeated chunks of lines within similar files.
+        shard_size: Size of the text in bytes, from which on the Markdown file is continued in the next part.
+        shard_tokens: Approximate number of tokens, from which on the Markdown file is continued in the next part.
+        shard_directories: Boolean flag to write each top-level directory into its own part.
+        reader: Function to read the content of a file with, instead of reading it from the index. It is not timed,
+            so it records its own reads in the metrics.
+        excluded: Paths of the files to leave out of the contents within ``max_total_size``, such as the ones a
+            sparse fetch didn't fetch.
+        metrics: Metrics to record the time spent on each stage, and the file counts in.
+
+    Returns:
+        Stats:
+        Bytes, lines and approximate tokens of each file written to the output.
+
+    Notes:
+        The directory tree is written first, and the code contents are streamed to the output as each file is read.
+        The shard options only apply when the output is stored in a file.
+    """
+    options = dict(
+        language=language,
+        workers=workers,
+        max_file_size=max_file_size,
+        max_total_size=max_total_size,
+        max_tokens=max_tokens,
+        policy=policy,
+        summary=summary,
+        tree_depth=tree_depth,
+        tree_entries=tree_entries,
+        dedup=dedup,
+        reader=reader,
+        excluded=excluded,
+        metrics=metrics,
+    )
+    if output is not None:
+        return render_markdown(source_index, output, **options)
+    return store_markdown(
+        source_index,
+        filename or f"{name}.md",
+        shard_size=shard_size,
+        shard_tokens=shard_tokens,
+        shard_directories=shard_directories,
+        **options,
+    )
 
 
 def generate_markdown(
-    path: str | pathlib.Path | os.PathLike, filename: str = None, language: str = None
-) -> None:
-    """Generates a Markdown file with the directory tree and code contents.
+    path: str | pathlib.Path | os.PathLike,
+    filename: str = None,
+    language: str = None,
+    output: IO[str] | Callable[[str], Any] = None,
+    manifest_file: str = None,
+    gitignore: bool = False,
+    metrics: _metrics.Metrics = None,
+    **kwargs,
+) -> Stats:
+    """Generates a Markdown file with the directory tree and code contents of a directory.
 
     Args:
         path: Path to the directory to process.
         filename: Filename for the output Markdown file.
         language: Programming language of the code files.
+        output: Writable text stream or callable to stream the Markdown into, instead of writing to ``filename``.
+        manifest_file: Sidecar manifest of file fingerprints and rendered fragments from a previous run.
+            Only files that changed since then are read again, and the manifest is updated after the run.
+        gitignore: Boolean flag to also ignore the patterns in the ``.gitignore`` and ``.repo2mdignore`` files.
+        metrics: Metrics to record the time spent on each stage, and the file counts in.
+
+    Keyword Args:
+        Options to render the files with, passed on to ``generate_index_markdown``.
+
+    Returns:
+        Stats:
+        Bytes, lines and approximate tokens of each file written to the output.
     """
     if not isinstance(path, pathlib.Path):
         path = pathlib.Path(path)
     assert path.exists(), f"Path {path.name} at {path.parent} does not exist"
-    if not filename:
-        filename = f"{path.name}.md"
-    iterator = get_files(str(path), language=language)
-    text = get_code(str(path.parent), iterator)
-    LOGGER.info("Generating tree for %s", path)
-    structure = tree.Tree(path).get()
+    metrics = metrics or _metrics.Metrics()
+    with metrics.stage("walk"):
+        source_index = index.Index(path, gitignore=gitignore)
+    if manifest_file:
+        max_file_size = kwargs.get("max_file_size")
+        fingerprints = manifest.Manifest(
+            manifest_file, root=str(path), options={"max_file_size": max_file_size}
+        )
+        # Only the files that changed are timed and counted as read, the fragments reused from the manifest are not
+        kwargs["reader"] = fingerprints.reader(
+            metrics.timed(
+                "read",
+                functools.partial(
+                    get_content, opener=source_index.open, limit=max_file_size
+                ),
+                counter="files_read",
+            )
+        )
+    stats = generate_index_markdown(
+        source_index,
+        path.name,
+        filename=filename,
+        output=output,
+        language=language,
+        metrics=metrics,
+        **kwargs,
+    )
+    if manifest_file:
+        metrics.count("files_reused", fingerprints.reused)
+        fingerprints.save()
+    return stats
+
+
+def generate_archive_markdown(
+    archive: str | os.PathLike | IO[bytes],
+    name: str,
+    filename: str = None,
+    language: str = None,
+    output: IO[str] | Callable[[str], Any] = None,
+    gitignore: bool = False,
+    metrics: _metrics.Metrics = None,
+    **kwargs,
+) -> Stats:
+    """Generates a Markdown file with the directory tree and code contents of a zip archive, without extracting it.
+
+    Args:
+        archive: Path to the zip archive or a binary file object containing it.
+        name: Name of the repository, replaces the top-level directory of the archive members.
+        filename: Filename for the output Markdown file.
+        language: Programming language of the code files.
+        output: Writable text stream or callable to stream the Markdown into, instead of writing to ``filename``.
+        gitignore: Boolean flag to also ignore the patterns in the ``.gitignore`` and ``.repo2mdignore`` files.
+        metrics: Metrics to record the time spent on each stage, and the file counts in.
+
+    Keyword Args:
+        Options to render the files with, passed on to ``generate_index_markdown``.
+
+    Returns:
+        Stats:
+        Bytes, lines and approximate tokens of each file written to the output.
+    """
+    metrics = metrics or _metrics.Metrics()
+    with zipfile.ZipFile(archive) as zip_ref:
+        with metrics.stage("walk"):
+            source_index = index.ArchiveIndex(zip_ref, name, gitignore=gitignore)
+        return generate_index_markdown(
+            source_index,
+            name,
+            filename=filename,
+            output=output,
+            language=language,
+            metrics=metrics,
+            **kwargs,
+        )
+
+
+def generate_git_markdown(
+    repository: str | os.PathLike,
+    name: str = None,
+    ref: str = None,
+    since: str = None,
+    filename: str = None,
+    language: str = None,
+    output: IO[str] | Callable[[str], Any] = None,
+    gitignore: bool = False,
+    metrics: _metrics.Metrics = None,
+    **kwargs,
+) -> Stats:
+    """Generates a Markdown file with the directory tree and code contents of a commit in a local git repository.
+
+    Args:
+        repository: Path to the repository, either a working tree or a bare repository such as a mirror clone.
+        name: Name of the repository, used as the root of the paths. Defaults to the directory name without ``.git``.
+        ref: Branch, tag or commit to render, defaults to ``HEAD``.
+        since: Branch, tag or commit to compare with, only the files changed since then are rendered.
+        filename: Filename for the output Markdown file.
+        language: Programming language of the code files.
+        output: Writable text stream or callable to stream the Markdown into, instead of writing to ``filename``.
+        gitignore: Boolean flag to also ignore the patterns in the ``.gitignore`` and ``.repo2mdignore`` files.
+        metrics: Metrics to record the time spent on each stage, and the file counts in.
+
+    Keyword Args:
+        Options to render the files with, passed on to ``generate_index_markdown``.
+
+    Returns:
+        Stats:
+        Bytes, lines and approximate tokens of each file written to the output.
+
+    Notes:
+        Only the files tracked in the commit are rendered, read from the object database with a single
+        ``git cat-file`` process, so the working tree is never walked or checked out.
+    """
+    name = name or get_repo_name(repository)
+    metrics = metrics or _metrics.Metrics()
+    with git.Repository(repository, ref=ref) as repo:
+        LOGGER.info("Reading %s at %s", name, repo.commit)
+        with metrics.stage("walk"):
+            source_index = index.GitIndex(repo, name, since=since, gitignore=gitignore)
+        return generate_index_markdown(
+            source_index,
+            name,
+            filename=filename,
+            output=output,
+            language=language,
+            metrics=metrics,
+            **kwargs,
+        )
+
+
+def get_repo_name(path: str | os.PathLike) -> str:
+    """Gets the name of a repository from its path.
+
+    Args:
+        path: Path to the repository.
+
+    Returns:
+        str:
+        Name of the directory, without the ``.git`` suffix of a bare repository.
+    """
+    name = os.path.basename(os.path.normpath(path))
+    return name[:-4] if name.endswith(".git") and len(name) > 4 else name
+
+
+def store_markdown(
+    source_index: index.Index,
+    filename: str,
+    shard_size: int = None,
+    shard_tokens: int = None,
+    shard_directories: bool = False,
+    **kwargs,
+) -> Stats:
+    """Renders the directory tree and code contents of an index into a Markdown file.
+
+    Args:
+        source_index: Directory index to render.
+        filename: Filename for the output Markdown file.
+        shard_size: Size of the text in bytes, from which on the output is continued in the next part.
+        shard_tokens: Approximate number of tokens, from which on the output is continued in the next part.
+        shard_directories: Boolean flag to write each top-level directory into its own part.
+
+    Keyword Args:
+        Options to render the files with, passed on to ``render_markdown``.
+
+    Returns:
+        Stats:
+        Bytes, lines and approximate tokens of each file written to the output.
+
+    Notes:
+        With any of the shard options, the output is split into ``{name}.part-NNN.md`` files with an index of the
+        file paths in each part stored as ``{name}.index.json``, instead of a single Markdown file.
+    """
+    if shard_size is not None or shard_tokens is not None or shard_directories:
+        sizes = [shard_size, shard_tokens and shard_tokens * BYTES_PER_TOKEN]
+        shards = Shards(
+            filename,
+            max_size=min((size for size in sizes if size), default=None),
+            by_directory=shard_directories,
+        )
+        try:
+            stats = render_markdown(source_index, shards, **kwargs)
+        finally:
+            filename = shards.close()
+        LOGGER.info(
+            "Stored %d parts with an index in %s", len(shards.filenames), filename
+        )
+        return stats
     LOGGER.info("Storing output in %s", filename)
     with open(filename, "w") as file:
-        file.write(f"## Contents:\n\n```\n{structure}\n```\n\n")
-        file.write(text.rstrip())
-        file.write("\n")
+        stats = render_markdown(source_index, file, **kwargs)
         file.flush()
+    return stats
+
+
+def render_markdown(
+    source_index: index.Index,
+    output: IO[str] | Callable[[str], Any],
+    max_tokens: int = None,
+    policy: str = None,
+    summary: bool = False,
+    tree_depth: int = None,
+    tree_entries: int = None,
+    dedup: str = None,
+    excluded: Collection[str] = (),
+    metrics: _metrics.Metrics = None,
+    **kwargs,
+) -> Stats:
+    """Renders the directory tree and code contents of an index into the output.
+
+    Args:
+        source_index: Directory index to render.
+        output: A writable text stream or a callable that accepts a string.
+        max_tokens: Maximum number of tokens in the code contents, estimated from the file sizes before reading.
+        policy: Order to fill the token budget in, one of ``smallest``, ``extension`` or ``depth``.
+        summary: Boolean flag to write a table of the selected files by extension, after the directory tree.
+        tree_depth: Maximum depth of the directories to expand in the tree, deeper contents are summarized in one line.
+        tree_entries: Maximum number of entries to list per directory in the tree, the rest are summarized in one line.
+        dedup: Mode to replace the contents written before with references, ``exact`` for whole files only, or
+            ``near`` to also replace the repeated chunks of lines within similar files.
+        excluded: Paths of the files to leave out of the contents within ``max_total_size``.
+        metrics: Metrics to record the time spent on the tree, reading and writing, and the file counts in.
+
+    Keyword Args:
+        Options to read the files with, passed on to ``get_files``.
+
+    Returns:
+        Stats:
+        Bytes, lines and approximate tokens of each file written to the output.
+
+    Notes:
+        The ``write`` stage includes the time spent waiting on files to be read, while the ``read`` stage adds up the
+        time spent reading each file, across all the threads.
+    """
+    assert (
+        dedup is None or dedup in _dedup.MODES
+    ), f"'dedup' must be one of {', '.join(_dedup.MODES)}, got {dedup!r}"
+    metrics = metrics or _metrics.Metrics()
+    writer = get_writer(output)
+    LOGGER.info("Generating tree for %s", source_index.path)
+    writer("## Contents:\n\n```\n")
+    with metrics.stage("tree"):
+        # Lines are streamed to the output, so the tree is never held in memory as a whole
+        tree.Tree(
+            source_index.path,
+            index=source_index,
+            max_depth=tree_depth,
+            max_entries=tree_entries,
+        ).write(writer)
+    writer("```\n\n")
+    if max_tokens is not None or summary:
+        # Files are selected from their sizes in the index, so the summary is known before any of them are read
+        with metrics.stage("select"):
+            kwargs["selection"] = Selection(
+                source_index,
+                language=kwargs.get("language"),
+                max_tokens=max_tokens,
+                policy=policy,
+                max_file_size=kwargs.get("max_file_size"),
+                max_total_size=kwargs.get("max_total_size"),
+                excluded=excluded,
+            )
+        if summary:
+            writer(f"## Summary:\n\n{kwargs['selection'].table()}\n\n")
+    elif kwargs.get("max_total_size") is not None:
+        kwargs["selection"] = Budget(
+            kwargs["max_total_size"],
+            source_index.size,
+            kwargs.get("max_file_size"),
+            excluded,
+        )
+    if not kwargs.get("reader"):
+        kwargs["reader"] = metrics.timed(
+            "read",
+            functools.partial(
+                get_content, opener=source_index.open, limit=kwargs.get("max_file_size")
+            ),
+            counter="files_read",
+        )
+    stats = Stats()
+    duplicates = _dedup.Dedup(near=dedup == "near") if dedup else None
+    with metrics.stage("write"):
+        iterator = get_files(source_index.path, source_index=source_index, **kwargs)
+        write_code(
+            os.path.dirname(os.path.normpath(source_index.path)),
+            iterator,
+            output,
+            stats,
+            duplicates,
+        )
+        writer("\n")
+    metrics.count("files_written", len(stats.files))
+    metrics.count("bytes_written", stats.bytes)
+    metrics.count("files_ignored", source_index.ignored)
+    if kwargs.get("selection"):
+        metrics.count("files_skipped", kwargs["selection"].skipped)
+    if duplicates:
+        metrics.count("files_deduplicated", duplicates.duplicates)
+    LOGGER.info(
+        "Rendered %d files with %d bytes, %d lines and ~%d tokens",
+        len(stats.files),
+        stats.bytes,
+        stats.lines,
+        stats.tokens,
+    )
+    return stats
+
+
+def convert_cached(
+    repo_name: str,
+    cache: "_cache.Cache",
+    destination: str,
+    branch: str = None,
+    language_filter: bool | str = False,
+    env: config.EnvConfig = None,
+    metrics: _metrics.Metrics = None,
+    **kwargs,
+) -> str:
+    """Converts a GitHub repository to a Markdown file, reusing the cached output or archive for the same commit.
+
+    Args:
+        repo_name: Name of the GitHub repository to convert.
+        cache: Cache to look up and store the archive and Markdown file in.
+        destination: Destination directory to store the Markdown file.
+        branch: Branch of the repository to use (default is None, which uses the default branch).
+        language_filter: Boolean flag to filter files by the repository's language, or comma-separated languages.
+        env: Configuration for the repository's owner and authentication, defaults to ``config.env``.
+        metrics: Metrics to record the time spent on each stage, and the cache hits in.
+
+    Keyword Args:
+        Options to render the Markdown file with, passed on to ``generate_archive_markdown``.
+
+    Returns:
+        str:
+        Filename of the Markdown file.
+
+    Notes:
+        Cache misses are rendered straight from the cached archive, without extracting it.
+    """
+    metrics = metrics or _metrics.Metrics()
+    fetched = cache.fetch(
+        repo=repo_name,
+        branch=branch,
+        language_filter=language_filter,
+        env=env,
+        options=kwargs,
+        metrics=metrics,
+    )
+    output = os.path.join(destination, f"{repo_name}.md")
+    if fetched["hit"]:
+        metrics.count("cache_hits")
+        shutil.copyfile(fetched["output"], output)
+        return output
+    generate_archive_markdown(
+        fetched["path"],
+        repo_name,
+        filename=output,
+        language=fetched["language"],
+        metrics=metrics,
+        **kwargs,
+    )
+    cache.store(output, fetched["output"])
+    cache.evict()
+    return output
 
 
 def convert_repo_to_md(
@@ -159,11 +1226,33 @@ def convert_repo_to_md(
     branch: str = None,
     delete: bool = True,
     destination: str = "tmp",
-    language_filter: bool = False,
+    language_filter: bool | str = False,
     source_repo_path: str = None,
     source_repo_language: str = None,
+    workers: int = None,
+    in_archive: bool = False,
+    cache: "_cache.Cache | str" = None,
+    incremental: bool = False,
+    max_file_size: int = None,
+    max_total_size: int = None,
+    gitignore: bool = False,
+    max_tokens: int = None,
+    policy: str = None,
+    summary: bool = False,
+    tree_depth: int = None,
+    tree_entries: int = None,
+    dedup: str = None,
+    shard_size: int = None,
+    shard_tokens: int = None,
+    shard_directories: bool = False,
+    sparse: bool = False,
+    output: IO[str] | IO[bytes] | Callable[[str], Any] = None,
+    ref: str = None,
+    since: str = None,
+    metrics: _metrics.Metrics = None,
+    metrics_file: str = None,
     **kwargs,
-) -> None:
+) -> _metrics.Metrics:
     """Converts a repository to a Markdown file with its directory tree and code contents.
 
     Args:
@@ -171,48 +1260,206 @@ def convert_repo_to_md(
         branch: Branch of the repository to use (default is None, which uses the default branch).
         delete: Boolean flag to delete the repository after conversion (default is False).
         destination: Destination directory to store the Markdown file (default is "tmp").
-        language_filter: Boolean flag to filter files by language (default is True).
+        language_filter: Boolean flag to filter files by the repository's language, or the languages to filter by as
+            comma-separated names, eg: ``python,go``.
         source_repo_path: Source path to a repo if a directory has been downloaded already.
         source_repo_language: Programming language of the code files in source path.
+        workers: Number of threads to read files with, files are read sequentially when unset.
+        in_archive: Boolean flag to render straight from the downloaded zipball without extracting it.
+        cache: Cache, or the directory for one, to skip the download and conversion when the commit is unchanged.
+        incremental: Boolean flag to only re-read files that changed since the last conversion of a local source.
+        max_file_size: Maximum size of a file in bytes, larger files are truncated.
+        max_total_size: Maximum total size of the files in bytes, files beyond it are left out of the contents.
+        gitignore: Boolean flag to also ignore the patterns in the repository's ``.gitignore`` and ``.repo2mdignore``.
+        max_tokens: Maximum number of tokens in the code contents, estimated from the file sizes before reading.
+        policy: Order to fill the token budget in, one of ``smallest``, ``extension`` or ``depth``.
+        summary: Boolean flag to write a table of the selected files by extension, after the directory tree.
+        tree_depth: Maximum depth of the directories to expand in the tree, deeper contents are summarized in one line.
+        tree_entries: Maximum number of entries to list per directory in the tree, the rest are summarized in one line.
+        dedup: Mode to replace the contents written before with references, ``exact`` for whole files only, or
+            ``near`` to also replace the repeated chunks of lines within similar files.
+        shard_size: Size of the text in bytes, from which on the Markdown file is continued in the next part.
+        shard_tokens: Approximate number of tokens, from which on the Markdown file is continued in the next part.
+        shard_directories: Boolean flag to write each top-level directory into its own part.
+        sparse: Boolean flag to fetch only the files that pass the ignore and language filters, instead of the
+            zipball, when they make up a small part of the repository.
+        output: Text or binary stream, or a callable that accepts a string, to render the Markdown into instead of
+            storing it in ``destination``. Nothing is written to disk for a local source or with ``in_archive``.
+        ref: Branch, tag or commit of a local git repository to render from its object database, instead of the
+            working tree. The source can also be a bare repository, such as a mirror clone.
+        since: Branch, tag or commit of a local git repository, only the files changed since then are rendered.
+        metrics: Metrics to record the time spent on each stage, and the counts of files, bytes and retries in.
+        metrics_file: File to export the metrics to, in the Prometheus text format for ``.prom`` files and as JSON
+            lines otherwise.
 
     Keyword Args:
         git_token: Git token to authenticate with GitHub.
         git_owner: Owner of the repository. Defaults to the environment variable GIT_OWNER.
         git_api_url: GitHub API URL. Defaults to the environment variable GIT_API_URL.
+
+    Returns:
+        Metrics:
+        Seconds spent on each stage of the conversion, and the counts of files, bytes and retries.
     """
-    config.env = config.EnvConfig(**kwargs)
-    os.makedirs(destination, exist_ok=True)
+    options = dict(
+        workers=workers,
+        max_file_size=max_file_size,
+        max_total_size=max_total_size,
+        gitignore=gitignore,
+        max_tokens=max_tokens,
+        policy=policy,
+        summary=summary,
+        tree_depth=tree_depth,
+        tree_entries=tree_entries,
+        dedup=dedup,
+    )
+    shards = dict(
+        shard_size=shard_size,
+        shard_tokens=shard_tokens,
+        shard_directories=shard_directories,
+    )
+    assert output is None or not (
+        cache or any(shards.values())
+    ), "'output' is not supported with 'cache' or sharded output, which store files in 'destination'"
+    # Repositories are downloaded into the destination, local sources and archives are rendered in place
+    if output is None or incremental or not (source_repo_path or in_archive):
+        os.makedirs(destination, exist_ok=True)
+    metrics = metrics or _metrics.Metrics()
     if source_repo_path:
         assert os.path.isdir(
             source_repo_path
         ), f"'source_repo_path' {source_repo_path!r} does not exist"
         if source_repo_language:
-            assert utils.LANGUAGE_EXTENSIONS.get(
-                source_repo_language.lower()
-            ), f"'source_repo_language' {source_repo_language!r} is not supported for conversion"
+            # Raises a ValueError for the languages that are not supported
+            languages.get_languages(source_repo_language)
         else:
             assert (
-                language_filter is False
+                language_filter is not True
             ), "'source_repo_language' is required for custom source when 'language_filter' is enabled"
-        downloaded = {"path": source_repo_path, "language": source_repo_language}
-        delete = False  # Do not delete custom source path
-        repo_name = os.path.basename(os.path.normpath(source_repo_path))
+        if ref or since:
+            assert (
+                not incremental
+            ), "'incremental' is not supported with 'ref' or 'since', which read from the object database"
+            repo_name = get_repo_name(source_repo_path)
+        else:
+            repo_name = os.path.basename(os.path.normpath(source_repo_path))
     else:
+        from repo2md import cache as _cache
+        from repo2md import github
+
+        env = config.EnvConfig(**kwargs)
         assert repo_name, "'repo_name' is mandatory for conversion"
         assert (
-            config.env.git_owner
+            env.git_owner
         ), f"'git_owner' is required to fetch the repository: {repo_name!r}"
-        downloaded = github.download_and_extract(
-            repo=repo_name,
-            dest_dir=destination,
-            branch=branch,
-        )
-    download_path = downloaded["path"]
-    output = os.path.join(destination, f"{repo_name}.md")
-    args = dict(path=download_path, filename=output)
-    if language_filter:
-        args["language"] = downloaded["language"]
-    generate_markdown(**args)
-    if delete:
-        LOGGER.info("Deleting repository after conversion")
-        shutil.rmtree(path=download_path, ignore_errors=True)
+        assert not (
+            ref or since
+        ), "'ref' and 'since' are only supported with 'source_repo_path', use 'branch' for GitHub"
+        if cache:
+            assert not any(
+                shards.values()
+            ), "Sharded output is not supported with 'cache', the cache stores a single Markdown file"
+        assert not (
+            sparse and (cache or in_archive)
+        ), "'sparse' is not supported with 'cache' or 'in_archive', which render from the zipball"
+    metrics.labels.setdefault("repo", repo_name)
+    filename = os.path.join(destination, f"{repo_name}.md")
+    with metrics.stage("total"):
+        if source_repo_path and (ref or since):
+            generate_git_markdown(
+                source_repo_path,
+                repo_name,
+                ref=ref,
+                since=since,
+                filename=filename,
+                output=output,
+                language=languages.get_language(language_filter, source_repo_language),
+                metrics=metrics,
+                **shards,
+                **options,
+            )
+        elif source_repo_path:
+            args = dict(
+                path=source_repo_path,
+                filename=filename,
+                output=output,
+                **shards,
+                **options,
+            )
+            if incremental:
+                args["manifest_file"] = f"{filename}.manifest.json"
+            args["language"] = languages.get_language(
+                language_filter, source_repo_language
+            )
+            generate_markdown(metrics=metrics, **args)
+        elif cache:
+            if not isinstance(cache, _cache.Cache):
+                cache = _cache.Cache(directory=cache)
+            convert_cached(
+                repo_name=repo_name,
+                cache=cache,
+                destination=destination,
+                branch=branch,
+                language_filter=language_filter,
+                env=env,
+                metrics=metrics,
+                **options,
+            )
+        elif in_archive:
+            downloaded = github.download_archive(
+                repo=repo_name, branch=branch, env=env, metrics=metrics
+            )
+            with downloaded["archive"] as archive:
+                generate_archive_markdown(
+                    archive,
+                    repo_name,
+                    filename=filename,
+                    output=output,
+                    language=languages.get_language(
+                        language_filter, downloaded["language"]
+                    ),
+                    metrics=metrics,
+                    **shards,
+                    **options,
+                )
+        else:
+            if sparse:
+                downloaded = github.sparse_fetch(
+                    repo=repo_name,
+                    dest_dir=destination,
+                    branch=branch,
+                    language_filter=language_filter,
+                    gitignore=gitignore,
+                    env=env,
+                    max_file_size=max_file_size,
+                    # A token budget selects the files by its own policy, so all of them are fetched
+                    max_total_size=max_total_size if max_tokens is None else None,
+                    metrics=metrics,
+                )
+            else:
+                downloaded = github.download_and_extract(
+                    repo=repo_name,
+                    dest_dir=destination,
+                    branch=branch,
+                    env=env,
+                    metrics=metrics,
+                )
+            generate_markdown(
+                path=downloaded["path"],
+                filename=filename,
+                output=output,
+                language=languages.get_language(
+                    language_filter, downloaded["language"]
+                ),
+                excluded=downloaded.get("skipped", ()),
+                metrics=metrics,
+                **shards,
+                **options,
+            )
+            if delete:
+                LOGGER.info("Deleting repository after conversion")
+                shutil.rmtree(path=downloaded["path"], ignore_errors=True)
+    LOGGER.info("Converted %s: %s", repo_name, metrics.summary())
+    if metrics_file:
+        metrics.export(metrics_file)
+    return metrics
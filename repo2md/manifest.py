@@ -0,0 +1,130 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict
+
+LOGGER = logging.getLogger("repo2md")
+
+
+class Manifest:
+    """A class to fingerprint the files of a local source, so unchanged files are not read again on the next run.
+
+    >>> Manifest
+
+    """
+
+    VERSION = 1
+
+    def __init__(self, filepath: str, root: str, options: Dict[str, Any] = None):
+        """Initialize the manifest and load the fingerprints from the previous run.
+
+        Args:
+            filepath: Path to the sidecar manifest file.
+            root: Root directory of the source, file paths are stored relative to it.
+            options: Options the fragments are rendered with, fragments from a run with other options are discarded.
+        """
+        self.filepath = filepath
+        self.root = root
+        self.options = options or {}
+        self.started_ns = time.time_ns()
+        self.previous: Dict[str, Dict[str, int | str]] = {}
+        self.current: Dict[str, Dict[str, int | str]] = {}
+        self.saved_ns = 0
+        self.reused = 0
+        self.read = 0
+        # Files are read from the worker threads, when the output is rendered with several of them
+        self.lock = threading.Lock()
+        try:
+            with open(filepath) as file:
+                data = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        if data.get("version") == self.VERSION and data.get("options") == self.options:
+            self.previous = data["files"]
+            self.saved_ns = data["saved_ns"]
+
+    @staticmethod
+    def digest(fragment: str) -> str:
+        """Hashes a rendered fragment, to verify it when it is reused.
+
+        Args:
+            fragment: Content of the file, as it was read.
+
+        Returns:
+            str:
+            Hex digest of the fragment.
+        """
+        return hashlib.sha256(fragment.encode("utf-8", "surrogatepass")).hexdigest()
+
+    def reader(
+        self, read: Callable[[str], Dict[str, str]]
+    ) -> Callable[[str], Dict[str, str]]:
+        """Wraps a file reader to reuse the rendered fragment of files whose size and modified time are unchanged.
+
+        Args:
+            read: Callable to read a file path into a dictionary of its content.
+
+        Returns:
+            Callable[[str], Dict[str, str]]:
+            A callable with the same signature, that only reads files which changed since the previous run.
+
+        Notes:
+            Fragments that don't match their digest, eg: from a manifest edited or cut short, are read again.
+        """
+
+        def incremental(filepath: str) -> Dict[str, str]:
+            """Reads a file, or reuses its fragment from the previous run."""
+            key = os.path.relpath(filepath, self.root)
+            stat = os.stat(filepath)
+            entry = self.previous.get(key)
+            # Files modified in the same instant the manifest was saved may have changed after they were fingerprinted
+            if (
+                entry
+                and entry["size"] == stat.st_size
+                and entry["mtime_ns"] == stat.st_mtime_ns
+                and stat.st_mtime_ns < self.saved_ns
+            ):
+                if self.digest(entry["fragment"]) == entry["sha256"]:
+                    with self.lock:
+                        self.current[key] = entry
+                        self.reused += 1
+                    return {filepath: entry["fragment"]}
+                LOGGER.warning(
+                    "Fragment of %s doesn't match its digest, reading it again", key
+                )
+            content = read(filepath)[filepath]
+            with self.lock:
+                self.current[key] = {
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "sha256": self.digest(content),
+                    "fragment": content,
+                }
+                self.read += 1
+            return {filepath: content}
+
+        return incremental
+
+    def save(self) -> None:
+        """Stores the fingerprints of the files seen in this run, dropping the ones that no longer exist."""
+        LOGGER.info(
+            "Reused %d unchanged files and read %d files, storing manifest in %s",
+            self.reused,
+            self.read,
+            self.filepath,
+        )
+        temp = f"{self.filepath}.tmp"
+        with open(temp, "w") as file:
+            json.dump(
+                {
+                    "version": self.VERSION,
+                    "saved_ns": self.started_ns,
+                    "options": self.options,
+                    "files": self.current,
+                },
+                file,
+            )
+        os.replace(temp, self.filepath)
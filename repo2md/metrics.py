@@ -0,0 +1,161 @@
+import collections
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import Generator
+from typing import Any, Callable, Dict, Tuple
+
+LOGGER = logging.getLogger("repo2md")
+
+
+class Metrics:
+    """A class to record the wall time of each stage of a conversion, along with counters for files, bytes and retries.
+
+    >>> Metrics
+
+    """
+
+    def __init__(self, **labels: str):
+        """Initialize empty timings and counters.
+
+        Keyword Args:
+            Labels to identify the conversion in the exported metrics, eg: ``repo="repo2md"``.
+        """
+        self.labels = labels
+        self.timings: Dict[str, float] = collections.defaultdict(float)
+        self.counters: Dict[str, int] = collections.defaultdict(int)
+        # Stages and counters may be recorded from the threads reading files
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Generator[None]:
+        """Times a stage, adding to the time already recorded for it.
+
+        Args:
+            name: Name of the stage, eg: ``download``.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.timings[name] += elapsed
+
+    def count(self, name: str, value: int = 1) -> None:
+        """Adds to a counter.
+
+        Args:
+            name: Name of the counter, eg: ``files_read``.
+            value: Value to add.
+        """
+        with self.lock:
+            self.counters[name] += value
+
+    def timed(
+        self, name: str, func: Callable[..., Any], counter: str = None
+    ) -> Callable[..., Any]:
+        """Wraps a function to time every call as a stage.
+
+        Args:
+            name: Name of the stage.
+            func: Function to wrap.
+            counter: Name of a counter to increment for every call.
+
+        Returns:
+            Callable[..., Any]:
+            A callable with the same signature as the function.
+        """
+
+        def wrapper(*args, **kwargs) -> Any:
+            """Calls the function within the stage."""
+            with self.stage(name):
+                result = func(*args, **kwargs)
+            if counter:
+                self.count(counter)
+            return result
+
+        return wrapper
+
+    def snapshot(self) -> Tuple[Dict[str, float], Dict[str, int]]:
+        """Copies the timings and counters, while no thread is adding to them.
+
+        Returns:
+            Tuple[Dict[str, float], Dict[str, int]]:
+            The seconds spent in each stage, and the counters.
+        """
+        with self.lock:
+            return dict(self.timings), dict(self.counters)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Gets the recorded metrics.
+
+        Returns:
+            Dict[str, Any]:
+            A dictionary with the labels, the seconds spent in each stage and the counters.
+        """
+        timings, counters = self.snapshot()
+        return {
+            "labels": self.labels,
+            "timings": {name: round(value, 6) for name, value in timings.items()},
+            "counters": counters,
+        }
+
+    def write_json_lines(self, filepath: str) -> None:
+        """Appends the recorded metrics to a JSON-lines file, with a timestamp.
+
+        Args:
+            filepath: Path to the JSON-lines file.
+        """
+        with open(filepath, "a") as file:
+            file.write(json.dumps({"timestamp": time.time(), **self.as_dict()}) + "\n")
+
+    def write_prometheus(self, filepath: str) -> None:
+        """Writes the recorded metrics in the Prometheus text format, for the node exporter's textfile collector.
+
+        Args:
+            filepath: Path to the ``.prom`` file, replaced atomically so the collector never reads a partial file.
+        """
+        timings, counters = self.snapshot()
+        labels = [f'{key}="{value}"' for key, value in sorted(self.labels.items())]
+        lines = ["# TYPE repo2md_stage_seconds gauge"]
+        for name, value in sorted(timings.items()):
+            stage = ",".join(labels + [f'stage="{name}"'])
+            lines.append(f"repo2md_stage_seconds{{{stage}}} {value:.6f}")
+        suffix = f"{{{','.join(labels)}}}" if labels else ""
+        for name, value in sorted(counters.items()):
+            lines.append(f"# TYPE repo2md_{name} gauge")
+            lines.append(f"repo2md_{name}{suffix} {value}")
+        temp = f"{filepath}.tmp"
+        with open(temp, "w") as file:
+            file.write("\n".join(lines) + "\n")
+        os.replace(temp, filepath)
+
+    def export(self, filepath: str) -> None:
+        """Exports the recorded metrics, in the Prometheus text format for ``.prom`` files and as JSON lines otherwise.
+
+        Args:
+            filepath: Path to the file to export the metrics to.
+        """
+        LOGGER.info("Exporting metrics to %s", filepath)
+        if filepath.endswith(".prom"):
+            self.write_prometheus(filepath)
+        else:
+            self.write_json_lines(filepath)
+
+    def summary(self) -> str:
+        """Summarizes the recorded metrics in a single line, for the logs.
+
+        Returns:
+            str:
+            Seconds spent in each stage, followed by the counters.
+        """
+        timings, counters = self.snapshot()
+        parts = (
+            ", ".join(f"{k}={v:.3f}s" for k, v in timings.items()),
+            ", ".join(f"{k}={v}" for k, v in counters.items()),
+        )
+        return "; ".join(part for part in parts if part)
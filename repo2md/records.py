@@ -0,0 +1,207 @@
+import functools
+import logging
+import os
+import pathlib
+import zipfile
+from collections.abc import Generator
+from typing import IO, Any, Callable, Dict
+
+from repo2md import index, languages, main, utils
+
+LOGGER = logging.getLogger("repo2md")
+
+
+class Record:
+    """A class to describe a file selected for the output, with its content read on first access.
+
+    >>> Record
+
+    """
+
+    __slots__ = ("path", "relative", "language", "size", "reader", "_content")
+
+    def __init__(
+        self,
+        path: str,
+        relative: str,
+        language: str | None,
+        size: int,
+        reader: Callable[[str], Dict[str, str]],
+    ):
+        """Initialize the record with the metadata from the index.
+
+        Args:
+            path: Path of the file in the index.
+            relative: Path of the file as it is written in the Markdown output, starting with the repository name.
+            language: Language of the file, based on its extension or its name.
+            size: Size of the file in bytes, before reading it.
+            reader: Callable to read the file path into a dictionary of its content.
+        """
+        self.path = path
+        self.relative = relative
+        self.language = language
+        self.size = size
+        self.reader = reader
+        self._content: str | None = None
+
+    def __repr__(self) -> str:
+        """Returns a string representation of the record."""
+        return f"{self.__class__.__name__}(relative={self.relative!r}, language={self.language!r}, size={self.size})"
+
+    @property
+    def content(self) -> str:
+        """Reads the content of the file once, with the same decoding and limits as the Markdown output."""
+        if self._content is None:
+            self._content = self.reader(self.path)[self.path]
+        return self._content
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Gets the record as a dictionary, reading the content if it hasn't been read yet.
+
+        Returns:
+            Dict[str, Any]:
+            A dictionary with the path, language, size and content of the file.
+        """
+        return {
+            "path": self.relative,
+            "language": self.language,
+            "size": self.size,
+            "content": self.content,
+        }
+
+
+def iter_records(
+    source: str | os.PathLike | IO[bytes],
+    name: str = None,
+    language: str = None,
+    gitignore: bool = False,
+    workers: int = None,
+    lazy: bool = False,
+    max_file_size: int = None,
+    max_total_size: int = None,
+    max_tokens: int = None,
+    policy: str = None,
+) -> Generator[Record]:
+    """Yields the files selected for the Markdown output as records, in the same order, without writing anything.
+
+    Args:
+        source: Path to a directory, or a zip archive as a path or a binary file object.
+        name: Name of the repository for a zip archive, replaces the top-level directory of the archive members.
+        language: Programming language of the code files.
+        gitignore: Boolean flag to also ignore the patterns in the ``.gitignore`` and ``.repo2mdignore`` files.
+        workers: Number of threads to read files with, files are read sequentially when unset.
+        lazy: Boolean flag to yield the records without reading them, their content is read on first access.
+        max_file_size: Maximum size of a file in bytes, larger files are truncated.
+        max_total_size: Maximum total size of the files in bytes, files beyond it are left out.
+        max_tokens: Maximum number of tokens in the code contents, estimated from the file sizes before reading.
+        policy: Order to fill the token budget in, one of ``smallest``, ``extension`` or ``depth``.
+
+    Yields:
+        Record:
+        Path, language, size and content of each file.
+
+    Notes:
+        Archives are kept open until the iteration ends, so lazy records of an archive must be read before that.
+    """
+    if isinstance(source, (str, os.PathLike)) and os.path.isdir(source):
+        source_index = index.Index(source, gitignore=gitignore)
+        yield from get_records(
+            source_index,
+            language,
+            workers,
+            lazy,
+            max_file_size,
+            max_total_size,
+            max_tokens,
+            policy,
+        )
+        return
+    with zipfile.ZipFile(source) as archive:
+        if not name:
+            name = pathlib.Path(getattr(source, "name", None) or source).stem
+        source_index = index.ArchiveIndex(archive, name, gitignore=gitignore)
+        yield from get_records(
+            source_index,
+            language,
+            workers,
+            lazy,
+            max_file_size,
+            max_total_size,
+            max_tokens,
+            policy,
+        )
+
+
+def get_records(
+    source_index: index.Index,
+    language: str = None,
+    workers: int = None,
+    lazy: bool = False,
+    max_file_size: int = None,
+    max_total_size: int = None,
+    max_tokens: int = None,
+    policy: str = None,
+) -> Generator[Record]:
+    """Yields the files selected from an index as records.
+
+    Args:
+        source_index: Directory index to select the files from.
+        language: Programming language of the code files.
+        workers: Number of threads to read files with, files are read sequentially when unset.
+        lazy: Boolean flag to yield the records without reading them, their content is read on first access.
+        max_file_size: Maximum size of a file in bytes, larger files are truncated.
+        max_total_size: Maximum total size of the files in bytes, files beyond it are left out.
+        max_tokens: Maximum number of tokens in the code contents, estimated from the file sizes before reading.
+        policy: Order to fill the token budget in, one of ``smallest``, ``extension`` or ``depth``.
+
+    Yields:
+        Record:
+        Path, language, size and content of each file.
+    """
+    budget = None
+    if max_tokens is not None:
+        budget = main.Selection(
+            source_index,
+            language=language,
+            max_tokens=max_tokens,
+            policy=policy,
+            max_file_size=max_file_size,
+            max_total_size=max_total_size,
+        )
+    elif max_total_size is not None:
+        budget = main.Budget(max_total_size, source_index.size, max_file_size)
+    reader = functools.partial(
+        main.get_content, opener=source_index.open, limit=max_file_size
+    )
+    detector = languages.get_index()
+    base_path = os.path.dirname(os.path.normpath(source_index.path))
+    # Records are built in walk order on the calling thread, so the budget is spent deterministically
+    records = (
+        Record(
+            path=node.path,
+            relative=node.path.replace(base_path, "").lstrip(os.path.sep),
+            language=detector.sniff(
+                node.name,
+                functools.partial(languages.read_head, node.path, source_index.open),
+            ),
+            size=source_index.size(node.path),
+            reader=reader,
+        )
+        for directory in source_index.walk()
+        if directory.is_dir
+        for node in main.select_files(directory, language, budget, source_index.open)
+    )
+    if lazy:
+        yield from records
+    elif workers and workers > 1:
+
+        def read(record: Record) -> Record:
+            """Reads the content of a record in a worker thread."""
+            _ = record.content
+            return record
+
+        yield from utils.ordered_map(read, records, workers=workers)
+    else:
+        for record in records:
+            _ = record.content
+            yield record
@@ -0,0 +1,495 @@
+import collections
+import http.server
+import json
+import logging
+import math
+import os
+import queue
+import re
+import shutil
+import socketserver
+import threading
+import time
+import urllib.parse
+import uuid
+from typing import Any, Dict
+
+from repo2md import cache as _cache
+from repo2md import main
+from repo2md import metrics as _metrics
+
+LOGGER = logging.getLogger("repo2md")
+
+# Parameters a job can set, passed on to ``main.convert_repo_to_md``
+JOB_OPTIONS = (
+    "repo_name",
+    "git_owner",
+    "branch",
+    "language_filter",
+    "source_repo_language",
+    "workers",
+    "in_archive",
+    "sparse",
+    "max_file_size",
+    "max_total_size",
+    "gitignore",
+    "max_tokens",
+    "policy",
+    "summary",
+    "tree_depth",
+    "tree_entries",
+    "dedup",
+)
+# Parameters that can only be set as defaults when starting the server, never by a job
+# A job can't send the server's token to another host, or read an arbitrary directory on the server
+SERVER_OPTIONS = ("git_token", "git_api_url", "source_repo_path")
+# Parameters that are never reported back in the status of a job
+SECRET_OPTIONS = ("git_token",)
+# Parameters of a job that name a file or directory on the server, limited to the characters GitHub allows
+NAME_OPTIONS = ("repo_name", "git_owner")
+NAME_PATTERN = re.compile(r"[A-Za-z0-9._-]+")
+# Maximum size of a job's request body in bytes
+MAX_BODY_SIZE = 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+
+def is_name(value: Any) -> bool:
+    """Checks if a value is a plain GitHub name, that can't step out of the directory it is joined to.
+
+    Args:
+        value: Value of the parameter.
+
+    Returns:
+        bool:
+        Returns a boolean flag to indicate if the value is a valid name.
+    """
+    return (
+        isinstance(value, str)
+        and NAME_PATTERN.fullmatch(value) is not None
+        and value not in (".", "..")
+    )
+
+
+class Job:
+    """A class to hold the parameters, state and result of a conversion submitted to the server.
+
+    >>> Job
+
+    """
+
+    def __init__(self, params: Dict[str, Any], directory: str):
+        """Initialize the job as queued.
+
+        Args:
+            params: Keyword arguments to convert the repository with.
+            directory: Directory to store the job's download and Markdown file in.
+        """
+        self.id = uuid.uuid4().hex
+        self.params = params
+        self.directory = os.path.join(directory, self.id)
+        self.status = "queued"
+        self.error: str | None = None
+        self.metrics = _metrics.Metrics(job=self.id)
+        self.created = time.time()
+        self.started: float | None = None
+        self.finished: float | None = None
+        self.done = threading.Event()
+
+    @property
+    def filename(self) -> str:
+        """Path of the Markdown file, named after the repository as in ``main.convert_repo_to_md``."""
+        if source := self.params.get("source_repo_path"):
+            name = os.path.basename(os.path.normpath(source))
+        else:
+            name = self.params["repo_name"]
+        return os.path.join(self.directory, f"{name}.md")
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Gets the state of the job, without its secrets.
+
+        Returns:
+            Dict[str, Any]:
+            A dictionary with the ID, parameters, status, timestamps, error and metrics of the job.
+        """
+        return {
+            "id": self.id,
+            "status": self.status,
+            "params": {
+                key: value
+                for key, value in self.params.items()
+                if key not in SECRET_OPTIONS
+            },
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "error": self.error,
+            "metrics": self.metrics.as_dict(),
+            "output": f"/jobs/{self.id}/output",
+        }
+
+
+class Service:
+    """A class to run conversion jobs from a bounded queue on a pool of worker threads.
+
+    >>> Service
+
+    """
+
+    def __init__(
+        self,
+        destination: str = "tmp",
+        workers: int = 4,
+        max_queue: int = 100,
+        max_jobs: int = 1000,
+        cache: _cache.Cache | str = None,
+        **defaults,
+    ):
+        """Initialize the queue and start the worker threads.
+
+        Args:
+            destination: Directory to store the jobs' downloads and Markdown files in.
+            workers: Number of jobs to run at the same time.
+            max_queue: Maximum number of jobs waiting to run, further jobs are rejected until the queue drains.
+            max_jobs: Maximum number of finished jobs to keep, the oldest ones are removed along with their files.
+            cache: Cache, or the directory for one, shared by all the jobs to reuse archives and outputs by commit SHA.
+
+        Keyword Args:
+            Default parameters of the jobs, eg: ``git_owner`` and ``git_token``. Parameters in ``SERVER_OPTIONS``
+            can only be set here, jobs can't override them.
+        """
+        unknown = set(defaults) - set(JOB_OPTIONS) - set(SERVER_OPTIONS)
+        assert not unknown, f"Unsupported job parameters: {', '.join(sorted(unknown))}"
+        self.destination = destination
+        self.max_jobs = max_jobs
+        if cache and not isinstance(cache, _cache.Cache):
+            cache = _cache.Cache(directory=cache)
+        self.cache = cache
+        self.defaults = {key: value for key, value in defaults.items() if value}
+        self.jobs: Dict[str, Job] = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.queue: queue.Queue[Job | None] = queue.Queue(maxsize=max_queue)
+        self.started = time.time()
+        os.makedirs(destination, exist_ok=True)
+        self.workers = [
+            threading.Thread(target=self.work, name=f"repo2md-worker-{n}", daemon=True)
+            for n in range(workers)
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, params: Dict[str, Any]) -> Job:
+        """Queues a conversion job.
+
+        Args:
+            params: Keyword arguments to convert the repository with, over the default parameters.
+                Only the parameters in ``JOB_OPTIONS`` are accepted.
+
+        Returns:
+            Job:
+            The queued job.
+
+        Raises:
+            ValueError:
+            If the parameters are not supported, a name is not a plain GitHub name or the repository is missing.
+            queue.Full:
+            If the queue is full.
+        """
+        if unknown := set(params) - set(JOB_OPTIONS):
+            raise ValueError(
+                f"Unsupported job parameters: {', '.join(sorted(unknown))}"
+            )
+        for key in NAME_OPTIONS:
+            if key in params and not is_name(params[key]):
+                raise ValueError(
+                    f"{key!r} must be a plain GitHub name, got {params[key]!r}"
+                )
+        params = {**self.defaults, **params}
+        if not (params.get("repo_name") or params.get("source_repo_path")):
+            raise ValueError(
+                "'repo_name' or 'source_repo_path' is mandatory for conversion"
+            )
+        job = Job(params, self.destination)
+        with self.lock:
+            self.queue.put_nowait(job)
+            self.jobs[job.id] = job
+        LOGGER.info("Queued job %s", job.id)
+        return job
+
+    def work(self) -> None:
+        """Runs the queued jobs one after the other, until a None is queued."""
+        while (job := self.queue.get()) is not None:
+            self.run(job)
+            self.evict()
+
+    def run(self, job: Job) -> None:
+        """Runs a conversion job, recording its status and metrics.
+
+        Args:
+            job: Job to run.
+        """
+        job.status, job.started = "running", time.time()
+        try:
+            main.convert_repo_to_md(
+                destination=job.directory,
+                # Sparse fetches skip the zipball, so they can't be cached by commit
+                cache=None if job.params.get("sparse") else self.cache,
+                metrics=job.metrics,
+                **job.params,
+            )
+        except Exception as error:
+            LOGGER.exception("Job %s failed", job.id)
+            job.status, job.error = "failed", f"{type(error).__name__}: {error}"
+        else:
+            job.status = "succeeded"
+        job.finished = time.time()
+        job.done.set()
+
+    def evict(self) -> None:
+        """Removes the oldest finished jobs and their files, beyond the maximum number of jobs to keep."""
+        with self.lock:
+            finished = [job for job in self.jobs.values() if job.done.is_set()]
+            for job in finished[: max(len(finished) - self.max_jobs, 0)]:
+                del self.jobs[job.id]
+                shutil.rmtree(job.directory, ignore_errors=True)
+
+    def status(self) -> Dict[str, Any]:
+        """Gets the state of the server.
+
+        Returns:
+            Dict[str, Any]:
+            A dictionary with the number of jobs in each status, the queue size and the uptime in seconds.
+        """
+        with self.lock:
+            statuses = collections.Counter(job.status for job in self.jobs.values())
+        return {
+            "jobs": dict(statuses),
+            "queued": self.queue.qsize(),
+            "max_queue": self.queue.maxsize,
+            "workers": len(self.workers),
+            "uptime": round(time.time() - self.started, 3),
+        }
+
+    def shutdown(self) -> None:
+        """Stops the worker threads once the jobs that are queued have run."""
+        for _ in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join()
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """Request handler for the job, output and status endpoints.
+
+    >>> Handler
+
+    """
+
+    protocol_version = "HTTP/1.1"
+    server: "TCPServer | UnixServer"
+
+    def address_string(self) -> str:
+        """Gets the client's address, which is empty for a Unix socket."""
+        if isinstance(self.client_address, tuple):
+            return self.client_address[0]
+        return "unix"
+
+    def log_message(self, format: str, *args) -> None:
+        """Logs the requests with the package's logger."""
+        LOGGER.debug("%s - %s", self.address_string(), format % args)
+
+    def send_json(self, status: int, body: Any, headers: Dict[str, str] = None) -> None:
+        """Responds with a JSON body.
+
+        Args:
+            status: HTTP status code.
+            body: Body to serialize as JSON.
+            headers: Additional headers for the response.
+        """
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def get_job(self, job_id: str) -> Job | None:
+        """Looks up a job, responding with a 404 if it doesn't exist.
+
+        Args:
+            job_id: ID of the job.
+
+        Returns:
+            Job | None:
+            The job if it exists, otherwise None.
+        """
+        if job := self.server.service.jobs.get(job_id):
+            return job
+        self.send_json(404, {"error": f"Job {job_id!r} not found"})
+
+    def do_GET(self) -> None:
+        """Responds with the server status, the state of a job, or streams its Markdown file once it finishes."""
+        url = urllib.parse.urlsplit(self.path)
+        parts = url.path.strip("/").split("/")
+        if parts == ["status"]:
+            self.send_json(200, self.server.service.status())
+        elif parts == ["jobs"]:
+            with self.server.service.lock:
+                jobs = list(self.server.service.jobs.values())
+            self.send_json(200, [job.as_dict() for job in jobs])
+        elif len(parts) == 2 and parts[0] == "jobs":
+            if job := self.get_job(parts[1]):
+                self.send_json(200, job.as_dict())
+        elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "output":
+            if job := self.get_job(parts[1]):
+                query = urllib.parse.parse_qs(url.query)
+                try:
+                    timeout = float(query["timeout"][0]) if "timeout" in query else None
+                    assert timeout is None or 0 <= timeout < math.inf
+                except (ValueError, AssertionError):
+                    self.send_json(
+                        400,
+                        {"error": "'timeout' must be a non-negative number of seconds"},
+                    )
+                    return
+                self.send_output(job, timeout)
+        else:
+            self.send_json(404, {"error": f"Unknown endpoint {url.path!r}"})
+
+    def do_POST(self) -> None:
+        """Queues a conversion job from a JSON body of its parameters, and responds with its state.
+
+        Notes:
+            The Markdown file is streamed back in the same response instead, with ``?wait`` in the URL.
+        """
+        url = urllib.parse.urlsplit(self.path)
+        if url.path.strip("/") != "jobs":
+            self.send_json(404, {"error": f"Unknown endpoint {url.path!r}"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_SIZE:
+            self.send_json(413, {"error": "Request body is too large"})
+            self.close_connection = True
+            return
+        try:
+            params = json.loads(self.rfile.read(length) or b"{}")
+            assert isinstance(params, dict), "Request body must be a JSON object"
+            job = self.server.service.submit(params)
+        except (ValueError, AssertionError) as error:
+            self.send_json(400, {"error": str(error)})
+        except queue.Full:
+            self.send_json(503, {"error": "Job queue is full"}, {"Retry-After": "1"})
+        else:
+            if "wait" in urllib.parse.parse_qs(url.query, keep_blank_values=True):
+                self.send_output(job)
+            else:
+                self.send_json(202, job.as_dict(), {"Location": f"/jobs/{job.id}"})
+
+    def send_output(self, job: Job, timeout: float = None) -> None:
+        """Streams the Markdown file of a job, waiting for the job to finish.
+
+        Args:
+            job: Job to stream the Markdown file of.
+            timeout: Maximum time in seconds to wait for the job, waits indefinitely when unset.
+        """
+        if not job.done.wait(timeout):
+            self.send_json(504, job.as_dict())
+        elif job.status == "failed":
+            self.send_json(500, job.as_dict())
+        else:
+            with open(job.filename, "rb") as file:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/markdown; charset=utf-8")
+                self.send_header("Content-Length", str(os.fstat(file.fileno()).st_size))
+                self.send_header("X-Job-Id", job.id)
+                self.end_headers()
+                try:
+                    shutil.copyfileobj(file, self.wfile, CHUNK_SIZE)
+                except (BrokenPipeError, ConnectionResetError):
+                    LOGGER.debug(
+                        "Client disconnected from the output of job %s", job.id
+                    )
+                    self.close_connection = True
+
+
+class TCPServer(http.server.ThreadingHTTPServer):
+    """HTTP server over TCP, handing the requests to the service."""
+
+    daemon_threads = True
+    service: Service
+
+
+class UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """HTTP server over a Unix socket, handing the requests to the service."""
+
+    daemon_threads = True
+    service: Service
+
+
+def serve(
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    socket: str = None,
+    destination: str = "tmp",
+    workers: int = 4,
+    max_queue: int = 100,
+    max_jobs: int = 1000,
+    cache: _cache.Cache | str = None,
+    ready: threading.Event = None,
+    **kwargs,
+) -> None:
+    """Serves conversion jobs over HTTP until interrupted, keeping the GitHub session and the cache warm across jobs.
+
+    Args:
+        host: Host to listen on, defaults to the loopback interface.
+        port: Port to listen on.
+        socket: Path of a Unix socket to listen on instead of the host and port.
+        destination: Directory to store the jobs' downloads and Markdown files in.
+        workers: Number of jobs to run at the same time.
+        max_queue: Maximum number of jobs waiting to run, further jobs are rejected with a 503 until the queue drains.
+        max_jobs: Maximum number of finished jobs to keep, the oldest ones are removed along with their files.
+        cache: Cache, or the directory for one, shared by all the jobs to reuse archives and outputs by commit SHA.
+        ready: Event to set once the server is listening.
+
+    Keyword Args:
+        Default parameters of the jobs, eg: ``git_owner`` and ``git_token``. Parameters in ``SERVER_OPTIONS``, the
+        token, the API URL and a local source, can only be set here.
+
+    Notes:
+        - ``POST /jobs`` queues a job from a JSON body of ``convert_repo_to_md`` parameters, and responds with a 202.
+        - ``POST /jobs?wait`` queues a job, and streams back its Markdown file once it finishes.
+        - ``GET /jobs/{id}`` responds with the state of a job, ``GET /jobs`` with all of them.
+        - ``GET /jobs/{id}/output`` streams the Markdown file of a job, waiting up to ``?timeout`` seconds for it.
+        - ``GET /status`` responds with the number of jobs in each status and the size of the queue.
+    """
+    service = Service(
+        destination=destination,
+        workers=workers,
+        max_queue=max_queue,
+        max_jobs=max_jobs,
+        cache=cache,
+        **kwargs,
+    )
+    server: TCPServer | UnixServer
+    if socket:
+        if os.path.exists(socket):
+            os.remove(socket)
+        server = UnixServer(socket, Handler)
+        address = socket
+    else:
+        server = TCPServer((host, port), Handler)
+        address = "http://%s:%d" % server.server_address[:2]
+    server.service = service
+    LOGGER.info("Serving on %s with %d workers", address, workers)
+    if ready:
+        ready.set()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        LOGGER.info("Shutting down")
+    finally:
+        server.server_close()
+        service.shutdown()
+        if socket:
+            os.remove(socket)
@@ -1,7 +1,36 @@
 import pathlib
-from typing import Sequence
+from collections.abc import Generator
+from typing import Any, Callable, Sequence
 
-from repo2md import utils
+from repo2md import index as _index
+
+# Symbols for the tree
+ELBOW = "└──"
+PIPE = "│  "
+TEE = "├──"
+BLANK = "   "
+
+
+def describe(nodes: Sequence[_index.Node]) -> str:
+    """Describes the entries left out of a directory in the tree.
+
+    Args:
+        nodes: Nodes that are left out.
+
+    Returns:
+        str:
+        Number of files and directories left out, eg: ``… 12,345 more files and 3 more directories``.
+    """
+    directories = sum(1 for node in nodes if node.is_dir)
+    files = len(nodes) - directories
+    counts = []
+    if files:
+        counts.append(f"{files:,} more file{'s' if files > 1 else ''}")
+    if directories:
+        counts.append(
+            f"{directories:,} more director{'ies' if directories > 1 else 'y'}"
+        )
+    return "… " + " and ".join(counts)
 
 
 class Tree:
@@ -11,64 +40,81 @@ class Tree:
 
     """
 
-    def __init__(self, path: pathlib.Path, ignore: Sequence[str] = None):
+    def __init__(
+        self,
+        path: pathlib.Path,
+        ignore: Sequence[str] = None,
+        index: _index.Index = None,
+        max_depth: int = None,
+        max_entries: int = None,
+    ):
         """Initialize the Tree with a path and optional ignore list.
 
         Args:
             path: The root path to start building the tree.
             ignore: Files and directories to ignore in the tree structure.
+            index: Pre-built directory index to render from, instead of scanning the path again.
+            max_depth: Maximum depth of the directories to expand, the contents of deeper ones are summarized.
+            max_entries: Maximum number of entries to list in a directory, the rest are summarized in one line.
         """
-        self.__tree = []
         self.path = pathlib.Path(path)
-        self.ignore = ignore or utils.IGNORE_FILES + utils.IGNORE_DIRECTORIES
+        self.ignore = ignore
+        self.index = index
+        self.max_depth = max_depth
+        self.max_entries = max_entries
 
-    def get(self) -> str:
-        """Generate the tree structure starting from the specified path."""
-        self.__tree.clear()
-        self.__get(self.path)
-        return "\n".join(self.__tree)
+    def lines(self) -> Generator[str]:
+        """Generates the lines of the tree structure, walking the index with an explicit stack.
 
-    def __get(self, path: pathlib.Path, last: bool = True, header: str = ""):
-        """Recursively build the tree structure for the given path.
+        Yields:
+            str:
+            Each line of the tree, without a line break.
+        """
+        if not self.index:
+            self.index = _index.Index(
+                self.path, ignore_files=self.ignore, ignore_directories=self.ignore
+            )
+        # Each item is a node, or a summary line of the entries left out, with the header of its parent and its depth
+        stack = [(self.index.root, True, "", 0)]
+        while stack:
+            node, last, header, depth = stack.pop()
+            if isinstance(node, str):
+                yield header + ELBOW + node
+                continue
+            yield header + (ELBOW if last else TEE) + node.name
+            if not node.is_dir or not node.children:
+                continue
+            # Headers are built once per directory and shared by all its children
+            header += BLANK if last else PIPE
+            children = node.children
+            if self.max_depth is not None and depth >= self.max_depth:
+                stack.append((describe(children), True, header, depth + 1))
+                continue
+            if (limit := self.max_entries) is not None and len(children) > limit:
+                stack.append((describe(children[limit:]), True, header, depth + 1))
+                children = children[:limit]
+                # The summary line follows the listed children, so none of them is the last one
+                stack.extend(
+                    (child, False, header, depth + 1) for child in reversed(children)
+                )
+                continue
+            stack.append((children[-1], True, header, depth + 1))
+            stack.extend(
+                (child, False, header, depth + 1) for child in reversed(children[:-1])
+            )
+
+    def write(self, writer: Callable[[str], Any]) -> None:
+        """Streams the tree structure into a writer, one line at a time.
 
         Args:
-            path: The current path to process.
-            last: Whether this is the last item in the current directory.
-            header: The header string to prepend to the current line.
+            writer: Callable that accepts a string.
         """
-        # If the current path should be ignored, return early
-        for i in self.ignore:
-            if i == path.name:
-                return
-
-        # Symbols for the tree
-        elbow = "└──"
-        pipe = "│  "
-        tee = "├──"
-        blank = "   "
-
-        # If it's a directory with a name, use path.name; else, fall back to path.parts[-1]
-        folder_name = path.name if path.name else path.parts[-1]
-
-        # Append the folder name with the appropriate tree symbol
-        self.__tree.append(header + (elbow if last else tee) + folder_name)
-
-        # If the current path is a directory, recurse into its contents
-        if path.is_dir():
-            # Filter out ignored files and folders
-            children = [
-                child
-                for child in path.iterdir()
-                if not any(ignored == child.name for ignored in self.ignore)
-            ]
-
-            for i, c in enumerate(children):
-                # Pass the correct `last` flag based on whether this is the last child in the filtered list
-                self.__get(
-                    c,
-                    last=i == len(children) - 1,
-                    header=header + (blank if last else pipe),
-                )
+        for line in self.lines():
+            writer(line + "\n")
+
+    def get(self) -> str:
+        """Generate the tree structure starting from the specified path."""
+        return "\n".join(self.lines())
 
 
 if __name__ == "__main__":
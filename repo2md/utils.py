@@ -1,4 +1,8 @@
+import collections
 import re
+from collections.abc import Generator
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable
 
 LANGUAGE_EXTENSIONS = {
     "python": [".py"],
@@ -32,9 +36,62 @@ LANGUAGE_EXTENSIONS = {
     "julia": [".jl"],
 }
 
+# Files that are recognized by their name instead of their extension
+LANGUAGE_FILENAMES = {
+    "dockerfile": ["Dockerfile", "Containerfile"],
+    "makefile": ["Makefile", "GNUmakefile"],
+    "cmake": ["CMakeLists.txt"],
+    "ruby": ["Gemfile", "Rakefile", "Vagrantfile"],
+    "groovy": ["Jenkinsfile"],
+    "bash": [".bashrc", ".bash_profile"],
+}
+
+# Interpreters in the shebang line of a script, for the scripts without an extension
+LANGUAGE_INTERPRETERS = {
+    "python": ["python", "python2", "python3"],
+    "bash": ["bash"],
+    "shell": ["sh", "dash", "zsh", "ksh"],
+    "javascript": ["node", "nodejs", "deno", "bun"],
+    "ruby": ["ruby"],
+    "perl": ["perl"],
+    "php": ["php"],
+    "lua": ["lua", "luajit"],
+    "r": ["Rscript"],
+    "julia": ["julia"],
+    "elixir": ["elixir"],
+    "powershell": ["pwsh"],
+}
+
+# Info strings of the fenced code blocks, for the languages that go by a different name in Markdown renderers
+LANGUAGE_FENCES = {
+    "c++": "cpp",
+    "objective-c": "objectivec",
+}
+
+# Magic numbers of binary formats that may not contain a NUL byte in their first few KB
+BINARY_SIGNATURES = (
+    b"\x89PNG",
+    b"\xff\xd8\xff",  # jpeg
+    b"GIF87a",
+    b"GIF89a",
+    b"%PDF-",
+    b"PK\x03\x04",  # zip, jar, wheel, docx
+    b"\x1f\x8b",  # gzip
+    b"\xfd7zXZ\x00",  # xz
+    b"7z\xbc\xaf\x27\x1c",
+    b"Rar!\x1a\x07",
+    b"\x7fELF",
+    b"\xca\xfe\xba\xbe",  # java class, mach-o universal
+    b"\xcf\xfa\xed\xfe",  # mach-o
+    b"\x00asm",  # webassembly
+    b"wOFF",
+    b"wOF2",
+)
+
 # Specific files in the repository to ignore
 IGNORE_FILES = [
     ".gitignore",
+    ".repo2mdignore",
     "README.md",
     "LICENSE",
     "requirements.txt",
@@ -116,3 +173,49 @@ def is_valid_url(url: str):
         r"(\/[^\s]*)?$"  # Optional path and query string
     )
     return re.match(pattern, url)
+
+
+def ordered_map(
+    func: Callable[[Any], Any],
+    iterable: Iterable[Any],
+    workers: int,
+    buffer: int = None,
+) -> Generator[Any]:
+    """Applies a function to every item of an iterable in a thread pool, yielding the results in input order.
+
+    Args:
+        func: Function to apply to each item.
+        iterable: Items to process, consumed lazily.
+        workers: Number of worker threads.
+        buffer: Maximum number of in-flight items, defaults to twice the number of workers.
+
+    Yields:
+        Any:
+        Result of the function for each item, in the same order as the input.
+    """
+    buffer = max(buffer or workers * 2, 1)
+    pending = collections.deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for item in iterable:
+                pending.append(executor.submit(func, item))
+                if len(pending) >= buffer:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def is_binary(chunk: bytes) -> bool:
+    """Checks if the leading bytes of a file belong to a binary file.
+
+    Args:
+        chunk: Leading bytes of the file, the first few KB are sufficient.
+
+    Returns:
+        bool:
+        Returns a boolean flag to indicate if the file is binary.
+    """
+    return b"\x00" in chunk or chunk.startswith(BINARY_SIGNATURES)
@@ -0,0 +1,152 @@
+"""Tests for the asyncio functions, which stream the downloads on the event loop."""
+
+import asyncio
+import contextlib
+import http.server
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from repo2md import aio, bench, config, metrics
+
+
+@contextlib.contextmanager
+def serve(handle):
+    """Serve the requests with a function, that returns the status, headers and body for a path."""
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            status, headers, body = handle(self.path)
+            self.send_response(status)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield config.EnvConfig(
+            git_api_url=f"http://127.0.0.1:{server.server_address[1]}",
+            git_owner="owner",
+            git_token="token",
+        )
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Replace the shared client with one that retries without waiting."""
+    instance = aio.AsyncClient(concurrency=8, backoff=0, retries=3)
+    monkeypatch.setattr(aio, "client", instance)
+    return instance
+
+
+def test_requests_are_not_bound_to_threads(client):
+    """Keep more requests in flight than there are threads, since they wait on the event loop."""
+    lock = threading.Lock()
+    running, peak = [0], [0]
+    everyone = threading.Event()
+
+    def handle(path):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            if running[0] == 8:
+                everyone.set()
+        # Each response waits for all the requests to be in flight, which only happens if none of them holds a thread
+        everyone.wait(timeout=5)
+        with lock:
+            running[0] -= 1
+        return (
+            200,
+            {},
+            json.dumps({"default_branch": "main", "language": path[-1]}).encode(),
+        )
+
+    async def fetch(env):
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(1))
+        try:
+            return await asyncio.gather(
+                *(aio.get_repo_info(f"repo{n}", env=env) for n in range(8))
+            )
+        finally:
+            await client.aclose()
+
+    with serve(handle) as env:
+        results = asyncio.run(fetch(env))
+    assert [result["language"] for result in results] == [str(n) for n in range(8)]
+    assert peak[0] == 8
+
+
+def test_convert_streams_the_zipball(client, tmp_path):
+    """Stream the zipball into the archive and render it, counting the downloaded bytes."""
+    source = tmp_path / "source"
+    source.mkdir()
+    (source / "app.py").write_text("print(1)\n")
+    archive = bench.make_archive(str(source), "owner-demo-0000000")
+
+    def handle(path):
+        if "/zipball/" in path:
+            return 200, {"Content-Type": "application/zip"}, archive
+        return (
+            200,
+            {},
+            json.dumps({"default_branch": "main", "language": "Python"}).encode(),
+        )
+
+    async def convert(env):
+        try:
+            return await aio.convert_repo_to_md(
+                "demo",
+                destination=str(tmp_path / "out"),
+                in_archive=True,
+                git_api_url=env.git_api_url,
+                git_owner=env.git_owner,
+                git_token=env.git_token,
+            )
+        finally:
+            await client.aclose()
+
+    with serve(handle) as env:
+        result = asyncio.run(convert(env))
+    assert result.counters["bytes_downloaded"] == len(archive)
+    assert "print(1)" in (tmp_path / "out" / "demo.md").read_text()
+
+
+def test_retries_server_errors(client):
+    """Retry a server error, and raise a client error right away."""
+    attempts = []
+
+    def handle(path):
+        attempts.append(path)
+        if path.endswith("/missing"):
+            return 404, {}, b"Not Found"
+        if len(attempts) == 1:
+            return 502, {}, b""
+        return 200, {}, json.dumps({"default_branch": "dev"}).encode()
+
+    async def fetch(env):
+        try:
+            stats = metrics.Metrics()
+            info = await aio.get_repo_info("demo", env=env, metrics=stats)
+            with pytest.raises(RuntimeError, match="status 404"):
+                await aio.get_repo_info("missing", env=env)
+            return info, stats
+        finally:
+            await client.aclose()
+
+    with serve(handle) as env:
+        info, stats = asyncio.run(fetch(env))
+    assert info["branch"] == "dev"
+    assert stats.counters["retries"] == 1
+    assert len(attempts) == 3
@@ -0,0 +1,20 @@
+"""Tests for the import times and the heavy modules, measured in fresh interpreters with ``bench``."""
+
+import pytest
+
+from repo2md import bench
+
+
+@pytest.mark.parametrize(
+    "module, expected",
+    [
+        ("repo2md", []),
+        # The CLI is built with click, but leaves the rest to the commands that need them
+        ("repo2md.cli", ["click"]),
+    ],
+)
+def test_imports_leave_out_heavy_modules(module, expected):
+    """Import the package and its CLI without the modules only a conversion or a download needs."""
+    result = bench.measure_import(module, runs=1)
+    assert result["heavy_modules"] == expected
+    assert result["seconds"] > 0
@@ -0,0 +1,94 @@
+"""Tests for the cache of archives and Markdown files keyed by commit, with ``cache.Cache``."""
+
+import os
+from unittest import mock
+
+import pytest
+import requests
+
+from repo2md import cache, config, github
+
+ENV = config.EnvConfig(
+    git_api_url="https://example.com", git_owner="owner", git_token="token"
+)
+
+
+@pytest.fixture
+def remote():
+    """Answer the commit lookups from a branch head that can be moved, and serve an archive for each commit."""
+    head = {"sha": "a" * 40, "etag": '"one"'}
+    downloads, conditional = [], []
+
+    def make_request(url, env=None, headers=None, **kwargs):
+        conditional.append(headers.get("If-None-Match"))
+        response = requests.Response()
+        response._content_consumed = True
+        if headers.get("If-None-Match") == head["etag"]:
+            response.status_code, response._content = 304, b""
+        else:
+            response.status_code, response._content = 200, head["sha"].encode()
+            response.headers["ETag"] = head["etag"]
+        return response
+
+    def download_archive(repo, branch, env, archive, metrics):
+        downloads.append(branch)
+        archive.write(branch.encode())
+        return {"language": "Python"}
+
+    with (
+        mock.patch.object(github, "make_request", side_effect=make_request),
+        mock.patch.object(github, "download_archive", side_effect=download_archive),
+    ):
+        yield head, downloads, conditional
+
+
+def test_not_modified_reuses_the_archive(tmp_path, remote):
+    """Reuse the archive of the cached commit, when the branch head answers 304 to its ETag."""
+    head, downloads, conditional = remote
+    store = cache.Cache(str(tmp_path))
+    first = store.fetch("demo", env=ENV)
+    assert first["hit"] is False
+    # Another variant of the output misses, but still finds the archive of the same commit
+    second = cache.Cache(str(tmp_path)).fetch(
+        "demo", env=ENV, options={"max_tokens": 10}
+    )
+    assert conditional == [None, '"one"']
+    assert downloads == [head["sha"]]
+    assert second["path"] == first["path"] == store.archive_path(head["sha"])
+    assert second["hit"] is False
+
+
+def test_changed_etag_replaces_the_commit(tmp_path, remote):
+    """Download the archive of the new head, and store its ETag for the next lookup."""
+    head, downloads, conditional = remote
+    store = cache.Cache(str(tmp_path))
+    store.fetch("demo", env=ENV)
+    head.update(sha="b" * 40, etag='"two"')
+    fetched = store.fetch("demo", env=ENV)
+    assert downloads == ["a" * 40, "b" * 40]
+    assert fetched["path"] == store.archive_path("b" * 40)
+    reloaded = cache.Cache(str(tmp_path))
+    assert list(reloaded.etags.values()) == [{"sha": "b" * 40, "etag": '"two"'}]
+    reloaded.fetch("demo", env=ENV)
+    assert conditional[-1] == '"two"'
+    assert len(downloads) == 2
+
+
+def test_evict_keeps_the_cache_under_its_limit(tmp_path):
+    """Remove the least recently used entries first, until the entries fit within the maximum size."""
+    store = cache.Cache(str(tmp_path), max_size=250)
+    paths = [
+        store.archive_path("old"),
+        store.output_path("new", "demo"),
+        store.archive_path("used"),
+    ]
+    for number, path in enumerate(paths):
+        with open(path, "wb") as file:
+            file.write(b"x" * 100)
+        os.utime(path, (number, number))
+    # Reading an entry marks it as the most recently used
+    store.get(paths[0])
+    store.evict()
+    remaining = [path for path in paths if os.path.exists(path)]
+    assert remaining == [paths[0], paths[2]]
+    assert sum(os.path.getsize(path) for path in remaining) <= store.max_size
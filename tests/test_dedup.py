@@ -0,0 +1,69 @@
+"""Tests for replacing the contents written before with references, with ``dedup.Dedup``."""
+
+from repo2md import dedup, main
+
+LINES = [f'value_{n} = compute({n}, "some padding text")\n' for n in range(120)]
+ORIGINAL = "".join(LINES)
+# A line whose checksum ends a chunk, so the lines after it are split the same way as in the original
+HEADER = "# header 3\n"
+
+
+def test_exact_duplicates_reference_the_first_file():
+    """Reference the first file with the same content, and leave the new and empty contents as they are."""
+    duplicates = dedup.Dedup()
+    assert duplicates.find("a.py", ORIGINAL) is None
+    assert duplicates.find("b.py", ORIGINAL) == "a.py"
+    assert duplicates.find("c.py", ORIGINAL) == "a.py"
+    assert duplicates.find("d.py", ORIGINAL + "extra\n") is None
+    assert duplicates.find("e.py", "") is None
+    assert duplicates.find("f.py", "") is None
+    assert duplicates.duplicates == 2
+    assert duplicates.replace("d.py", ORIGINAL) == ORIGINAL
+
+
+def test_near_merges_a_run_of_chunks():
+    """Replace consecutive repeated chunks with one reference, to the line the run starts at in the first file."""
+    duplicates = dedup.Dedup(near=True)
+    duplicates.replace("a.py", ORIGINAL)
+    content = HEADER + "".join(LINES[8:104]) + "tail = 1\n"
+    assert duplicates.replace("b.py", content) == (
+        f"{HEADER}… 96 lines identical to `a.py` from line 9\ntail = 1"
+    )
+    assert duplicates.duplicates == 1
+
+
+def test_near_splits_runs_that_are_not_consecutive():
+    """Start a new reference where the repeated chunks are not consecutive in the first file."""
+    duplicates = dedup.Dedup(near=True)
+    duplicates.replace("a.py", ORIGINAL)
+    content = HEADER + "".join(LINES[40:72]) + "".join(LINES[8:40])
+    assert duplicates.replace("b.py", content) == (
+        f"{HEADER}… 32 lines identical to `a.py` from line 41\n"
+        "… 32 lines identical to `a.py` from line 9"
+    )
+
+
+def test_near_keeps_short_runs_inline():
+    """Keep the repeated chunks that are shorter than a reference would be."""
+    duplicates = dedup.Dedup(near=True)
+    duplicates.replace("a.py", HEADER)
+    content = HEADER + "other = 1\n"
+    assert duplicates.replace("b.py", content) == content
+    assert duplicates.duplicates == 0
+
+
+def test_each_output_starts_without_references(tmp_path):
+    """Reference only the files written to the same output, not the ones of an earlier conversion."""
+    for name in ("first", "second"):
+        (tmp_path / name).mkdir()
+    (tmp_path / "first" / "a.py").write_text(ORIGINAL)
+    (tmp_path / "first" / "b.py").write_text(ORIGINAL)
+    (tmp_path / "second" / "c.py").write_text(ORIGINAL)
+    for name in ("first", "second"):
+        main.generate_markdown(
+            str(tmp_path / name), filename=str(tmp_path / f"{name}.md"), dedup="near"
+        )
+    assert "Identical to `first/a.py`" in (tmp_path / "first.md").read_text()
+    second = (tmp_path / "second.md").read_text()
+    assert "identical" not in second.lower()
+    assert LINES[50] in second
@@ -0,0 +1,101 @@
+"""Tests for the retries and rate-limit handling of ``github.Client``, against a stubbed session."""
+
+from unittest import mock
+
+import pytest
+import requests
+
+from repo2md import config, github, metrics
+
+ENV = config.EnvConfig(
+    git_api_url="https://example.com", git_owner="owner", git_token="token"
+)
+
+
+def response(status: int, body: bytes = b"", **headers: str) -> requests.Response:
+    """Build a response, as the session would return it."""
+    result = requests.Response()
+    result.status_code = status
+    result.headers.update(
+        {key.replace("_", "-"): value for key, value in headers.items()}
+    )
+    result._content = body
+    result._content_consumed = True
+    return result
+
+
+@pytest.fixture
+def client():
+    """Serve the queued responses from a stubbed session, and record the waits instead of sleeping."""
+    instance = github.Client(retries=3, backoff=1.0, max_rate_limit_wait=60)
+    instance.session = mock.Mock()
+    sleeps = []
+    with (
+        mock.patch.object(github.time, "sleep", side_effect=sleeps.append),
+        mock.patch.object(github.time, "time", return_value=1_000.0),
+        mock.patch.object(github.random, "uniform", side_effect=lambda low, high: high),
+    ):
+        yield instance, sleeps
+
+
+def test_429_waits_for_retry_after(client):
+    """Wait for the seconds in ``Retry-After`` on a 429, then return the next response."""
+    instance, sleeps = client
+    instance.session.get.side_effect = [
+        response(429, Retry_After="7"),
+        response(200, b"ok"),
+    ]
+    stats = metrics.Metrics()
+    assert (
+        instance.get("https://example.com/x", env=ENV, metrics=stats).content == b"ok"
+    )
+    assert sleeps == [7.0]
+    assert stats.counters == {"requests": 1, "retries": 1}
+
+
+def test_403_waits_for_the_rate_limit_reset(client):
+    """Wait until a second past ``X-RateLimit-Reset`` on a rate-limited 403."""
+    instance, sleeps = client
+    instance.session.get.side_effect = [
+        response(403, X_RateLimit_Remaining="0", X_RateLimit_Reset="1030"),
+        response(200, b"ok"),
+    ]
+    assert instance.get("https://example.com/x", env=ENV).content == b"ok"
+    assert sleeps == [31.0]
+
+
+def test_403_beyond_the_wait_limit_fails(client):
+    """Give up right away on a rate limit that resets later than the client is willing to wait."""
+    instance, sleeps = client
+    instance.session.get.side_effect = [
+        response(403, X_RateLimit_Remaining="0", X_RateLimit_Reset="5000"),
+    ]
+    with pytest.raises(RuntimeError, match="exceeds wait limit"):
+        instance.get("https://example.com/x", env=ENV)
+    assert sleeps == []
+
+
+def test_5xx_exhausts_the_retries(client):
+    """Back off exponentially on server errors and connection failures, and fail after the last attempt."""
+    instance, sleeps = client
+    instance.session.get.side_effect = [
+        response(502),
+        requests.exceptions.ConnectionError("reset"),
+        response(503),
+    ]
+    with pytest.raises(RuntimeError, match="Request failed on https://example.com/x$"):
+        instance.get("https://example.com/x", env=ENV)
+    assert sleeps == [1.0, 2.0]
+    assert instance.session.get.call_count == 3
+
+
+def test_404_is_not_retried(client):
+    """Raise a client error with its body, without retrying it."""
+    instance, sleeps = client
+    instance.session.get.side_effect = [response(404, b"Not Found")]
+    with pytest.raises(RuntimeError, match="status 404: Not Found"):
+        instance.get("https://example.com/x", env=ENV)
+    assert sleeps == []
+    assert instance.session.get.call_count == 1
+    headers = instance.session.get.call_args.kwargs["headers"]
+    assert headers["Authorization"] == "Bearer token"
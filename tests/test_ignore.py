@@ -0,0 +1,134 @@
+"""Tests for matching paths against gitignore style patterns, with ``ignore.Matcher``."""
+
+import io
+import os
+import zipfile
+
+import pytest
+
+from repo2md import bench, ignore, index
+
+
+@pytest.mark.parametrize(
+    "pattern, path, is_dir, ignored",
+    [
+        # A leading or middle slash anchors the pattern to the root
+        ("/build", "build", True, True),
+        ("/build", "src/build", True, False),
+        ("docs/*.md", "docs/a.md", False, True),
+        ("docs/*.md", "src/docs/a.md", False, False),
+        # Patterns without a slash match at any depth
+        ("*.log", "a/b/c.log", False, True),
+        ("*.log", "a.log/c.txt", False, False),
+        # A single star doesn't cross directories, a double star does
+        ("src/*.py", "src/lib/a.py", False, False),
+        ("**/fixtures", "fixtures", True, True),
+        ("**/fixtures", "a/b/fixtures", True, True),
+        ("logs/**", "logs/a/b.txt", False, True),
+        ("logs/**", "logs", True, False),
+        ("a/**/b", "a/b", True, True),
+        ("a/**/b", "a/x/y/b", True, True),
+        ("a/**/b", "a/xb", True, False),
+        ("?.txt", "a.txt", False, True),
+        ("?.txt", "ab.txt", False, False),
+        # Character classes, and their negation
+        ("*.py[co]", "a.pyc", False, True),
+        ("*.py[co]", "a.pyd", False, False),
+        ("file[0-9].txt", "file7.txt", False, True),
+        ("file[!0-9].txt", "file7.txt", False, False),
+        ("file[!0-9].txt", "filex.txt", False, True),
+        # Escaped characters that would start a comment or a negation
+        ("\\#notes", "#notes", False, True),
+        ("\\!important", "!important", False, True),
+        ("\\*", "*", False, True),
+        ("\\*", "a", False, False),
+        # A trailing slash matches only directories
+        ("cache/", "cache", True, True),
+        ("cache/", "cache", False, False),
+        ("tmp*/", "src/tmp1", True, True),
+        ("tmp*/", "src/tmp1", False, False),
+        # Plain names are looked up in the name sets, case-insensitively
+        ("Vendor", "src/vendor", True, True),
+        ("Vendor", "src/vendor", False, True),
+    ],
+)
+def test_patterns(pattern, path, is_dir, ignored):
+    """Match a pattern against a relative path, the way git does."""
+    matcher = ignore.Matcher(patterns=[pattern])
+    assert matcher.match(path.rsplit("/", 1)[-1], path, is_dir) is ignored
+
+
+def test_comments_and_blank_lines():
+    """Skip the comments and blank lines."""
+    matcher = ignore.Matcher(patterns=["# notes", "", "   "])
+    assert not matcher.match("notes", "notes", False)
+    assert not matcher.compiled
+
+
+@pytest.mark.parametrize(
+    "path, ignored",
+    [
+        ("debug.log", True),
+        ("keep.log", False),
+        ("src/keep.log", False),
+        ("src/other.log", True),
+    ],
+)
+def test_negation_re_includes(path, ignored):
+    """Re-include a file with a negated pattern, whichever order the patterns are listed in."""
+    for patterns in (["*.log", "!keep.log"], ["!keep.log", "*.log"]):
+        matcher = ignore.Matcher(patterns=patterns)
+        assert matcher.match(path.rsplit("/", 1)[-1], path, False) is ignored
+
+
+@pytest.mark.parametrize(
+    "path, is_dir, ignored",
+    [
+        ("a.log", False, True),
+        ("keep.log", False, True),
+        ("sub/keep.log", False, False),
+        ("sub/a.log", False, True),
+        ("sub/deep/keep.log", False, False),
+        ("sub/out", True, True),
+        ("out", True, False),
+        ("other/out", True, False),
+        ("sub/local.txt", False, True),
+        ("sub/deep/local.txt", False, False),
+    ],
+)
+def test_nested_patterns(path, is_dir, ignored):
+    """Match the patterns of a nested file only within its directory, where they re-include the root's files."""
+    matcher = ignore.Matcher(patterns=["*.log"])
+    matcher.add(["!keep.log", "out/", "/local.txt"], base="sub/")
+    assert matcher.match(path.rsplit("/", 1)[-1], path, is_dir) is ignored
+
+
+def test_index_loads_nested_gitignore(tmp_path):
+    """Load the ``.gitignore`` files of the subdirectories, and leave out the ones within ignored directories."""
+    files = {
+        ".gitignore": "*.log\nskipped/\n",
+        "a.log": "",
+        "a.py": "",
+        "sub/.gitignore": "!keep.log\nout/\n",
+        "sub/keep.log": "",
+        "sub/out/b.py": "",
+        "out/c.py": "",
+        "skipped/.gitignore": "!*\n",
+        "skipped/d.py": "",
+    }
+    for name, content in files.items():
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / name).write_text(content)
+    source_index = index.Index(tmp_path, gitignore=True)
+    paths = sorted(
+        os.path.relpath(node.path, tmp_path).replace(os.path.sep, "/")
+        for node in source_index.files()
+    )
+    assert paths == ["a.py", "out/c.py", "sub/keep.log"]
+    archive = zipfile.ZipFile(io.BytesIO(bench.make_archive(str(tmp_path), "top")))
+    archive_index = index.ArchiveIndex(archive, "demo", gitignore=True)
+    members = sorted(
+        os.path.relpath(node.path, "demo").replace(os.path.sep, "/")
+        for node in archive_index.files()
+    )
+    assert members == paths
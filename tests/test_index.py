@@ -0,0 +1,25 @@
+"""Tests for the in-memory directory index."""
+
+import os
+from unittest import mock
+
+from repo2md import index
+
+
+def test_scan_skips_unreadable_directories(tmp_path):
+    """Keep scanning when a directory can't be listed, leaving it in the tree without its contents."""
+    (tmp_path / "ok").mkdir()
+    (tmp_path / "ok" / "a.py").write_text("print(1)\n")
+    (tmp_path / "locked").mkdir()
+    (tmp_path / "locked" / "b.py").write_text("print(2)\n")
+    scandir = os.scandir
+
+    def denied(path):
+        if os.path.basename(path) == "locked":
+            raise PermissionError(13, "Permission denied", path)
+        return scandir(path)
+
+    with mock.patch.object(index.os, "scandir", side_effect=denied):
+        source_index = index.Index(tmp_path)
+    paths = [os.path.relpath(node.path, tmp_path) for node in source_index.walk()]
+    assert paths == [".", "locked", "ok", os.path.join("ok", "a.py")]
@@ -0,0 +1,31 @@
+"""Tests for filtering files by language, with their names, extensions and shebang lines."""
+
+import io
+
+from repo2md import languages, main
+
+
+def test_filter_matches_shebang_without_extension():
+    """Match a file without an extension by its interpreter, only when its start can be read."""
+    matcher = languages.get_filter("python")
+    assert matcher.match("setup.py")
+    assert not matcher.match("run")
+    assert matcher.match("run", lambda: "#!/usr/bin/env python3\nprint(1)\n")
+    assert not matcher.match("run", lambda: "#!/bin/bash\necho 1\n")
+    # Files with an extension are never read
+    assert not matcher.match("notes.txt", lambda: "#!/usr/bin/env python3\n")
+    assert matcher.sniffs("run")
+    assert not matcher.sniffs("notes.txt")
+
+
+def test_language_filter_renders_scripts(tmp_path):
+    """Render the scripts of a language that have no extension, and leave out the scripts of other languages."""
+    (tmp_path / "app.py").write_text("print(1)\n")
+    (tmp_path / "manage").write_text("#!/usr/bin/env python3\nprint(2)\n")
+    (tmp_path / "deploy").write_text("#!/bin/bash\necho 3\n")
+    output = io.StringIO()
+    main.generate_markdown(tmp_path, output=output, language="python")
+    text = output.getvalue().split("## Contents:")[1].split("```\n\n", 1)[1]
+    assert "print(1)" in text
+    assert "print(2)" in text
+    assert "echo 3" not in text
@@ -0,0 +1,58 @@
+"""Tests for reusing the fragments of unchanged files across runs, with ``manifest.Manifest``."""
+
+import json
+import os
+
+import pytest
+
+from repo2md import main, metrics
+
+
+@pytest.fixture
+def convert(tmp_path):
+    """Write a source with three files, and convert it with a manifest, returning the output and the counters."""
+    source = tmp_path / "source"
+    source.mkdir()
+    for name in ("a", "b", "c"):
+        (source / f"{name}.py").write_text(f"{name} = 1\n")
+
+    def run():
+        stats = metrics.Metrics()
+        main.generate_markdown(
+            str(source),
+            filename=str(tmp_path / "out.md"),
+            manifest_file=str(tmp_path / "manifest.json"),
+            metrics=stats,
+            workers=2,
+        )
+        counts = (stats.counters["files_read"], stats.counters["files_reused"])
+        return (tmp_path / "out.md").read_text(), counts
+
+    return source, tmp_path / "manifest.json", run
+
+
+def test_rereads_only_the_changed_file(convert):
+    """Read again only the file whose modified time changed, even when its size didn't."""
+    source, _, run = convert
+    assert run()[1] == (3, 0)
+    stat = os.stat(source / "b.py")
+    (source / "b.py").write_text("b = 2\n")
+    os.utime(source / "b.py", ns=(stat.st_atime_ns, stat.st_mtime_ns - 1))
+    output, counts = run()
+    assert counts == (1, 2)
+    assert "b = 2" in output
+    assert "a = 1" in output
+    assert run()[1] == (0, 3)
+
+
+def test_rereads_a_fragment_that_does_not_match_its_digest(convert):
+    """Read a file again when its fragment in the manifest was changed after it was stored."""
+    _, manifest_file, run = convert
+    run()
+    data = json.loads(manifest_file.read_text())
+    data["files"]["a.py"]["fragment"] = "tampered"
+    manifest_file.write_text(json.dumps(data))
+    output, counts = run()
+    assert counts == (1, 2)
+    assert "tampered" not in output
+    assert "a = 1" in output
@@ -0,0 +1,48 @@
+"""Tests for the metrics of a conversion."""
+
+import threading
+import time
+
+from repo2md import metrics
+
+
+def test_read_while_recording():
+    """Read the metrics while other threads add new stages and counters to them."""
+    recorded = metrics.Metrics(repo="demo")
+    stop = threading.Event()
+
+    def record(prefix):
+        n = 0
+        while not stop.is_set():
+            n += 1
+            recorded.count(f"{prefix}_{n}")
+            with recorded.stage(f"{prefix}_{n}"):
+                pass
+
+    threads = [threading.Thread(target=record, args=(name,)) for name in "ab"]
+    for thread in threads:
+        thread.start()
+    try:
+        deadline = time.monotonic() + 0.3
+        while time.monotonic() < deadline:
+            recorded.as_dict()
+            recorded.summary()
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    assert recorded.as_dict()["labels"] == {"repo": "demo"}
+
+
+def test_export_formats(tmp_path):
+    """Export the timings and counters as Prometheus gauges, and as JSON lines."""
+    recorded = metrics.Metrics(repo="demo")
+    recorded.count("files_read", 3)
+    with recorded.stage("walk"):
+        pass
+    recorded.export(str(tmp_path / "repo.prom"))
+    text = (tmp_path / "repo.prom").read_text()
+    assert 'repo2md_stage_seconds{repo="demo",stage="walk"}' in text
+    assert 'repo2md_files_read{repo="demo"} 3' in text
+    recorded.export(str(tmp_path / "repo.jsonl"))
+    assert '"files_read": 3' in (tmp_path / "repo.jsonl").read_text()
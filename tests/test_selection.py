@@ -0,0 +1,31 @@
+"""Tests for selecting the files within a token budget, with ``main.Selection``."""
+
+from repo2md import index, main
+
+
+def test_placeholders_cost_one_line(tmp_path):
+    """Count the binary and undecodable files as the placeholder written in their place, not by their size."""
+    (tmp_path / "image.bin").write_bytes(b"\x00" * 100_000)
+    (tmp_path / "latin.txt").write_bytes("café ".encode("latin-1") * 1000)
+    (tmp_path / "app.py").write_text("print(1)\n")
+    source_index = index.Index(tmp_path)
+    selection = main.Selection(source_index, max_tokens=30)
+    assert selection.sizes == {
+        str(tmp_path / "app.py"): 9,
+        str(tmp_path / "image.bin"): len(main.PLACEHOLDER),
+        str(tmp_path / "latin.txt"): len(main.PLACEHOLDER),
+    }
+    assert selection.skipped == 0
+    output = tmp_path / "out.md"
+    main.generate_markdown(str(tmp_path), filename=str(output), max_tokens=30)
+    assert output.read_text().count(main.PLACEHOLDER) == 2
+
+
+def test_token_budget_skips_what_does_not_fit(tmp_path):
+    """Leave out the text files beyond the token budget, and count them in the summary."""
+    (tmp_path / "a.py").write_text("a" * 40)
+    (tmp_path / "b.py").write_text("b" * 40)
+    selection = main.Selection(index.Index(tmp_path), max_tokens=15)
+    assert list(selection.sizes) == [str(tmp_path / "a.py")]
+    assert selection.skipped == 1
+    assert "Files left out to fit within the limits: 1" in selection.table()
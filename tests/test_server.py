@@ -0,0 +1,104 @@
+"""Tests for the endpoints of the conversion server."""
+
+import http.client
+import json
+import os
+import threading
+from unittest import mock
+
+import pytest
+
+from repo2md import server
+
+
+def convert(destination, repo_name, **kwargs):
+    """Stand in for the conversion, writing a Markdown file named after the repository."""
+    os.makedirs(destination, exist_ok=True)
+    with open(os.path.join(destination, f"{repo_name}.md"), "w") as file:
+        file.write(f"# {kwargs['git_owner']}/{repo_name}\n")
+
+
+@pytest.fixture
+def request_json(tmp_path):
+    """Serve the endpoints on a free port, and make requests to them."""
+    service = server.Service(destination=str(tmp_path), workers=1, git_owner="owner")
+    httpd = server.TCPServer(("127.0.0.1", 0), server.Handler)
+    httpd.service = service
+    thread = threading.Thread(target=httpd.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+
+    def send(method, path, body=None):
+        connection = http.client.HTTPConnection(*httpd.server_address[:2], timeout=10)
+        data = body if isinstance(body, bytes) or body is None else json.dumps(body)
+        connection.request(method, path, body=data)
+        response = connection.getresponse()
+        content = response.read()
+        connection.close()
+        if response.getheader("Content-Type") == "application/json":
+            content = json.loads(content)
+        return response.status, dict(response.getheaders()), content
+
+    with mock.patch.object(server.main, "convert_repo_to_md", side_effect=convert):
+        yield send
+    httpd.shutdown()
+    httpd.server_close()
+    service.shutdown()
+
+
+def test_submit_and_status(request_json):
+    """Queue a job, then read its state and Markdown file, and the state of the server."""
+    status, headers, job = request_json("POST", "/jobs", {"repo_name": "demo"})
+    assert status == 202
+    assert headers["Location"] == f"/jobs/{job['id']}"
+    status, _, output = request_json("GET", f"/jobs/{job['id']}/output?timeout=10")
+    assert status == 200
+    assert output == b"# owner/demo\n"
+    status, _, job = request_json("GET", f"/jobs/{job['id']}")
+    assert (status, job["status"]) == (200, "succeeded")
+    status, _, state = request_json("GET", "/status")
+    assert (status, state["jobs"]) == (200, {"succeeded": 1})
+
+
+def test_wait_streams_output(request_json):
+    """Stream the Markdown file back in the response, with ``?wait``."""
+    status, headers, output = request_json(
+        "POST", "/jobs?wait", {"repo_name": "demo", "git_owner": "other"}
+    )
+    assert status == 200
+    assert output == b"# other/demo\n"
+    assert headers["X-Job-Id"]
+
+
+def test_unknown_job(request_json):
+    """Respond with a 404 for a job that doesn't exist."""
+    status, _, body = request_json("GET", "/jobs/missing")
+    assert status == 404
+
+
+@pytest.mark.parametrize(
+    "body, message",
+    [
+        (b"{not json", "Expecting property name"),
+        ([1, 2], "must be a JSON object"),
+        ({"repo_name": "demo", "git_token": "stolen"}, "Unsupported job parameters"),
+        ({"repo_name": "demo", "git_api_url": "https://evil"}, "Unsupported"),
+        ({"repo_name": "../../x"}, "plain GitHub name"),
+        ({"repo_name": ".."}, "plain GitHub name"),
+        ({"repo_name": "demo", "git_owner": "a/b"}, "plain GitHub name"),
+        ({"repo_name": 1}, "plain GitHub name"),
+        ({}, "mandatory"),
+    ],
+)
+def test_rejects_bad_jobs(request_json, body, message):
+    """Respond with a 400 to a body that isn't a JSON object, or with parameters a job can't set."""
+    status, _, error = request_json("POST", "/jobs", body)
+    assert status == 400
+    assert message in error["error"]
+
+
+@pytest.mark.parametrize("timeout", ["abc", "-1", "nan", "inf"])
+def test_rejects_bad_timeout(request_json, timeout):
+    """Respond with a 400 to a timeout that isn't a non-negative number of seconds."""
+    _, _, job = request_json("POST", "/jobs", {"repo_name": "demo"})
+    status, _, _ = request_json("GET", f"/jobs/{job['id']}/output?timeout={timeout}")
+    assert status == 400
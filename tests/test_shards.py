@@ -0,0 +1,12 @@
+"""Tests for splitting the output into parts."""
+
+from repo2md import main
+
+
+def test_size_counts_bytes(tmp_path):
+    """Count the size of a part in UTF-8 bytes, so text outside ASCII fills it sooner than its characters."""
+    shards = main.Shards(str(tmp_path / "repo.md"), max_size=10)
+    shards.write("ab")
+    shards.write("ü€")
+    assert shards.size == 2 + 2 + 3
+    shards.close()
@@ -0,0 +1,159 @@
+"""Tests for fetching the files of a repository from its tree listing, with ``github.sparse_fetch``."""
+
+import os
+from unittest import mock
+
+import pytest
+
+from repo2md import config, github, main
+
+BLOBS = {
+    "a": b"print(1)\n",
+    "b": b"package main\n",
+    "c": b"print(2)\nprint(3)\n",
+    "x": b"x = 1",
+}
+TREE = {
+    "truncated": False,
+    "tree": [
+        {"path": "src", "type": "tree", "mode": "040000"},
+        {"path": "src/a.py", "type": "blob", "mode": "100644", "sha": "a"},
+        {"path": "src/b.go", "type": "blob", "mode": "100644", "sha": "b"},
+        {"path": "src/lib", "type": "tree", "mode": "040000"},
+        {"path": "src/lib/c.py", "type": "blob", "mode": "100644", "sha": "c"},
+        {"path": "node_modules", "type": "tree", "mode": "040000"},
+        {"path": "node_modules/x.js", "type": "blob", "mode": "100644", "sha": "x"},
+    ],
+}
+for ENTRY in TREE["tree"]:
+    if ENTRY["type"] == "blob":
+        ENTRY["size"] = len(BLOBS[ENTRY["sha"]])
+
+
+@pytest.fixture
+def fetched(tmp_path):
+    """Run ``sparse_fetch`` against a mocked listing, and collect the blobs that were fetched."""
+    requested = []
+
+    def get_blob(repo, sha, env, metrics):
+        requested.append(sha)
+        return BLOBS[sha]
+
+    def fetch(tree=TREE, max_ratio=1.0, **kwargs):
+        env = config.EnvConfig(
+            git_api_url="https://example.com", git_owner="owner", git_token="token"
+        )
+        with (
+            mock.patch.object(
+                github,
+                "get_repo_info",
+                return_value={"branch": "main", "language": "Python"},
+            ),
+            mock.patch.object(github, "get_tree", return_value=tree),
+            mock.patch.object(github, "get_blob", side_effect=get_blob),
+            mock.patch.object(github, "download_and_extract") as fallback,
+        ):
+            result = github.sparse_fetch(
+                "demo", str(tmp_path), env=env, max_ratio=max_ratio, **kwargs
+            )
+        if fallback.called:
+            return None, sorted(requested)
+        return result, sorted(requested)
+
+    return fetch
+
+
+def read(result: dict, name: str) -> bytes:
+    """Read a file written by ``sparse_fetch``."""
+    with open(os.path.join(result["path"], *name.split("/")), "rb") as file:
+        return file.read()
+
+
+def test_fetches_all_files(fetched):
+    """Fetch every file that is not ignored, without a language filter."""
+    result, requested = fetched()
+    assert requested == ["a", "b", "c"]
+    assert read(result, "src/b.go") == BLOBS["b"]
+    assert not os.path.exists(os.path.join(result["path"], "node_modules"))
+    assert result["skipped"] == []
+
+
+def test_language_filter_writes_placeholders(fetched):
+    """Write the files in other languages empty, without fetching them."""
+    result, requested = fetched(language_filter="python")
+    assert requested == ["a", "c"]
+    assert read(result, "src/a.py") == BLOBS["a"]
+    assert read(result, "src/b.go") == b""
+
+
+def test_max_file_size_truncates(fetched):
+    """Keep one byte past the maximum file size, so the output still notes the truncation."""
+    result, _ = fetched(max_file_size=4)
+    assert read(result, "src/lib/c.py") == BLOBS["c"][:5]
+
+
+def test_max_total_size_skips_in_walk_order(fetched):
+    """Leave out the files beyond the total size, with the files of a directory before its subdirectories."""
+    result, requested = fetched(max_total_size=len(BLOBS["a"]) + len(BLOBS["b"]))
+    assert requested == ["a", "b"]
+    assert read(result, "src/lib/c.py") == b""
+    assert result["skipped"] == [os.path.join(result["path"], "src", "lib", "c.py")]
+
+
+def test_skipped_files_stay_out_of_the_output(fetched, tmp_path, monkeypatch):
+    """Leave the skipped files out of the output by path, even where the output's budget would still fit them."""
+    monkeypatch.setitem(BLOBS, "s", b"#!/usr/bin/env python\nprint(0)\n")
+    monkeypatch.setitem(BLOBS, "y", b"y = 1\n")
+    blobs = [
+        {"path": "run", "type": "blob", "mode": "100755", "sha": "s"},
+        {"path": "x.py", "type": "blob", "mode": "100644", "sha": "a"},
+        {"path": "y.py", "type": "blob", "mode": "100644", "sha": "y"},
+    ]
+    for entry in blobs:
+        entry["size"] = len(BLOBS[entry["sha"]])
+    # The extensionless file is fetched to sniff its shebang, and spends the budget the skipped file would fit in
+    max_total_size = len(BLOBS["s"]) + len(BLOBS["y"])
+    result, requested = fetched(
+        tree={"truncated": False, "tree": blobs},
+        language_filter="python",
+        max_total_size=len(BLOBS["a"]),
+    )
+    assert requested == ["a", "s"]
+    main.generate_markdown(
+        result["path"],
+        filename=str(tmp_path / "out.md"),
+        language="python",
+        max_total_size=max_total_size,
+        excluded=result["skipped"],
+    )
+    output = (tmp_path / "out.md").read_text()
+    assert "print(0)" in output
+    assert "y.py" not in output.split("```\n\n", 1)[1]
+
+
+def test_ratio_counts_ignored_files(fetched):
+    """Compare the matching files with all the bytes of the repository, including the ignored ones."""
+    vendored = {
+        "path": "node_modules/big.js",
+        "type": "blob",
+        "mode": "100644",
+        "sha": "x",
+        "size": 10_000,
+    }
+    tree = {"truncated": False, "tree": [*TREE["tree"], vendored]}
+    result, requested = fetched(tree=tree, max_ratio=0.5)
+    assert result is not None
+    assert requested == ["a", "b", "c"]
+    result, requested = fetched(max_ratio=0.5)
+    assert result is None
+
+
+def test_nested_gitignore(fetched, monkeypatch):
+    """Skip the files ignored by a nested ``.gitignore``, and write it along for the output to apply."""
+    monkeypatch.setitem(BLOBS, "g", b"c.py\n")
+    entry = {"path": "src/lib/.gitignore", "type": "blob", "mode": "100644", "sha": "g"}
+    tree = {"truncated": False, "tree": [*TREE["tree"], {**entry, "size": 5}]}
+    result, requested = fetched(tree=tree, gitignore=True)
+    assert requested == ["a", "b", "g"]
+    assert read(result, "src/lib/.gitignore") == b"c.py\n"
+    assert not os.path.exists(os.path.join(result["path"], "src", "lib", "c.py"))